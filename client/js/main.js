@@ -346,10 +346,14 @@ Net.onState = (state) => {
     const playerScreenX = rect.left + (me.x * ren.tile) - ren.camera.x + ren.tile/2;
     const playerScreenY = rect.top + (me.y * ren.tile) - ren.camera.y + ren.tile/2;
     
+    // Only look at things close to me: with area-of-interest filtering, far entities
+    // also drop out of the state just because I walked away from them.
+    const nearMe = (o) => Math.max(Math.abs(o.x - me.x), Math.abs(o.y - me.y)) <= 6;
     // Check for resource gathering (compare with previous state)
-    if (window.lastResourceCount !== undefined) {
-      const currentResourceCount = state.resources ? state.resources.length : 0;
-      if (currentResourceCount < window.lastResourceCount) {
+    const resourceKeys = new Set((state.resources || []).map(r => `${r.x},${r.y}`));
+    if (window.lastNearResources !== undefined) {
+      const gone = [...window.lastNearResources].some(k => !resourceKeys.has(k));
+      if (gone) {
         // A resource was gathered - show appropriate floating text
         const nearbyResources = state.resources || [];
         const playerAdjacentTiles = [
@@ -385,12 +389,13 @@ Net.onState = (state) => {
         }
       }
     }
-    window.lastResourceCount = state.resources ? state.resources.length : 0;
+    window.lastNearResources = new Set((state.resources || []).filter(nearMe).map(r => `${r.x},${r.y}`));
     
     // Check for monster kills (XP gain)
-    if (window.lastMonsterCount !== undefined) {
-      const currentMonsterCount = state.monsters ? Object.keys(state.monsters).length : 0;
-      if (currentMonsterCount < window.lastMonsterCount) {
+    const monsterIds = new Set((state.monsters || []).map(m => m.id));
+    if (window.lastNearMonsters !== undefined) {
+      const killed = [...window.lastNearMonsters].some(id => !monsterIds.has(id));
+      if (killed) {
         // A monster was killed
         const xpGained = 50; // Base XP per monster
         gainXp(xpGained);
@@ -404,7 +409,7 @@ Net.onState = (state) => {
         }
       }
     }
-    window.lastMonsterCount = state.monsters ? Object.keys(state.monsters).length : 0;
+    window.lastNearMonsters = new Set((state.monsters || []).filter(nearMe).map(m => m.id));
   }
   
   ren.update(state, Net.playerId, Net.tick);
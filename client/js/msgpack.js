@@ -0,0 +1,52 @@
+// Minimal MessagePack decoder for server state messages (ClientHello protocol 'msgpack').
+// Decode only: the client still sends its actions as JSON text.
+const utf8 = new TextDecoder();
+
+export function decode(buf) {
+  const bytes = buf instanceof Uint8Array ? buf : new Uint8Array(buf);
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  let pos = 0;
+
+  const str = (n) => { const s = utf8.decode(bytes.subarray(pos, pos + n)); pos += n; return s; };
+  const arr = (n) => { const a = new Array(n); for (let i = 0; i < n; i++) a[i] = read(); return a; };
+  const map = (n) => { const o = {}; for (let i = 0; i < n; i++) { const k = read(); o[k] = read(); } return o; };
+  const bin = (n) => { const b = bytes.slice(pos, pos + n); pos += n; return b; };
+
+  function read() {
+    const t = bytes[pos++];
+    if (t <= 0x7f) return t;                        // positive fixint
+    if (t >= 0xe0) return t - 0x100;                // negative fixint
+    if ((t & 0xf0) === 0x80) return map(t & 0x0f);  // fixmap
+    if ((t & 0xf0) === 0x90) return arr(t & 0x0f);  // fixarray
+    if ((t & 0xe0) === 0xa0) return str(t & 0x1f);  // fixstr
+    let v;
+    switch (t) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: v = bytes[pos]; pos += 1; return bin(v);
+      case 0xc5: v = view.getUint16(pos); pos += 2; return bin(v);
+      case 0xc6: v = view.getUint32(pos); pos += 4; return bin(v);
+      case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+      case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+      case 0xcc: v = view.getUint8(pos); pos += 1; return v;
+      case 0xcd: v = view.getUint16(pos); pos += 2; return v;
+      case 0xce: v = view.getUint32(pos); pos += 4; return v;
+      case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+      case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+      case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+      case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+      case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+      case 0xd9: v = bytes[pos]; pos += 1; return str(v);
+      case 0xda: v = view.getUint16(pos); pos += 2; return str(v);
+      case 0xdb: v = view.getUint32(pos); pos += 4; return str(v);
+      case 0xdc: v = view.getUint16(pos); pos += 2; return arr(v);
+      case 0xdd: v = view.getUint32(pos); pos += 4; return arr(v);
+      case 0xde: v = view.getUint16(pos); pos += 2; return map(v);
+      case 0xdf: v = view.getUint32(pos); pos += 4; return map(v);
+      default: throw new Error(`msgpack: unsupported type 0x${t.toString(16)}`);
+    }
+  }
+
+  return read();
+}
@@ -1,10 +1,100 @@
+import { decode as decodeMsgpack } from './msgpack.js';
+
 const API_BASE = '';
 let ws;
+
+// Delta snapshots (mirrors server/app/game/delta.py): array collections are keyed by
+// these record fields so deltas can add/replace ("upd") or remove ("del") single entries.
+const KEYED_LISTS = {
+  monsters: ['id'],
+  npcs: ['id'],
+  projectiles: ['id'],
+  resources: ['x', 'y'],
+  effects: ['x', 'y'],
+  damageNumbers: ['x', 'y'],
+};
+const KEYED_MAPS = ['players'];
+const TRANSIENT = ['chat'];
+
+function recordKey(rec, fields) {
+  return fields.map((f) => String(rec[f])).join(',');
+}
+
+// Full state -> keyed collections
+function indexState(state) {
+  const out = {};
+  for (const [name, value] of Object.entries(state)) {
+    if (TRANSIENT.includes(name)) continue;
+    const fields = KEYED_LISTS[name];
+    if (fields) {
+      const m = {};
+      for (const rec of value || []) m[recordKey(rec, fields)] = rec;
+      out[name] = m;
+    } else if (KEYED_MAPS.includes(name)) {
+      out[name] = { ...(value || {}) };
+    } else {
+      out[name] = value;
+    }
+  }
+  return out;
+}
+
+// Keyed collections -> the full state shape the renderer expects
+function expandState(indexed) {
+  const out = {};
+  for (const [name, value] of Object.entries(indexed)) {
+    out[name] = KEYED_LISTS[name] ? Object.values(value) : (KEYED_MAPS.includes(name) ? { ...value } : value);
+  }
+  return out;
+}
+
+function applyDelta(indexed, delta) {
+  for (const [name, value] of Object.entries(delta)) {
+    if (TRANSIENT.includes(name)) continue;
+    if (KEYED_LISTS[name] || KEYED_MAPS.includes(name)) {
+      const m = indexed[name] || (indexed[name] = {});
+      for (const key of value.del || []) delete m[key];
+      Object.assign(m, value.upd || {});
+    } else {
+      indexed[name] = value;
+    }
+  }
+}
+// Tile lookup over either the full row list or the chunks received so far.
+// Returns null for tiles the client does not have (chunk not sent yet).
+function makeMap(msg) {
+  const map = { version: msg.version, world: msg.world, tiles: msg.tiles || [], chunkSize: msg.chunkSize || 0, chunks: null };
+  if (map.chunkSize) {
+    const size = map.chunkSize;
+    map.chunks = new Map();
+    map.tileAt = (x, y) => {
+      const chunk = map.chunks.get(`${Math.floor(x / size)},${Math.floor(y / size)}`);
+      if (!chunk) return null;
+      const row = chunk.tiles[y - chunk.y];
+      return row ? row[x - chunk.x] : null;
+    };
+  } else {
+    map.tileAt = (x, y) => (map.tiles[y] && map.tiles[y][x]) || 'G';
+  }
+  return map;
+}
+
 export const Net = {
   token: null,
   playerId: null,
   tick: 0,
   isAdmin: false,
+  // Requested encoding for server messages ('msgpack' binary or 'json' text); the
+  // server answers with the one it actually uses in the 'connected' message
+  protocol: 'msgpack',
+  // Keyed copy of the last full state, rebuilt from keyframe + deltas
+  _world: null,
+  _resyncPending: false,
+  // Static map ({version, world, tiles, tileAt}); sent once per connection and again when it changes.
+  // On chunked worlds tiles is empty and the rows arrive per chunk ('chunk' messages).
+  map: null,
+  // Own private record (inventory, quests, cooldowns, ...); only sent when it changes
+  me: null,
   connect() {
     return new Promise((resolve, reject) => {
       console.log('Establishing WebSocket connection...');
@@ -13,10 +103,13 @@ export const Net = {
       console.log('WebSocket URL:', wsUrl);
       
       ws = new WebSocket(wsUrl);
+      ws.binaryType = 'arraybuffer';
       
       ws.onopen = () => {
         console.log('WebSocket opened, sending authentication...');
-        ws.send(JSON.stringify({ token: this.token, client: 'web' }));
+        this._world = null;
+        this.me = null;
+        ws.send(JSON.stringify({ token: this.token, client: 'web', delta: true, protocol: this.protocol }));
       };
       
       ws.onerror = (error) => {
@@ -25,7 +118,7 @@ export const Net = {
       };
       
       ws.onmessage = (ev) => {
-        const msg = JSON.parse(ev.data);
+        const msg = typeof ev.data === 'string' ? JSON.parse(ev.data) : decodeMsgpack(ev.data);
         console.log('WebSocket message received:', msg);
         
         if (msg.type === 'connected') {
@@ -33,9 +126,25 @@ export const Net = {
           this.playerId = msg.playerId;
           this.tick = msg.tick;
           resolve();
+        } else if (msg.type === 'map') {
+          this.map = makeMap(msg);
+        } else if (msg.type === 'chunk') {
+          if (this.map && this.map.chunks) {
+            this.map.chunks.set(`${Math.floor(msg.x / this.map.chunkSize)},${Math.floor(msg.y / this.map.chunkSize)}`, msg);
+          }
         } else if (msg.type === 'state') {
+          const state = this._mergeState(msg);
+          if (!state) return;
+          if (this.map) {
+            state.world = this.map.world;
+            state.tiles = this.map.tiles;
+            state.tileAt = this.map.tileAt;
+          }
+          if (msg.me) this.me = msg.me;
+          const own = state.players && state.players[this.playerId];
+          if (own && this.me) state.players[this.playerId] = { ...own, ...this.me };
           this.tick = msg.tick;
-          this.onState && this.onState(msg.state);
+          this.onState && this.onState(state);
         } else if (msg.type === 'error') {
           console.error('Server error:', msg.message);
           reject(new Error(msg.message));
@@ -59,6 +168,29 @@ export const Net = {
   this.isAdmin = !!me.is_admin;
     return me;
   },
+  // Returns the full state for a keyframe or delta message, or null if the delta
+  // does not apply to what we have (a resync is requested and the message dropped).
+  _mergeState(msg) {
+    if (!msg.delta) {
+      this._world = indexState(msg.state);
+      this._resyncPending = false;
+      return msg.state;
+    }
+    if (!this._world || msg.base !== this.tick) {
+      this._world = null;
+      if (!this._resyncPending) {
+        this._resyncPending = true;
+        this.sendAction({ type: 'resync' });
+      }
+      return null;
+    }
+    applyDelta(this._world, msg.state);
+    const state = expandState(this._world);
+    for (const name of TRANSIENT) {
+      if (msg.state[name] !== undefined) state[name] = msg.state[name];
+    }
+    return state;
+  },
   sendAction(a) {
     if (ws && ws.readyState === WebSocket.OPEN) {
       ws.send(JSON.stringify(a));
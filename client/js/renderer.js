@@ -25,7 +25,7 @@ export class Renderer {
   // Interpolated projectile store: id -> {id, x, y, prevX, prevY, dx, dy, lastUpdate}
   this._projectileStore = new Map();
   this._lastStateAt = performance.now();
-  this._tickMs = 250; // expected server tick length (ms)
+  this._tickMs = 250; // expected gap between server snapshots (ms), adapted in update()
     
     // Settings
     this.showGrid = false;
@@ -33,10 +33,15 @@ export class Renderer {
   this.spellGfxScale = 0.7;
   }
   update(state, myId, serverTick = 0) {
-  // record when this snapshot arrived for interpolation
-  this._lastStateAt = performance.now();
+  // record when this snapshot arrived for interpolation; the gap between snapshots follows
+  // the server's send rate (lower for idle players), so it is measured rather than assumed
+  const arrivedAt = performance.now();
+  const gap = arrivedAt - this._lastStateAt;
+  if (gap > 0 && gap < 2000) this._tickMs = this._tickMs * 0.8 + gap * 0.2;
+  this._lastStateAt = arrivedAt;
     this.world = state.world;
   this.tiles = state.tiles || [];
+  this.tileAt = state.tileAt || null;
   this.resources = state.resources || [];
   this.npcs = state.npcs || [];
     this.players = state.players;
@@ -176,12 +181,18 @@ export class Renderer {
     // Update explosion animations (60 FPS)
     this.updateExplosionAnimations();
 
-    // draw terrain (tiles and grid)
-    for (let y=0;y<this.world.h;y++) {
-      for (let x=0;x<this.world.w;x++) {
+    // draw terrain (tiles and grid), only the tiles inside the viewport
+    const tx0 = Math.max(0, Math.floor(this.camera.x / this.tile));
+    const ty0 = Math.max(0, Math.floor(this.camera.y / this.tile));
+    const tx1 = Math.min(this.world.w, Math.ceil((this.camera.x + this.canvas.width) / this.tile) + 1);
+    const ty1 = Math.min(this.world.h, Math.ceil((this.camera.y + this.canvas.height) / this.tile) + 1);
+    for (let y=ty0;y<ty1;y++) {
+      for (let x=tx0;x<tx1;x++) {
         const sx = x*this.tile - this.camera.x;
         const sy = y*this.tile - this.camera.y;
-        const ch = (this.tiles[y] && this.tiles[y][x]) || 'G';
+        const ch = this.tileAt ? this.tileAt(x, y) : ((this.tiles[y] && this.tiles[y][x]) || 'G');
+        // Chunk not received yet: leave the background
+        if (ch === null) continue;
         if (ch === 'W') {
           // water tile
           c.fillStyle = '#1e3a5f';
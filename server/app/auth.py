@@ -1,12 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Header
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, status, Header
+from sqlalchemy.exc import IntegrityError
 from passlib.context import CryptContext
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
-from .db import get_db, Base, engine
+from .db import SessionLocal, Base, engine
 from .models import User
 from .schemas import UserCreate, Token, UserOut
+from .workers import db_pool, hash_pool
+from .storage import user_by_name, user_by_id
+from .cache import TTLCache
 import os
+import time
 
 # JWT config (prototype only)
 SECRET_KEY = "dev-secret-change-me"
@@ -25,39 +29,54 @@ def verify_password(plain, hashed):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+# The endpoints below are async and hand every SQLAlchemy call and every bcrypt hash to the
+# bounded pools in workers.py, so neither ever runs on the event loop the game ticks on.
+
+def _create_user(username: str, password_hash: str) -> int | None:
+    """New user's id, or None if the username is taken."""
+    db = SessionLocal()
+    try:
+        if db.query(User).filter(User.username == username).first():
+            return None
+        u = User(username=username, password_hash=password_hash)
+        db.add(u)
+        try:
+            db.commit()
+        except IntegrityError:
+            # Registered concurrently under the same name
+            db.rollback()
+            return None
+        return u.id
+    finally:
+        db.close()
+
 @router.post("/register", response_model=Token)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(User).filter(User.username == user.username).first()
-    if existing:
+async def register(user: UserCreate):
+    if await db_pool.run(user_by_name, user.username):
+        raise HTTPException(status_code=400, detail="Username already taken")
+    password_hash = await hash_pool.run(get_password_hash, user.password)
+    user_id = await db_pool.run(_create_user, user.username, password_hash)
+    if user_id is None:
         raise HTTPException(status_code=400, detail="Username already taken")
-    u = User(username=user.username, password_hash=get_password_hash(user.password))
-    db.add(u)
-    db.commit()
-    db.refresh(u)
-    token = create_access_token({"sub": str(u.id)})
+    # SQLite may hand out the id of a deleted user again
+    invalidate_user(user_id)
+    token = create_access_token({"sub": str(user_id)})
     return Token(access_token=token)
 
 @router.post("/login", response_model=Token)
-def login(user: UserCreate, db: Session = Depends(get_db)):
-    u = db.query(User).filter(User.username == user.username).first()
-    if not u or not verify_password(user.password, u.password_hash):
+async def login(user: UserCreate):
+    found = await db_pool.run(user_by_name, user.username)
+    if not found or not await hash_pool.run(verify_password, user.password, found[1]):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    token = create_access_token({"sub": str(u.id)})
+    token = create_access_token({"sub": str(found[0])})
     return Token(access_token=token)
 
 async def get_current_user(token: str) -> User:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        sub = payload.get("sub")
-        if sub is None:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-        class U:  # lightweight proto user object
-            id: int
-        u = U()
-        u.id = int(sub)
-        return u
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    class U:  # lightweight proto user object
+        id: int
+    u = U()
+    u.id = _decode_token(token)
+    return u
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
     to_encode = data.copy()
@@ -66,35 +85,105 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# --- Token and user caches ---
+# Decoded tokens (token -> user id) and users (user id -> (username, is_admin)), so repeated
+# /auth/me calls, admin checks and websocket handshakes skip both the JWT signature check
+# and the database. Both are only touched on the event loop. A cached token never outlives
+# its own `exp`. invalidate_user() must be called when a user row changes; other processes
+# (scripts/create_admin.py) are only seen once the entry's TTL runs out.
+_token_cache = TTLCache(maxsize=int(os.getenv("TOKEN_CACHE_SIZE", "10000")),
+                        ttl=float(os.getenv("TOKEN_CACHE_TTL", "300")))
+_user_cache = TTLCache(maxsize=int(os.getenv("USER_CACHE_SIZE", "10000")),
+                       ttl=float(os.getenv("USER_CACHE_TTL", "60")))
+# Bumped by every invalidation, so a lookup that was in flight meanwhile is not cached
+_user_generation = 0
+
+def _decode_token(token: str) -> int:
+    """User id of a valid token; 401 otherwise."""
+    user_id = _token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    sub = payload.get("sub")
+    if not sub:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    user_id = int(sub)
+    exp = payload.get("exp")
+    _token_cache.put(token, user_id, ttl=exp - time.time() if exp else None)
+    return user_id
+
+async def _user_info(user_id: int) -> tuple[str, bool] | None:
+    """(username, is_admin) of this user, from the cache or the DB pool; None if there is no such user."""
+    info = _user_cache.get(user_id)
+    if info is not None:
+        return info
+    generation = _user_generation
+    row = await db_pool.run(user_by_id, user_id)
+    if row is None:
+        return None
+    info = (row.username, row.username in admin_usernames())
+    if generation == _user_generation:
+        _user_cache.put(user_id, info)
+    return info
+
+def invalidate_user(user_id: int):
+    """Forget the cached user and every cached token of it (call after changing the user)."""
+    global _user_generation
+    _user_generation += 1
+    _user_cache.pop(user_id)
+    _token_cache.discard_where(lambda _token, uid: uid == user_id)
+
+def auth_cache_stats() -> dict:
+    return {"tokens": _token_cache.stats(), "users": _user_cache.stats()}
+
 # --- Admin helpers ---
-def _admin_usernames() -> set[str]:
-    # Comma-separated usernames in env var ADMIN_USERS, default to 'admin'
+# Admin usernames, read once: from the file named by ADMIN_USERS_FILE (comma or newline
+# separated) if set, else from the comma-separated ADMIN_USERS (default 'admin').
+# reload_admin_users() re-reads them.
+_admins: set[str] | None = None
+
+def _read_admin_usernames() -> set[str]:
     raw = os.getenv("ADMIN_USERS", "admin")
-    return {x.strip() for x in raw.split(",") if x.strip()}
+    path = os.getenv("ADMIN_USERS_FILE")
+    if path:
+        try:
+            with open(path) as f:
+                raw = f.read()
+        except OSError:
+            pass
+    return {x.strip() for x in raw.replace("\n", ",").split(",") if x.strip()}
+
+def admin_usernames() -> set[str]:
+    global _admins
+    if _admins is None:
+        _admins = _read_admin_usernames()
+    return _admins
 
-def is_admin_user(db: Session, user_id: int) -> bool:
-    u = db.query(User).filter(User.id == user_id).first()
-    if not u:
-        return False
-    return u.username in _admin_usernames()
+def reload_admin_users() -> set[str]:
+    """Re-read the admin list and drop the cached roles."""
+    global _admins, _user_generation
+    _admins = _read_admin_usernames()
+    _user_generation += 1
+    _user_cache.clear()
+    return _admins
+
+async def check_admin(user_id: int) -> bool:
+    """Whether the user is an admin (cached; looked up on the DB pool on a miss)."""
+    info = await _user_info(user_id)
+    return info is not None and info[1]
 
 @router.get("/me", response_model=UserOut)
-def me(authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
+async def me(authorization: str | None = Header(default=None)):
     """Return the current user's profile and an is_admin flag."""
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
     token = authorization.split(" ", 1)[1]
-    u_tok = None
-    try:
-        u_tok = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-    except JWTError:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    sub = u_tok.get("sub")
-    if not sub:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    u = db.query(User).filter(User.id == int(sub)).first()
-    if not u:
+    user_id = _decode_token(token)
+    info = await _user_info(user_id)
+    if info is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     # piggyback is_admin in response via pydantic extra field
-    return UserOut(id=u.id, username=u.username, is_admin=is_admin_user(db, u.id))
-
+    return UserOut(id=user_id, username=info[0], is_admin=info[1])
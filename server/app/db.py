@@ -1,8 +1,46 @@
-from sqlalchemy import create_engine
+import os
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 
-DATABASE_URL = "sqlite:///./game.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# DATABASE_URL points somewhere else (tests use a throwaway file)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./game.db")
+
+# SQLite settings applied to every new connection:
+# - WAL lets readers (logins, player loads) run while the persistence thread writes
+# - synchronous=NORMAL: in WAL mode a commit no longer waits for fsync, only checkpoints do;
+#   a power loss can drop the last commits but never corrupts the database
+# - 16 MB page cache per connection, temp tables in memory, and a busy timeout so a
+#   writer waiting on another writer retries instead of failing with "database is locked"
+SQLITE_PRAGMAS = {
+    "journal_mode": os.getenv("SQLITE_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("SQLITE_SYNCHRONOUS", "NORMAL"),
+    "cache_size": int(os.getenv("SQLITE_CACHE_KB", "16000")) * -1,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+# Pooled connections: enough for the DB worker pool plus the player-state writer thread
+# (see workers.py and game/persistence.py), so none of them opens a connection per call
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+
+engine = create_engine(
+    DATABASE_URL,
+    # sqlite3 keeps up to this many prepared statements per connection
+    connect_args={"check_same_thread": False, "cached_statements": 256},
+    pool_size=POOL_SIZE,
+    max_overflow=POOL_SIZE,
+    pool_timeout=10,
+)
+
+@event.listens_for(engine, "connect")
+def _apply_pragmas(dbapi_conn, _record):
+    cur = dbapi_conn.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cur.execute(f"PRAGMA {name}={value}")
+    finally:
+        cur.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
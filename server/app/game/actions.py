@@ -1,6 +1,7 @@
 from __future__ import annotations
 from typing import Dict, Tuple
 from .state import GameState, Player
+from .trace import trace
 
 # Simultaneous resolution: collect desired destinations and apply if walkable
 
@@ -73,7 +74,7 @@ def resolve_actions(state: GameState, actions: Dict[int, dict], now: float):
         if pl:
             # Entrance transitions: if stepping onto entrance tiles, teleport to cave map
             try:
-                if state.tiles and state.tiles[y][x] in ('C', 'M'):
+                if state.tile_at(x, y) in ('C', 'M'):
                     # For both cave entrance and mine entrance, teleport to cave area
                     # Find a suitable location in the cave (for now, use same logic)
                     dx = 0 if x == pl.x else (1 if x > pl.x else -1)
@@ -83,7 +84,7 @@ def resolve_actions(state: GameState, actions: Dict[int, dict], now: float):
                         x, y = tx, ty
             except Exception:
                 pass
-            pl.x, pl.y = x, y
+            state.place_player(pl, x, y)
 
     # Resolve gather before casts (instant, local)
     for pid in gathers.keys():
@@ -179,15 +180,15 @@ def resolve_actions(state: GameState, actions: Dict[int, dict], now: float):
             
             if pdx != 0 or pdy != 0:
                 # Enter casting state
-                pl.casting = {
+                state.begin_cast(pl, {
                     "spell": "punch",
                     "target": (pdx, pdy),
                     "end": now + cast_time,
                     "rng": rng,
                     "rad": rad,
                     "mana": mana_cost,
-                }
-                print(f"DEBUG: Player {pid} begins casting Punch ({cast_time}s)")
+                })
+                trace.debug("spells", "Player {pid} begins casting Punch ({cast_time}s)", pid=pid, cast_time=cast_time)
         elif sname == "fireball" and pl.spells.get("fireball"):
             spec = pl.spells["fireball"]
             rng = int(spec.get("range", 3))
@@ -216,18 +217,19 @@ def resolve_actions(state: GameState, actions: Dict[int, dict], now: float):
             # mana and valid direction check
             if (pdx != 0 or pdy != 0) and pl.mp >= mana_cost:
                 # Enter casting state; movement and other actions blocked until finish
-                pl.casting = {
+                state.begin_cast(pl, {
                     "spell": "fireball",
                     "target": (pdx, pdy),
                     "end": now + cast_time,
                     "rng": rng,  # reuse as max travel distance in tiles
                     "rad": rad,
                     "mana": mana_cost,
-                }
+                })
                 # Optional: we could broadcast casting via state.snapshot metadata
-                print(f"DEBUG: Player {pid} begins casting Fireball ({cast_time}s)")
+                trace.debug("spells", "Player {pid} begins casting Fireball ({cast_time}s)", pid=pid, cast_time=cast_time)
             else:
-                print(f"DEBUG: Fireball cast failed - direction/mana. dir=({pdx},{pdy}), MP: {pl.mp} vs {mana_cost}")
+                trace.debug("spells", "Fireball cast failed - direction/mana. dir=({dx},{dy}), MP: {mp} vs {cost}",
+                            dx=pdx, dy=pdy, mp=pl.mp, cost=mana_cost)
         elif sname == "use_item":
             item = str(c.get("item") or "").strip()
             if not item:
@@ -248,135 +250,145 @@ def resolve_actions(state: GameState, actions: Dict[int, dict], now: float):
                 else:
                     state.add_notification(pid, "You don't have a Firestarter Orb.")
 
-    # Complete casting for players whose cast time has ended
-    for pid, pl in list(state.players.items()):
-        cast = getattr(pl, 'casting', None)
+    # Complete casts whose end time is due (state.begin_cast scheduled them)
+    for pid in state.cast_timers.pop_due(now):
+        pl = state.players.get(pid)
+        cast = getattr(pl, 'casting', None) if pl else None
         if not cast:
             continue
-        if now >= float(cast.get("end", 0)):
-            sname = cast.get("spell")
-            # For projectile, target stored as direction
-            pdx, pdy = cast.get("target", (0, 0))
-            rng = int(cast.get("rng", 6))
-            mana_cost = int(cast.get("mana", 5))
-            # finalize fireball: spawn a straight-line projectile
-            if sname == "fireball":
-                # Prefer to hit an immediately-adjacent enemy, regardless of chosen direction
-                # Check N/E/S/W for a monster first, then other players
-                adj_dirs = [(0, -1), (0, 1), (-1, 0), (1, 0)]
-                aimed_at_adjacent = False
-                try:
-                    # Monsters take priority as enemies
+        sname = cast.get("spell")
+        # For projectile, target stored as direction
+        pdx, pdy = cast.get("target", (0, 0))
+        rng = int(cast.get("rng", 6))
+        mana_cost = int(cast.get("mana", 5))
+        # finalize fireball: spawn a straight-line projectile
+        if sname == "fireball":
+            # Prefer to hit an immediately-adjacent enemy, regardless of chosen direction
+            # Check N/E/S/W for a monster first, then other players
+            adj_dirs = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+            aimed_at_adjacent = False
+            try:
+                # Monsters take priority as enemies
+                for ddx, ddy in adj_dirs:
+                    ax, ay = pl.x + ddx, pl.y + ddy
+                    if state.monster_at(ax, ay) is not None:
+                        pdx, pdy = ddx, ddy
+                        aimed_at_adjacent = True
+                        break
+                # If no adjacent monster, check for adjacent opposing players (PvP)
+                if not aimed_at_adjacent:
                     for ddx, ddy in adj_dirs:
                         ax, ay = pl.x + ddx, pl.y + ddy
-                        if any(m.x == ax and m.y == ay for m in state.monsters.values()):
+                        if state.player_at(ax, ay, exclude=pid) is not None:
                             pdx, pdy = ddx, ddy
                             aimed_at_adjacent = True
                             break
-                    # If no adjacent monster, check for adjacent opposing players (PvP)
-                    if not aimed_at_adjacent:
-                        for ddx, ddy in adj_dirs:
-                            ax, ay = pl.x + ddx, pl.y + ddy
-                            if any(pp.id != pid and pp.x == ax and pp.y == ay for pp in state.players.values()):
-                                pdx, pdy = ddx, ddy
-                                aimed_at_adjacent = True
-                                break
-                except Exception:
-                    pass
+            except Exception:
+                pass
 
-                if pdx != 0 or pdy != 0:
-                    # Start just in front of the caster (onto the adjacent tile if present)
-                    sx, sy = pl.x + pdx, pl.y + pdy
-                    # If starting tile is not walkable, cancel
-                    if state.is_walkable(sx, sy):
-                        # If the start tile already has a monster/player, apply damage immediately (no projectile needed)
-                        target_mon = next((m for m in state.monsters.values() if m.x == sx and m.y == sy), None)
-                        target_pl = None if target_mon else next((pp for pp in state.players.values() if pp.id != pid and pp.x == sx and pp.y == sy), None)
-                        if target_mon or target_pl:
-                            dmg = 10
-                            if target_mon:
-                                target_mon.hp = max(0, target_mon.hp - dmg)
-                                target_mon.last_hit_by = pid
-                                state.add_damage_number(sx, sy, dmg)
-                                print(f"DEBUG: Fireball immediate hit monster {target_mon.id} at ({sx},{sy}) for {dmg}")
-                            else:
-                                target_pl.hp = max(0, target_pl.hp - dmg)
-                                state.add_damage_number(sx, sy, dmg)
-                                print(f"DEBUG: Fireball immediate hit player {target_pl.id} at ({sx},{sy}) for {dmg}")
-                            # Spend mana and set cooldown
-                            pl.mp = max(0, pl.mp - mana_cost)
-                            cd_map = getattr(pl, 'cooldowns', None) or {}
-                            setattr(pl, 'cooldowns', cd_map)
-                            spec = pl.spells.get("fireball", {})
-                            cooldown = float(spec.get("cooldown", 2.0))
-                            cd_map["fireball"] = now + cooldown
+            if pdx != 0 or pdy != 0:
+                # Start just in front of the caster (onto the adjacent tile if present)
+                sx, sy = pl.x + pdx, pl.y + pdy
+                # If starting tile is not walkable, cancel
+                if state.is_walkable(sx, sy):
+                    # If the start tile already has a monster/player, apply damage immediately (no projectile needed)
+                    target_mon = state.monster_at(sx, sy)
+                    target_pl = None if target_mon else state.player_at(sx, sy, exclude=pid)
+                    if target_mon or target_pl:
+                        dmg = 10
+                        if target_mon:
+                            target_mon.hp = max(0, target_mon.hp - dmg)
+                            target_mon.last_hit_by = pid
+                            state.add_damage_number(sx, sy, dmg)
+                            trace.debug("combat", "Fireball immediate hit monster {id} at ({x},{y}) for {dmg}",
+                                        id=target_mon.id, x=sx, y=sy, dmg=dmg)
+                        else:
+                            target_pl.hp = max(0, target_pl.hp - dmg)
+                            state.add_damage_number(sx, sy, dmg)
+                            trace.debug("combat", "Fireball immediate hit player {id} at ({x},{y}) for {dmg}",
+                                        id=target_pl.id, x=sx, y=sy, dmg=dmg)
+                        # Spend mana and set cooldown
+                        pl.mp = max(0, pl.mp - mana_cost)
+                        cd_map = getattr(pl, 'cooldowns', None) or {}
+                        setattr(pl, 'cooldowns', cd_map)
+                        spec = pl.spells.get("fireball", {})
+                        cooldown = float(spec.get("cooldown", 2.0))
+                        cd_map["fireball"] = now + cooldown
+                    else:
+                        # Slow the projectile so clients can see it travel across multiple ticks
+                        speed = 1  # tiles per tick (was 2)
+                        ttl = rng  # max tiles to travel
+                        if state.spawn_projectile(pid, sx, sy, pdx, pdy, speed, ttl, dmg=10) is None:
+                            # Server overloaded: the cast fizzles without costing mana or cooldown
+                            state.add_notification(pid, "Your fireball fizzles. Try again in a moment.")
+                            trace.debug("spells", "Projectile cap reached; Fireball from player {pid} not spawned",
+                                        pid=pid)
                         else:
-                            # Slow the projectile so clients can see it travel across multiple ticks
-                            speed = 1  # tiles per tick (was 2)
-                            ttl = rng  # max tiles to travel
-                            state.spawn_projectile(pid, sx, sy, pdx, pdy, speed, ttl, dmg=10)
                             pl.mp = max(0, pl.mp - mana_cost)
                             cd_map = getattr(pl, 'cooldowns', None) or {}
                             setattr(pl, 'cooldowns', cd_map)
                             spec = pl.spells.get("fireball", {})
                             cooldown = float(spec.get("cooldown", 2.0))
                             cd_map["fireball"] = now + cooldown
-                            print(f"DEBUG: Player {pid} launched Fireball projectile; MP now {pl.mp}; CD until {cd_map['fireball']:.2f}")
-                    else:
-                        print("DEBUG: Fireball start tile blocked; projectile not spawned")
-            elif sname == "punch":
-                # Punch: Melee attack, hits immediately adjacent target only
-                # Check all 8 adjacent tiles for a target
-                adj_dirs = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
-                target_hit = False
-                
+                            trace.debug("spells", "Player {pid} launched Fireball projectile; MP now {mp}; CD until {cd:.2f}",
+                                        pid=pid, mp=pl.mp, cd=cd_map['fireball'])
+                else:
+                    trace.debug("spells", "Fireball start tile blocked; projectile not spawned")
+        elif sname == "punch":
+            # Punch: Melee attack, hits immediately adjacent target only
+            # Check all 8 adjacent tiles for a target
+            adj_dirs = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+            target_hit = False
+            
+            for ddx, ddy in adj_dirs:
+                ax, ay = pl.x + ddx, pl.y + ddy
+                # Try to hit monsters first (priority targets)
+                target_mon = state.monster_at(ax, ay)
+                if target_mon:
+                    dmg = 3  # Weak damage - takes 3 hits to kill slime (9 HP)
+                    target_mon.hp = max(0, target_mon.hp - dmg)
+                    target_mon.last_hit_by = pid
+                    state.add_damage_number(ax, ay, dmg)
+                    # Use Monster.kind (field name) for message
+                    try:
+                        mon_name = getattr(target_mon, 'kind', 'enemy')
+                    except Exception:
+                        mon_name = 'enemy'
+                    state.add_notification(pid, f"You punch the {mon_name} for {dmg} damage!")
+                    target_hit = True
+                    trace.debug("combat", "Player {pid} punched monster {id} for {dmg} damage",
+                                pid=pid, id=target_mon.id, dmg=dmg)
+                    break
+            
+            if not target_hit:
+                # Check for other players (PvP)
                 for ddx, ddy in adj_dirs:
                     ax, ay = pl.x + ddx, pl.y + ddy
-                    # Try to hit monsters first (priority targets)
-                    target_mon = next((m for m in state.monsters.values() if m.x == ax and m.y == ay), None)
-                    if target_mon:
-                        dmg = 3  # Weak damage - takes 3 hits to kill slime (9 HP)
-                        target_mon.hp = max(0, target_mon.hp - dmg)
-                        target_mon.last_hit_by = pid
+                    target_pl = state.player_at(ax, ay, exclude=pid)
+                    if target_pl:
+                        dmg = 3
+                        target_pl.hp = max(0, target_pl.hp - dmg)
                         state.add_damage_number(ax, ay, dmg)
-                        # Use Monster.kind (field name) for message
-                        try:
-                            mon_name = getattr(target_mon, 'kind', 'enemy')
-                        except Exception:
-                            mon_name = 'enemy'
-                        state.add_notification(pid, f"You punch the {mon_name} for {dmg} damage!")
+                        state.add_notification(pid, f"You punch {target_pl.name} for {dmg} damage!")
+                        state.add_notification(target_pl.id, f"{pl.name} punches you for {dmg} damage!")
                         target_hit = True
-                        print(f"DEBUG: Player {pid} punched monster {target_mon.id} for {dmg} damage")
+                        trace.debug("combat", "Player {pid} punched player {id} for {dmg} damage",
+                                    pid=pid, id=target_pl.id, dmg=dmg)
                         break
-                
-                if not target_hit:
-                    # Check for other players (PvP)
-                    for ddx, ddy in adj_dirs:
-                        ax, ay = pl.x + ddx, pl.y + ddy
-                        target_pl = next((pp for pp in state.players.values() if pp.id != pid and pp.x == ax and pp.y == ay), None)
-                        if target_pl:
-                            dmg = 3
-                            target_pl.hp = max(0, target_pl.hp - dmg)
-                            state.add_damage_number(ax, ay, dmg)
-                            state.add_notification(pid, f"You punch {target_pl.name} for {dmg} damage!")
-                            state.add_notification(target_pl.id, f"{pl.name} punches you for {dmg} damage!")
-                            target_hit = True
-                            print(f"DEBUG: Player {pid} punched player {target_pl.id} for {dmg} damage")
-                            break
-                
-                if not target_hit:
-                    state.add_notification(pid, "Your punch hits nothing but air!")
-                
-                # Set punch cooldown (punch has no mana cost)
-                cd_map = getattr(pl, 'cooldowns', None) or {}
-                setattr(pl, 'cooldowns', cd_map)
-                spec = pl.spells.get("punch", {})
-                cooldown = float(spec.get("cooldown", 1.0))
-                cd_map["punch"] = now + cooldown
-                print(f"DEBUG: Player {pid} completed punch; CD until {cd_map['punch']:.2f}")
-                        
-            # clear casting state regardless
-            pl.casting = None
+            
+            if not target_hit:
+                state.add_notification(pid, "Your punch hits nothing but air!")
+            
+            # Set punch cooldown (punch has no mana cost)
+            cd_map = getattr(pl, 'cooldowns', None) or {}
+            setattr(pl, 'cooldowns', cd_map)
+            spec = pl.spells.get("punch", {})
+            cooldown = float(spec.get("cooldown", 1.0))
+            cd_map["punch"] = now + cooldown
+            trace.debug("spells", "Player {pid} completed punch; CD until {cd:.2f}", pid=pid, cd=cd_map['punch'])
+                    
+        # clear casting state regardless
+        pl.casting = None
 
     # Append chat messages for broadcast this tick
     if chats:
@@ -403,7 +415,8 @@ def resolve_pending_spells(state: GameState):
             continue  # Caster disconnected
             
         if spell.spell_name == "fireball":
-            print(f"DEBUG: Resolving fireball from player {spell.caster_id} at ({spell.target_x}, {spell.target_y})")
+            trace.debug("spells", "Resolving fireball from player {pid} at ({x}, {y})",
+                        pid=spell.caster_id, x=spell.target_x, y=spell.target_y)
             
             # Create effect tiles
             effect_count = 0
@@ -412,10 +425,10 @@ def resolve_pending_spells(state: GameState):
                     if abs(dx) + abs(dy) <= spell.cast_radius:
                         ex, ey = spell.target_x + dx, spell.target_y + dy
                         if state.is_walkable(ex, ey):
-                            state.effects[(ex, ey)] = (1, spell.caster_id)  # (ttl, source_pid)
+                            state.add_effect(ex, ey, spell.caster_id, ttl=1)
                             effect_count += 1
-                            print(f"DEBUG: Added delayed effect at ({ex}, {ey})")
-            print(f"DEBUG: Created {effect_count} delayed effect tiles")
+                            trace.debug("effects", "Added delayed effect at ({x}, {y})", x=ex, y=ey)
+            trace.debug("effects", "Created {count} delayed effect tiles", count=effect_count)
             
             # Check if any targets have moved out of the ORIGINAL cast range
             # (This is the dodge mechanic - if they moved far enough from the original caster position, they avoid damage)
@@ -428,24 +441,22 @@ def resolve_pending_spells(state: GameState):
                         check_x, check_y = spell.target_x + dx, spell.target_y + dy
                         
                         # Check players in this tile
-                        for player in state.players.values():
-                            if player.x == check_x and player.y == check_y:
-                                # Calculate if this player would have been in range when spell was originally cast
-                                original_range_to_target = abs(check_x - original_caster_x) + abs(check_y - original_caster_y)
-                                if original_range_to_target > spell.cast_range:
-                                    # Player moved out of original cast range - they dodged!
-                                    print(f"DEBUG: Player {player.id} at ({check_x}, {check_y}) dodged fireball by moving out of range!")
-                                    # Remove the effect for this tile to prevent damage
-                                    if (check_x, check_y) in state.effects:
-                                        del state.effects[(check_x, check_y)]
+                        for player in state.players_at(check_x, check_y):
+                            # Calculate if this player would have been in range when spell was originally cast
+                            original_range_to_target = abs(check_x - original_caster_x) + abs(check_y - original_caster_y)
+                            if original_range_to_target > spell.cast_range:
+                                # Player moved out of original cast range - they dodged!
+                                trace.debug("spells", "Player {id} at ({x}, {y}) dodged fireball by moving out of range!",
+                                            id=player.id, x=check_x, y=check_y)
+                                # Remove the effect for this tile to prevent damage
+                                state.remove_effect(check_x, check_y)
                         
                         # Check monsters in this tile (they can dodge too!)
-                        for monster in state.monsters.values():
-                            if monster.x == check_x and monster.y == check_y:
-                                original_range_to_target = abs(check_x - original_caster_x) + abs(check_y - original_caster_y)
-                                if original_range_to_target > spell.cast_range:
-                                    print(f"DEBUG: Monster {monster.id} at ({check_x}, {check_y}) dodged fireball by moving out of range!")
-                                    if (check_x, check_y) in state.effects:
-                                        del state.effects[(check_x, check_y)]
+                        for monster in state.monsters_at(check_x, check_y):
+                            original_range_to_target = abs(check_x - original_caster_x) + abs(check_y - original_caster_y)
+                            if original_range_to_target > spell.cast_range:
+                                trace.debug("spells", "Monster {id} at ({x}, {y}) dodged fireball by moving out of range!",
+                                            id=monster.id, x=check_x, y=check_y)
+                                state.remove_effect(check_x, check_y)
 
     # NOTE: Effect decay moved to engine._tick() after damage application
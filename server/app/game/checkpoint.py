@@ -0,0 +1,537 @@
+from __future__ import annotations
+import json
+import os
+import queue
+import re
+import struct
+import threading
+import time
+import zlib
+from functools import partial
+from typing import Awaitable, Callable, Iterable, Iterator, List, Optional, Tuple
+from .state import Player, Monster, Projectile, PendingSpell
+from .clock import ReplayClock
+from .persistence import player_record, apply_record
+from .trace import trace, WARN
+
+try:
+    import msgpack
+except ImportError:  # checkpoints and journal fall back to JSON
+    msgpack = None
+
+# Crash-safe world checkpoints plus an append-only journal of tick action batches.
+# Every `interval_ticks` ticks the tick captures the world as plain lists (players,
+# monsters, projectiles, NPCs, resources, id counters, the engine clock and RNG state and
+# every timer that affects the simulation) and hands it to a writer thread, which
+# compresses it, writes `checkpoint-<seq>.bin` through a temporary file and an atomic
+# rename, and from then on appends each tick's entry (its clock reading, the action batch
+# given to resolve_actions, the players created since the previous tick and the overload
+# degradation level the tick ran with) to
+# `journal-<seq>.log`. On start, recover() loads the newest readable checkpoint and replays
+# the journal segments from there by running the engine's ticks on the recorded entries.
+#
+# Sizes stay bounded by what players changed, not by the nominal world size: chunked
+# worlds store the generated chunk keys and the touched resources only (chunks regenerate
+# from the seed), and old checkpoints and segments are deleted once a newer checkpoint
+# is on disk. Damage numbers and notifications are display-only and not saved.
+#
+# A tick depends on nothing but the world, its entry and the engine RNG (see clock.py), so
+# replay is exact. The same files make session recordings for offline replay
+# (scripts/replay_session.py): a Checkpointer with interval_ticks=0 and keep=0 writes one
+# checkpoint and then journals every tick, with a digest of the world every
+# `digest_every` ticks so the replay can prove it reached the same state.
+
+FORMAT_VERSION = 2
+_MAGIC = b"RPGCKPT"
+_FRAME = struct.Struct("<II")  # payload length, crc32
+_NAME = re.compile(r"^(checkpoint|journal)-(\d+)\.(bin|log)$")
+
+
+def _pack(obj) -> bytes:
+    if msgpack is not None:
+        return b"m" + msgpack.packb(obj, use_bin_type=True)
+    return b"j" + json.dumps(obj, separators=(",", ":")).encode()
+
+
+def _unpack(data: bytes):
+    if data[:1] == b"m":
+        if msgpack is None:
+            raise ValueError("msgpack is not installed")
+        return msgpack.unpackb(data[1:], raw=False)
+    if data[:1] == b"j":
+        return json.loads(data[1:])
+    raise ValueError("unknown encoding")
+
+
+# -------------------- Capture / restore (event loop) --------------------
+def encode_player(p: Player) -> list:
+    return [p.id, player_record(p)]
+
+
+def _decode_player(entry: list) -> Player:
+    pid, rec = entry
+    p = Player(id=pid, user_id=rec["user_id"], x=rec["x"], y=rec["y"])
+    apply_record(p, rec)
+    # apply_record revives; a checkpoint keeps dead players dead until their respawn
+    p.hp = int(rec["hp"])
+    return p
+
+
+def _world_key(state) -> list:
+    return [state.world_seed, state.world_w, state.world_h,
+            state.chunks.size if state.chunks is not None else 0, state.map_version]
+
+
+def engine_config(engine) -> dict:
+    """GameEngine arguments that change the simulation or what is sent, for rebuilding it offline."""
+    return {"tick_seconds": engine.tick_seconds, "send_seconds": engine.send_seconds,
+            "keyframe_interval": engine.keyframe_interval,
+            "view_radius": engine.view_radius, "activation_radius": engine.activation_radius,
+            "lod_band": engine.lod_band, "lod_interval": engine.lod_interval,
+            "projectile_cap": engine.projectile_cap}
+
+
+def state_digest(engine) -> int:
+    """CRC of the simulated world: players, monsters, projectiles, resources and the RNG."""
+    state = engine.state
+    crc = zlib.crc32(repr([(p.id, p.x, p.y, p.hp, p.mp) for p in state.players.values()]).encode())
+    crc = zlib.crc32(repr([(m.id, m.x, m.y, m.hp, m.aggro) for m in state.monsters.values()]).encode(), crc)
+    crc = zlib.crc32(repr([(pr.id, pr.x, pr.y, pr.ttl) for pr in state.projectiles.values()]).encode(), crc)
+    return zlib.crc32(repr((engine.tick_index, len(state.resources), engine.rng.getstate())).encode(), crc)
+
+
+def capture_state(engine, now: float, reset: bool = False) -> dict:
+    """Plain-data copy of everything a restart needs. Runs on the tick; nothing in the
+    result is shared with live objects, so the writer thread can encode it meanwhile.
+    `reset` marks a world replaced outside the tick (admin wipe), where replay must
+    continue from this checkpoint instead of the ticks before it."""
+    state = engine.state
+    version, internal, gauss = engine.rng.getstate()
+    data = {
+        "format": FORMAT_VERSION,
+        "world": _world_key(state),
+        "engine": engine_config(engine),
+        "reset": reset,
+        "tick": [state.tick, engine.tick_index],
+        # Deadlines below are absolute readings of the engine clock
+        "clock": now,
+        "rng": [version, list(internal), gauss],
+        "ids": [state._next_player_id, state._next_monster_id, state._next_projectile_id, state._next_npc_id],
+        "players": [encode_player(p) for p in state.players.values()],
+        "monsters": [[m.id, m.kind, m.x, m.y, m.hp, m.hp_max, m.dmg, m.speed, m.xp_reward, m.last_hit_by,
+                      m.aggro, m.spawn_x, m.spawn_y, m.roam_radius, m.last_attack_time]
+                     for m in state.monsters.values()],
+        "projectiles": [[pr.id, pr.caster_id, pr.x, pr.y, pr.dx, pr.dy, pr.speed, pr.ttl, pr.dmg, pr.just_spawned]
+                        for pr in state.projectiles.values()],
+        "npcs": [dict(n) for n in state.npcs.values()],
+        "respawns": [[due, list(item), key] for due, item, key in engine._monster_respawns.entries()],
+        "effects": [[x, y, due, src] for (x, y), (due, src) in state.effects.items()],
+        "casts": [[p.id, dict(p.cooldowns), dict(p.casting) if p.casting else None]
+                  for p in state.players.values() if p.cooldowns or p.casting],
+        "castTimers": [[due, pid] for due, pid, _ in state.cast_timers.entries()],
+        "pendingSpells": [[s.caster_id, s.spell_name, s.target_x, s.target_y, s.cast_range, s.cast_radius,
+                           s.ticks_remaining, list(s.original_caster_pos)] for s in state.pending_spells],
+    }
+    world = state.chunks
+    if world is None:
+        data["resources"] = [[x, y, r.get("type"), r.get("hp", 1)] for (x, y), r in state.resources.items()]
+    else:
+        changed = []
+        for chunk in world.chunks.values():
+            for pos in chunk.changed:
+                r = state.resources.get(pos)
+                changed.append([pos[0], pos[1], r.get("hp", 1) if r is not None else 0])
+        data["chunks"] = [[cx, cy] for (cx, cy) in world.chunks]
+        data["changed"] = changed
+    return data
+
+
+def restore_state(engine, data: dict) -> bool:
+    """Replace the engine's world with a captured one. False (and nothing changed) if the
+    checkpoint belongs to another world (seed, size, kind or generated map differ).
+    Deadlines keep their clock values: resume the engine clock at data["clock"]."""
+    state = engine.state
+    if data.get("format") != FORMAT_VERSION:
+        return False
+    state.ensure_map()
+    if data["world"] != _world_key(state):
+        return False
+
+    world = state.chunks
+    if world is None:
+        state.resources = {(x, y): {"type": t, "hp": hp} for x, y, t, hp in data["resources"]}
+    else:
+        # From scratch: chunks generated here but not in the checkpoint (or from before a
+        # wipe) must not survive
+        world.reset()
+        state.resources.clear()
+        for cx, cy in data["chunks"]:
+            state.resources.update(world.generate(cx, cy).resources)
+        for x, y, hp in data["changed"]:
+            pos = (x, y)
+            if hp <= 0:
+                state.resources.pop(pos, None)
+            elif pos in state.resources:
+                state.resources[pos]["hp"] = hp
+            world.resource_changed(x, y)
+    state.terrain_version += 1
+
+    state.players.clear()
+    state._player_tiles.clear()
+    for entry in data["players"]:
+        state.add_player(_decode_player(entry))
+    state.clear_monsters()
+    for (mid, kind, x, y, hp, hp_max, dmg, speed, xp_reward, last_hit_by, aggro,
+         spawn_x, spawn_y, roam_radius, last_attack_time) in data["monsters"]:
+        state.add_monster(Monster(id=mid, kind=kind, x=x, y=y, hp=hp, hp_max=hp_max, dmg=dmg, speed=speed,
+                                  xp_reward=xp_reward, last_hit_by=last_hit_by, aggro=aggro,
+                                  spawn_x=spawn_x, spawn_y=spawn_y, roam_radius=roam_radius,
+                                  last_attack_time=last_attack_time))
+    state.projectiles = {
+        pid: Projectile(id=pid, caster_id=caster, x=x, y=y, dx=dx, dy=dy, speed=speed, ttl=ttl, dmg=dmg,
+                        just_spawned=just_spawned)
+        for pid, caster, x, y, dx, dy, speed, ttl, dmg, just_spawned in data["projectiles"]
+    }
+    state.npcs = {n["id"]: n for n in data["npcs"]}
+    (state._next_player_id, state._next_monster_id,
+     state._next_projectile_id, state._next_npc_id) = data["ids"]
+    state.tick, engine.tick_index = data["tick"]
+    version, internal, gauss = data["rng"]
+    engine.rng.setstate((version, tuple(internal), gauss))
+
+    # Timed state; display-only state (damage numbers, notifications) starts empty
+    state.damage_numbers.clear()
+    state.tick_timers.clear()
+    state.effects.clear()
+    for x, y, due, src in data["effects"]:
+        state.effects[(x, y)] = (due, src)
+        state.tick_timers.schedule(due, partial(state._expire_effect, (x, y)), key=("effect", (x, y)))
+    for pid, cooldowns, casting in data["casts"]:
+        p = state.players[pid]
+        p.cooldowns = cooldowns
+        if casting and isinstance(casting.get("target"), list):
+            casting["target"] = tuple(casting["target"])
+        p.casting = casting
+    state.cast_timers.clear()
+    for due, pid in data["castTimers"]:
+        state.cast_timers.schedule(due, pid, key=pid)
+    state.pending_spells = [
+        PendingSpell(caster_id=caster, spell_name=name, target_x=tx, target_y=ty, cast_range=rng, cast_radius=rad,
+                     ticks_remaining=left, original_caster_pos=tuple(origin))
+        for caster, name, tx, ty, rng, rad, left, origin in data["pendingSpells"]
+    ]
+    engine._monster_respawns.clear()
+    for due, item, key in data["respawns"]:
+        # Keys are tuples such as ("respawn", monster id); the encoding turned them into lists
+        engine._monster_respawns.schedule(due, tuple(item), key=tuple(key) if isinstance(key, list) else key)
+    return True
+
+
+def add_joined_player(state, entry: list):
+    """Replay a journaled player creation (skipped if the id is already in the world)."""
+    p = _decode_player(entry)
+    if p.id in state.players:
+        return
+    state.add_player(p)
+    state._next_player_id = max(state._next_player_id, p.id + 1)
+
+
+async def replay_journal(engine, entries: Iterable[list], timings: Optional[List[float]] = None,
+                         after_tick: Optional[Callable[[], Awaitable]] = None) -> dict:
+    """Run the engine's ticks on journal entries, each with its recorded clock reading, and
+    check the entries that carry a digest. Appends each tick's wall time (including the
+    awaited after_tick(), if given) to `timings`. The overload controller is off meanwhile:
+    each tick runs with its recorded degradation level."""
+    live_clock = engine.clock
+    clock = engine.clock = ReplayClock()
+    overload, engine.overload = engine.overload, None
+    ticks = mismatches = 0
+    first_mismatch = last_now = None
+    try:
+        for entry in entries:
+            tick_index, now, joined, actions, digest = entry[:5]
+            # Journals written before overload control have no level
+            engine.degrade = entry[5] if len(entry) > 5 else 0
+            for record in joined:
+                add_joined_player(engine.state, record)
+            engine.tick_index = tick_index - 1
+            engine._action_queue = {pid: msg for pid, msg in actions if pid in engine.state.players}
+            clock.now = last_now = now
+            t0 = time.perf_counter()
+            await engine._tick()
+            if after_tick is not None:
+                await after_tick()
+            if timings is not None:
+                timings.append(time.perf_counter() - t0)
+            ticks += 1
+            if digest is not None and state_digest(engine) != digest:
+                mismatches += 1
+                if first_mismatch is None:
+                    first_mismatch = tick_index
+    finally:
+        engine.clock = live_clock
+        engine.overload = overload
+        engine.degrade = overload.level if overload is not None else 0
+    return {"ticks": ticks, "digestMismatches": mismatches, "firstMismatch": first_mismatch, "clock": last_now}
+
+
+# -------------------- Files --------------------
+def write_checkpoint(path: str, data: dict) -> int:
+    """Write atomically (temporary file, fsync, rename). Returns the file size."""
+    body = _MAGIC + bytes([FORMAT_VERSION]) + zlib.compress(_pack(data), 6)
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(body)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return len(body)
+
+
+def read_checkpoint(path: str) -> Optional[dict]:
+    try:
+        with open(path, "rb") as f:
+            body = f.read()
+        if not body.startswith(_MAGIC) or body[len(_MAGIC)] != FORMAT_VERSION:
+            return None
+        return _unpack(zlib.decompress(body[len(_MAGIC) + 1:]))
+    except (OSError, ValueError, IndexError, zlib.error):
+        return None
+
+
+def journal_frame(entry) -> bytes:
+    payload = _pack(entry)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_journal(path: str) -> Iterator[list]:
+    """Entries of a journal segment, stopping at the first torn or corrupt frame."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return
+    pos = 0
+    while pos + _FRAME.size <= len(data):
+        length, crc = _FRAME.unpack_from(data, pos)
+        payload = data[pos + _FRAME.size:pos + _FRAME.size + length]
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            return
+        try:
+            yield _unpack(payload)
+        except ValueError:
+            return
+        pos += _FRAME.size + length
+
+
+# -------------------- Checkpointer --------------------
+class Checkpointer:
+    """Owns the checkpoint directory: queues captures and journal entries from the tick and
+    writes them on its own thread; recover() rebuilds the world at startup."""
+
+    def __init__(self, directory: str, interval_ticks: int = 240, keep: int = 2, fsync_seconds: float = 1.0,
+                 digest_every: int = 0):
+        self.directory = directory
+        # 0: no periodic checkpoints (only start(), wipes and explicit checkpoint() calls)
+        self.interval_ticks = max(0, int(interval_ticks))
+        # 0: never delete anything (session recordings)
+        self.keep = max(0, int(keep))
+        # Journal a state_digest() with every n-th tick (0: none)
+        self.digest_every = max(0, int(digest_every))
+        self.fsync_seconds = max(0.05, float(fsync_seconds))
+        self.seq = max((seq for _, seq, _ in self._files()), default=0)
+        self._since = 0
+        self._queue: "queue.Queue[tuple]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        # Set while recover() replays the journal, so replayed ticks are not journaled again
+        self.replaying = False
+        # Stats (see stats())
+        self.last_bytes = 0
+        self.last_capture_seconds = 0.0
+        self.last_write_seconds = 0.0
+        self.written = 0
+        self.failures = 0
+        self.journal_bytes = 0
+
+    # -------------------- Tick side --------------------
+    def record_tick(self, engine, now: float, actions: dict, joined: List[list]):
+        """Journal this tick's clock reading, actions and joins; take a checkpoint every
+        interval_ticks."""
+        if self.replaying or self._thread is None:
+            return
+        digest = None
+        if self.digest_every and engine.tick_index % self.digest_every == 0:
+            digest = state_digest(engine)
+        self._queue.put(("entry", [engine.tick_index, now, joined, [[pid, msg] for pid, msg in actions.items()],
+                                   digest, engine.degrade]))
+        self._since += 1
+        if self.interval_ticks and self._since >= self.interval_ticks:
+            self.checkpoint(engine, now)
+
+    def checkpoint(self, engine, now: Optional[float] = None, reset: bool = False):
+        """Capture the world now (on the tick, or between ticks under the engine lock) and
+        queue it for writing. `now` defaults to a fresh reading of the engine clock."""
+        t0 = time.perf_counter()
+        data = capture_state(engine, engine.clock() if now is None else now, reset=reset)
+        self.last_capture_seconds = time.perf_counter() - t0
+        self.seq += 1
+        self._since = 0
+        self._queue.put(("checkpoint", self.seq, data))
+
+    # -------------------- Recovery --------------------
+    async def recover(self, engine) -> Optional[dict]:
+        """Load the newest readable checkpoint and replay the journal after it. Returns a
+        summary, or None when there was nothing (usable) to recover."""
+        checkpoints = sorted((seq, path) for kind, seq, path in self._files() if kind == "checkpoint")
+        for seq, path in reversed(checkpoints):
+            data = read_checkpoint(path)
+            if data is None:
+                trace.event("world", WARN, "Unreadable checkpoint {path}, trying an older one", path=path)
+                continue
+            if not restore_state(engine, data):
+                trace.event("world", WARN, "Checkpoint {path} is from another world; starting fresh", path=path)
+                return None
+            break
+        else:
+            return None
+        segments = sorted((s, p) for kind, s, p in self._files() if kind == "journal" and s >= seq)
+        self.replaying = True
+        try:
+            result = await replay_journal(engine, self._continuous(segments, engine.tick_index))
+        finally:
+            self.replaying = False
+        # Carry on from the last recorded time, so restored deadlines keep their meaning
+        resume = getattr(engine.clock, "resume_at", None)
+        if resume is not None:
+            resume(data["clock"] if result["clock"] is None else result["clock"])
+        if result["digestMismatches"]:
+            trace.event("world", WARN, "Journal replay diverged from tick {tick} ({n} digest mismatches)",
+                        tick=result["firstMismatch"], n=result["digestMismatches"])
+        trace.info("world", "Recovered checkpoint {seq} and replayed {n} ticks", seq=seq, n=result["ticks"])
+        return {"checkpoint": seq, "replayedTicks": result["ticks"], "tick": engine.tick_index}
+
+    def _continuous(self, segments: List[Tuple[int, str]], tick_index: int) -> Iterator[list]:
+        """Journal entries of `segments` up to the first one that goes back in ticks. An admin
+        wipe restarts the tick index and opens a new segment from a reset checkpoint; when that
+        checkpoint is unreadable and recovery fell back to an older one, its journal belongs to
+        the wiped world and must not be replayed on the world before the wipe."""
+        for _, path in segments:
+            for entry in read_journal(path):
+                if entry[0] <= tick_index:
+                    trace.event("world", WARN, "Journal {path} restarts at tick {tick} after a wipe whose "
+                                "checkpoint is unreadable; recovering the world before the wipe",
+                                path=path, tick=entry[0])
+                    return
+                tick_index = entry[0]
+                yield entry
+
+    def session(self) -> List[Tuple[int, Optional[str], Optional[str]]]:
+        """(seq, checkpoint path or None, journal path or None) for every seq on disk, oldest first."""
+        by_seq: dict = {}
+        for kind, seq, path in self._files():
+            by_seq.setdefault(seq, [None, None])[kind == "journal"] = path
+        return [(seq, ckpt, journal) for seq, (ckpt, journal) in sorted(by_seq.items())]
+
+    # -------------------- Writer thread --------------------
+    def start(self, engine):
+        """Start writing: a first checkpoint of the current world opens the journal."""
+        if self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="checkpoint-writer", daemon=True)
+        self._thread.start()
+        self.checkpoint(engine)
+
+    def stop(self, timeout: float = 30.0):
+        """Write everything queued (take a last checkpoint() first for a clean restart), then stop."""
+        if self._thread is None:
+            return
+        self._queue.put(("stop",))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _path(self, kind: str, seq: int) -> str:
+        ext = "bin" if kind == "checkpoint" else "log"
+        return os.path.join(self.directory, f"{kind}-{seq:08d}.{ext}")
+
+    def _files(self) -> List[Tuple[str, int, str]]:
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        out = []
+        for name in names:
+            m = _NAME.match(name)
+            if m:
+                out.append((m.group(1), int(m.group(2)), os.path.join(self.directory, name)))
+        return out
+
+    def _run(self):
+        journal = None
+        dirty = False
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_seconds)
+            except queue.Empty:
+                if journal is not None and dirty:
+                    os.fsync(journal.fileno())
+                    dirty = False
+                continue
+            kind = item[0]
+            try:
+                if kind == "entry":
+                    if journal is None:
+                        # No checkpoint written yet in this run: keep extending the newest segment
+                        journal = open(self._path("journal", self.seq), "ab")
+                    frame = journal_frame(item[1])
+                    journal.write(frame)
+                    journal.flush()
+                    self.journal_bytes += len(frame)
+                    dirty = True
+                elif kind == "checkpoint":
+                    _, seq, data = item
+                    t0 = time.perf_counter()
+                    self.last_bytes = write_checkpoint(self._path("checkpoint", seq), data)
+                    self.last_write_seconds = time.perf_counter() - t0
+                    self.written += 1
+                    # Entries from here on belong after this checkpoint
+                    if journal is not None:
+                        os.fsync(journal.fileno())
+                        journal.close()
+                    journal = open(self._path("journal", seq), "ab")
+                    self.journal_bytes = 0
+                    dirty = False
+                    self._prune(seq)
+                else:
+                    if journal is not None:
+                        os.fsync(journal.fileno())
+                        journal.close()
+                    return
+            except Exception as ex:
+                # A failed checkpoint leaves the previous one and its (still growing) segment in place
+                self.failures += 1
+                trace.event("world", WARN, "Checkpoint writer: {kind} failed: {error}", kind=kind, error=str(ex))
+
+    def _prune(self, newest: int):
+        """Delete checkpoints beyond the `keep` newest, and journal segments older than the oldest kept."""
+        if not self.keep:
+            return
+        files = self._files()
+        kept = sorted((s for k, s, _ in files if k == "checkpoint" and s <= newest), reverse=True)[:self.keep]
+        oldest = min(kept, default=newest)
+        for kind, seq, path in files:
+            if seq < oldest:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "checkpoint_bytes": self.last_bytes,
+            "checkpoint_capture_ms": round(self.last_capture_seconds * 1000, 3),
+            "checkpoint_write_ms": round(self.last_write_seconds * 1000, 3),
+            "checkpoints_written": self.written,
+            "checkpoint_failures": self.failures,
+            "journal_bytes": self.journal_bytes,
+        }
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import hashlib
+import random
+from typing import Dict, List, Optional, Set, Tuple
+from .tilemap import TileMap, GRASS, WATER, CAVE, MINE
+
+# Large worlds made of fixed-size chunks generated on demand.
+# Each chunk is produced from (world seed, chunk coordinates) alone, so chunks can be
+# generated in any order, and only when a player first comes near them: memory and
+# generation time follow the explored area, not the nominal world size. Tiles of chunks
+# that do not exist yet are unwalkable. GameState merges a new chunk's resources and
+# monster spawns into the live world (see GameState.ensure_chunks_near).
+
+CHUNK_SIZE = 32
+
+# Tree chance per grass tile and number of slime spawn points per chunk
+TREE_DENSITY = 0.06
+SLIMES_PER_CHUNK = (0, 1, 1, 2, 3)
+
+
+class Chunk:
+    """One generated square of the world. Coordinates in `resources` and `spawns` are
+    world coordinates; `tilemap` is local to the chunk."""
+    __slots__ = ("cx", "cy", "x0", "y0", "tilemap", "resources", "spawns", "changed", "_passable", "_records")
+
+    def __init__(self, cx: int, cy: int, x0: int, y0: int, tilemap: TileMap):
+        self.cx = cx
+        self.cy = cy
+        self.x0 = x0
+        self.y0 = y0
+        self.tilemap = tilemap
+        # (x, y) -> resource dict, as in GameState.resources
+        self.resources: Dict[Tuple[int, int], dict] = {}
+        # (kind, x, y) monster spawn points
+        self.spawns: List[Tuple[str, int, int]] = []
+        # Positions whose resource was damaged or removed since generation (see checkpoint.py)
+        self.changed: Set[Tuple[int, int]] = set()
+        # walkable_mask minus blocking resources; None until built or after a resource changed
+        self._passable: Optional[bytes] = None
+        # Snapshot records of the live resources; None until built or after a resource changed
+        self._records: Optional[List[dict]] = None
+
+    def payload(self) -> dict:
+        """The chunk message body clients receive."""
+        tm = self.tilemap
+        return {"x": self.x0, "y": self.y0, "w": tm.w, "h": tm.h, "tiles": tm.rows()}
+
+    def passable(self, resources: Dict[Tuple[int, int], dict]) -> bytes:
+        """walkable_mask with the tiles still holding a resource (in the live `resources`) blocked."""
+        if self._passable is None:
+            tm = self.tilemap
+            mask = bytearray(tm.walkable_mask)
+            # Only tiles that had a resource at generation can hold one
+            for (x, y) in self.resources:
+                if (x, y) in resources:
+                    mask[(y - self.y0) * tm.w + x - self.x0] = 0
+            self._passable = bytes(mask)
+        return self._passable
+
+    def records(self, resources: Dict[Tuple[int, int], dict]) -> List[dict]:
+        """Snapshot records of this chunk's resources still in the live `resources`. Reused
+        from tick to tick until one of them changes, so idle chunks cost nothing to snapshot."""
+        if self._records is None:
+            self._records = [
+                {"x": x, "y": y, "type": r.get("type"), "hp": r.get("hp", 1)}
+                for (x, y), r in ((pos, resources.get(pos)) for pos in self.resources) if r is not None
+            ]
+        return self._records
+
+
+class ChunkWorld:
+    """World of `w` x `h` tiles split into `size` x `size` chunks, generated lazily from `seed`.
+    The spawn point is the world center; the tiles around it (spawn clearing, the corridor
+    east to the cave and mine entrances) are kept free in whichever chunks they fall."""
+
+    def __init__(self, w: int, h: int, seed: int = 0, size: int = CHUNK_SIZE):
+        self.w = int(w)
+        self.h = int(h)
+        self.seed = int(seed)
+        self.size = max(8, int(size))
+        self.chunks: Dict[Tuple[int, int], Chunk] = {}
+        self.spawn = (self.w // 2, self.h // 2)
+        sx, sy = self.spawn
+        self.cave_entrance = (min(self.w - 1, sx + 14), sy)
+        self.mine_entrance = (min(self.w - 1, sx + 12), sy)
+        # Inclusive rectangles that never get water, trees or monster spawns
+        self._clear = [
+            (sx - 3, sy - 3, sx + 3, sy + 3),
+            (sx, sy - 1, self.cave_entrance[0] + 3, sy + 1),
+        ]
+
+    @property
+    def version(self) -> str:
+        """Stands in for the map hash: the seed and layout determine every chunk."""
+        key = f"chunks:{self.seed}:{self.w}x{self.h}:{self.size}"
+        return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+    def reset(self):
+        """Forget every generated chunk; they regenerate identically from the seed."""
+        self.chunks.clear()
+
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def chunk_at(self, x: int, y: int) -> Optional[Chunk]:
+        """Generated chunk holding tile (x, y), or None."""
+        s = self.size
+        return self.chunks.get((x // s, y // s))
+
+    def tile(self, x: int, y: int) -> Optional[str]:
+        """Tile character, or None outside the world or in a chunk not generated yet."""
+        if not self.in_bounds(x, y):
+            return None
+        ch = self.chunk_at(x, y)
+        if ch is None:
+            return None
+        return ch.tilemap.get(x - ch.x0, y - ch.y0)
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        if not self.in_bounds(x, y):
+            return False
+        ch = self.chunk_at(x, y)
+        return ch is not None and ch.tilemap.walkable_rows[y - ch.y0][x - ch.x0] == 1
+
+    def keys_near(self, x: int, y: int, radius: int) -> List[Tuple[int, int]]:
+        """Chunk coordinates overlapping the square of `radius` tiles around (x, y),
+        nearest first."""
+        s = self.size
+        cx0, cy0 = max(0, (x - radius) // s), max(0, (y - radius) // s)
+        cx1 = min((self.w - 1) // s, (x + radius) // s)
+        cy1 = min((self.h - 1) // s, (y + radius) // s)
+        pcx, pcy = x // s, y // s
+        keys = [(cx, cy) for cy in range(cy0, cy1 + 1) for cx in range(cx0, cx1 + 1)]
+        keys.sort(key=lambda k: max(abs(k[0] - pcx), abs(k[1] - pcy)))
+        return keys
+
+    def generate(self, cx: int, cy: int) -> Chunk:
+        """Generate (or return) chunk (cx, cy). Only the seed and coordinates feed the RNG."""
+        chunk = self.chunks.get((cx, cy))
+        if chunk is not None:
+            return chunk
+        s = self.size
+        x0, y0 = cx * s, cy * s
+        w, h = min(s, self.w - x0), min(s, self.h - y0)
+        rng = random.Random(f"{self.seed}:{cx}:{cy}")
+        grid = TileMap(w, h, GRASS)
+        # Ponds, clipped to the chunk
+        for _ in range(rng.choice((0, 0, 1, 1, 2))):
+            grid.fill_ellipse(rng.randrange(w), rng.randrange(h), rng.randint(2, 7), rng.randint(2, 5), WATER)
+        clear = [(ax0 - x0, ay0 - y0, ax1 - x0, ay1 - y0) for (ax0, ay0, ax1, ay1) in self._clear
+                 if ax1 >= x0 and ax0 < x0 + w and ay1 >= y0 and ay0 < y0 + h]
+        for (lx0, ly0, lx1, ly1) in clear:
+            grid.fill_rect(lx0, ly0, lx1, ly1, GRASS)
+        for (ex, ey), tile in ((self.cave_entrance, CAVE), (self.mine_entrance, MINE)):
+            if x0 <= ex < x0 + w and y0 <= ey < y0 + h:
+                grid.set(ex - x0, ey - y0, tile)
+
+        def kept_clear(lx: int, ly: int) -> bool:
+            return any(a <= lx <= c and b <= ly <= d for (a, b, c, d) in clear)
+
+        chunk = Chunk(cx, cy, x0, y0, grid)
+        cells, g = grid.cells, GRASS[0]
+        rand = rng.random
+        for ly in range(h):
+            row = ly * w
+            lx = cells.find(g, row, row + w)
+            while lx != -1:
+                tx = lx - row
+                if rand() < TREE_DENSITY and not kept_clear(tx, ly):
+                    chunk.resources[(x0 + tx, y0 + ly)] = {"type": "tree", "hp": 3}
+                lx = cells.find(g, lx + 1, row + w)
+        for _ in range(rng.choice(SLIMES_PER_CHUNK)):
+            # A few tries for an open grass tile; give up on crowded chunks
+            for _ in range(8):
+                lx, ly = rng.randrange(w), rng.randrange(h)
+                pos = (x0 + lx, y0 + ly)
+                if cells[ly * w + lx] == g and pos not in chunk.resources and not kept_clear(lx, ly):
+                    chunk.spawns.append(("slime",) + pos)
+                    break
+        self.chunks[(cx, cy)] = chunk
+        return chunk
+
+    def passable_window(self, x0: int, y0: int, w: int, h: int,
+                        resources: Dict[Tuple[int, int], dict]) -> bytes:
+        """Row-major passability (walkable and no resource) of a window, stitched from the
+        chunks' cached masks. Missing chunks and tiles off the world are 0."""
+        out = bytearray(w * h)
+        s = self.size
+        for cy in range(max(0, y0) // s, min(self.h - 1, y0 + h - 1) // s + 1):
+            for cx in range(max(0, x0) // s, min(self.w - 1, x0 + w - 1) // s + 1):
+                ch = self.chunks.get((cx, cy))
+                if ch is None:
+                    continue
+                mask = ch.passable(resources)
+                cw = ch.tilemap.w
+                # Overlap of the chunk and the window, in world coordinates
+                ax0, ax1 = max(x0, ch.x0), min(x0 + w, ch.x0 + cw)
+                ay0, ay1 = max(y0, ch.y0), min(y0 + h, ch.y0 + ch.tilemap.h)
+                if ax0 >= ax1:
+                    continue
+                for y in range(ay0, ay1):
+                    src = (y - ch.y0) * cw
+                    dst = (y - y0) * w
+                    out[dst + ax0 - x0:dst + ax1 - x0] = mask[src + ax0 - ch.x0:src + ax1 - ch.x0]
+        return bytes(out)
+
+    def resource_changed(self, x: int, y: int):
+        """Invalidate the cached passability and records of the chunk holding (x, y)."""
+        ch = self.chunk_at(x, y)
+        if ch is not None:
+            ch.changed.add((x, y))
+            ch._passable = None
+            ch._records = None
@@ -0,0 +1,35 @@
+from __future__ import annotations
+import time
+from typing import Callable
+
+# Simulation time. The engine reads its clock once per tick and every time-based rule
+# (casts, cooldowns, monster attacks and respawns) uses that value, so a tick is a pure
+# function of the world, the action batch, the clock reading and the engine's RNG: the
+# journal in checkpoint.py records the readings and replays them through a ReplayClock.
+
+
+class SimClock:
+    """perf_counter seconds plus an offset. resume_at() continues from a recorded time, so
+    deadlines restored from a checkpoint keep their meaning after a restart (the world is
+    frozen while the server is down, as if no time had passed)."""
+
+    def __init__(self, source: Callable[[], float] = time.perf_counter):
+        self._source = source
+        self.offset = 0.0
+
+    def __call__(self) -> float:
+        return self._source() + self.offset
+
+    def resume_at(self, now: float):
+        """Make the clock read `now` at this instant. Call it before the first tick only."""
+        self.offset = now - self._source()
+
+
+class ReplayClock:
+    """Returns whatever the replay set for the tick being re-run."""
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
@@ -0,0 +1,58 @@
+from __future__ import annotations
+from typing import Dict, Union
+import json
+
+try:
+    import msgpack
+except ImportError:  # binary protocol unavailable; everyone gets JSON
+    msgpack = None
+
+# Wire encodings for server -> client messages, chosen per connection by
+# ClientHello.protocol. JSON text frames stay the default (and what the debug client
+# uses); "msgpack" sends the same message structure as binary frames.
+
+
+class JsonCodec:
+    name = "json"
+    binary = False
+
+    def encode(self, msg: dict) -> str:
+        return json.dumps(msg)
+
+    def add_field(self, data: str, key: str, value) -> str:
+        """Append a top-level field to an already encoded message object."""
+        return data[:-1] + ", " + json.dumps(key) + ": " + json.dumps(value) + "}"
+
+    async def send(self, ws, data: str):
+        await ws.send_text(data)
+
+
+class MsgpackCodec:
+    name = "msgpack"
+    binary = True
+
+    def encode(self, msg: dict) -> bytes:
+        return msgpack.packb(msg)
+
+    def add_field(self, data: bytes, key: str, value) -> bytes:
+        """Append a top-level field to an already encoded message map."""
+        head = data[0]
+        if 0x80 <= head < 0x8f:
+            # fixmap: bump the entry count in place
+            return bytes([head + 1]) + data[1:] + msgpack.packb(key) + msgpack.packb(value)
+        msg = msgpack.unpackb(data, strict_map_key=False)
+        msg[key] = value
+        return msgpack.packb(msg)
+
+    async def send(self, ws, data: bytes):
+        await ws.send_bytes(data)
+
+
+CODECS: Dict[str, Union[JsonCodec, MsgpackCodec]] = {"json": JsonCodec()}
+if msgpack is not None:
+    CODECS["msgpack"] = MsgpackCodec()
+
+
+def get_codec(name: str):
+    """Codec for a requested protocol name; unknown or unavailable protocols fall back to JSON."""
+    return CODECS.get((name or "").lower(), CODECS["json"])
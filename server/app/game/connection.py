@@ -0,0 +1,372 @@
+from __future__ import annotations
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
+import asyncio
+import queue
+import threading
+import time
+from .codec import JsonCodec
+from .delta import DeltaEncoder
+from .interest import InterestGrid
+from .trace import trace, WARN
+
+# Outbound side of the WebSocket fan-out.
+# The tick publishes one WorldFrame; each ClientConnection keeps only the newest frame it
+# has not sent yet and a sender task encodes and sends it at the socket's own pace, so a
+# slow client never holds up the tick or the other connections. When the tick runs on the
+# simulation thread (see simthread.py) frames are encoded on the Egress thread below, and
+# the sender on the event loop only sends the bytes.
+
+
+@dataclass
+class WorldFrame:
+    """Everything needed to build any connection's state message for one tick."""
+    tick: int
+    indexed: dict
+    transient: dict
+    private: Dict[int, dict]
+    map_version: Optional[str]
+    # None when area-of-interest filtering is off
+    interest: Optional[InterestGrid] = None
+    view_radius: Optional[int] = None
+    # Chunked worlds: generated chunks near each player, nearest first
+    chunks: Dict[int, list] = field(default_factory=dict)
+    # Per-frame caches shared by all connections: views per interest cell (see view()),
+    # DeltaEncoder messages and their encoded form per codec, keyed by (codec name, id(message))
+    views: Dict[Tuple[int, int], dict] = field(default_factory=dict)
+    frames: Dict[tuple, dict] = field(default_factory=dict)
+    texts: Dict[tuple, Union[str, bytes]] = field(default_factory=dict)
+
+    def view(self, pid: int) -> dict:
+        """The part of the indexed snapshot this player can see: everything within view_radius
+        of the interest cell the player stands in. Players in the same cell share the view
+        object, so their messages are built and encoded once (see ClientConnection._encode)
+        instead of once per connection; the price is up to cell_size - 1 extra tiles of view."""
+        own = self.indexed.get("players", {}).get(str(pid))
+        if self.interest is None or own is None:
+            return self.indexed
+        cs = self.interest.cell_size
+        cell = (own["x"] // cs, own["y"] // cs)
+        view = self.views.get(cell)
+        if view is None:
+            r = self.view_radius
+            x0, y0 = cell[0] * cs, cell[1] * cs
+            # The player's own record is inside the box
+            view = self.views[cell] = self.interest.view_box(x0 - r, y0 - r, x0 + cs - 1 + r, y0 + cs - 1 + r)
+        return view
+
+
+class ClientConnection:
+    """One socket's outbound queue: a keep-latest slot for state frames plus a small
+    bounded FIFO for other messages (map, chunks), drained by a dedicated sender task."""
+
+    def __init__(self, ws, player_id: int, encoder: DeltaEncoder, max_queue: int = 16, codec=None,
+                 metrics=None, egress: Optional[Egress] = None):
+        self.ws = ws
+        self.player_id = player_id
+        self.encoder = encoder
+        self.codec = codec or JsonCodec()
+        # Map version already queued for this socket
+        self.map_version: Optional[str] = None
+        # Chunk coordinates already queued for this socket (chunked worlds)
+        self.chunks_sent: Set[Tuple[int, int]] = set()
+        self._outbox: Deque[Union[str, bytes]] = deque()
+        self._max_queue = max(1, int(max_queue))
+        self._pending: Optional[WorldFrame] = None
+        # Set while frames come from the simulation thread: the egress thread then encodes
+        # _pending into _encoded, one frame at a time, and wakes the sender, which only sends.
+        # None: called on the event loop itself, the sender encodes _pending.
+        self.egress = egress
+        self._encoded: Optional[Union[str, bytes]] = None
+        # Chat etc. from frames that were superseded before being sent
+        self._pending_transient: Dict[str, list] = {}
+        # Applied to the encoder by whoever encodes (sender or egress thread, never both)
+        self._keyframe_requested = False
+        # Guards _pending, _encoded, _pending_transient and _keyframe_requested, which are
+        # filled and taken on different threads
+        self._handoff = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self.closed = False
+        # Counters (see stats())
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.frames_held = 0
+        self.messages_dropped = 0
+        self.bytes_sent = 0
+        self.encode_seconds = 0.0
+        self.max_queue_depth = 0
+        # Engine-wide TickMetrics (optional): bytes sent and encode time are added there too
+        self.metrics = metrics
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._outbox) + (self._pending is not None) + (self._encoded is not None)
+
+    @property
+    def outbox_room(self) -> int:
+        """Messages that can still be queued without dropping one."""
+        return self._max_queue - len(self._outbox)
+
+    def stats(self) -> dict:
+        return {
+            "playerId": self.player_id,
+            "protocol": self.codec.name,
+            "queueDepth": self.queue_depth,
+            "maxQueueDepth": self.max_queue_depth,
+            "framesSent": self.frames_sent,
+            "framesDropped": self.frames_dropped,
+            "framesHeld": self.frames_held,
+            "messagesDropped": self.messages_dropped,
+            "bytesSent": self.bytes_sent,
+            "encodeSeconds": round(self.encode_seconds, 6),
+        }
+
+    def send(self, data: Union[str, bytes]):
+        """Queue an already encoded (with self.codec) non-state message.
+        When the FIFO is full the oldest entry is dropped."""
+        if self.closed:
+            return
+        if len(self._outbox) >= self._max_queue:
+            try:
+                self._outbox.popleft()
+            except IndexError:
+                pass  # the sender took it meanwhile (simulation thread)
+            self.messages_dropped += 1
+        self._outbox.append(data)
+        self._notify()
+
+    def offer(self, frame: WorldFrame):
+        """Make `frame` the next state to send, superseding any frame still waiting."""
+        if self.closed:
+            return
+        with self._handoff:
+            if self._pending is not None:
+                self.frames_dropped += 1
+                # Keep per-tick events (chat) of the dropped frame
+                for k, v in self._pending.transient.items():
+                    self._pending_transient.setdefault(k, []).extend(v)
+            self._pending = frame
+        self._notify()
+
+    def hold(self, frame: WorldFrame):
+        """Skip `frame` (reduced send rate): the next frame offered carries its per-tick events,
+        and its delta is cut against the last frame actually sent, so nothing else is lost."""
+        if self.closed:
+            return
+        self.frames_held += 1
+        if self.metrics is not None:
+            self.metrics.frames_held += 1
+        self._carry(frame)
+
+    def _carry(self, frame: WorldFrame):
+        with self._handoff:
+            for k, v in frame.transient.items():
+                self._pending_transient.setdefault(k, []).extend(v)
+
+    def request_keyframe(self):
+        """Send a full state with the next frame (client lost its baseline, world wiped)."""
+        with self._handoff:
+            self._keyframe_requested = True
+
+    def close(self):
+        self.closed = True
+        self._outbox.clear()
+        with self._handoff:
+            self._pending = None
+            self._encoded = None
+        if self.egress is not None:
+            # The sender task belongs to the event loop: cancelled there
+            self.egress.wake(self)
+        else:
+            self._cancel()
+
+    def _cancel(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def _notify(self):
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        if self.egress is not None:
+            self.egress.wake(self)
+        else:
+            self._wake()
+
+    def _wake(self):
+        if self.closed:
+            self._cancel()
+            return
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._wakeup.set()
+
+    def encode_pending(self):
+        """Egress thread: encode the waiting frame into the send slot. Skipped while the slot
+        still holds an unsent frame (the next delta is cut against that one): the sender asks
+        again once it has sent it, and meanwhile newer frames supersede the waiting one."""
+        with self._handoff:
+            if self.closed or self._encoded is not None or self._pending is None:
+                return
+            frame, self._pending = self._pending, None
+        data = self._encode(frame)
+        with self._handoff:
+            if not self.closed:
+                self._encoded = data
+
+    def _encode(self, frame: WorldFrame) -> Union[str, bytes]:
+        t0 = time.perf_counter()
+        with self._handoff:
+            carried, self._pending_transient = self._pending_transient, {}
+            keyframe, self._keyframe_requested = self._keyframe_requested, False
+        if keyframe:
+            self.encoder.request_keyframe()
+        transient = frame.transient
+        shared = True
+        if carried:
+            transient = {k: carried.get(k, []) + list(frame.transient.get(k, []))
+                         for k in set(carried) | set(frame.transient)}
+            shared = False
+        view = frame.view(self.player_id)
+        msg, me = self.encoder.encode(frame.tick, view, transient, frame.private.get(self.player_id),
+                                      frame.frames if shared else None)
+        codec = self.codec
+        key = (codec.name, id(msg))
+        data = frame.texts.get(key) if shared else None
+        if data is None:
+            data = codec.encode(msg)
+            if shared:
+                frame.texts[key] = data
+        if me is not None:
+            # Splice the private record into the shared encoded message
+            data = codec.add_field(data, "me", me)
+        elapsed = time.perf_counter() - t0
+        self.encode_seconds += elapsed
+        if self.metrics is not None:
+            self.metrics.observe_encode(elapsed)
+        return data
+
+    async def _run(self):
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while not self.closed and (self._outbox or self._encoded is not None or self._pending is not None):
+                is_frame = not self._outbox
+                if is_frame:
+                    with self._handoff:
+                        data, self._encoded = self._encoded, None
+                    if data is None:
+                        if self.egress is not None:
+                            # Being encoded on the egress thread, which wakes this task
+                            break
+                        with self._handoff:
+                            frame, self._pending = self._pending, None
+                        if frame is None:
+                            continue
+                        data = self._encode(frame)
+                else:
+                    try:
+                        data = self._outbox.popleft()
+                    except IndexError:
+                        continue
+                try:
+                    await self.codec.send(self.ws, data)
+                except Exception:
+                    # Socket is gone; the receive loop takes care of disconnect_ws
+                    self.closed = True
+                    return
+                self.bytes_sent += len(data)
+                if self.metrics is not None:
+                    self.metrics.bytes_sent += len(data)
+                if is_frame:
+                    self.frames_sent += 1
+                    if self.egress is not None and self._pending is not None:
+                        # Skipped while this one was unsent (see encode_pending)
+                        self.egress.resume(self)
+
+
+class Egress:
+    """Encodes the frames offered from the simulation thread on a thread of its own and wakes
+    the connections' sender tasks, so neither the tick nor the event loop spends time on
+    encoding. wake() only collects connections; schedule() hands the batch to the egress
+    thread, which encodes what is waiting and wakes the whole batch on the loop with one
+    callback (writing to the loop's wakeup pipe releases the GIL, so once per message would
+    keep switching threads)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        # Collected on the simulation thread until schedule()
+        self._woken: List[ClientConnection] = []
+        # Batches of connections for the egress thread; None stops it
+        self._jobs: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self.batches = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="egress", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Encode and wake everything submitted so far, then stop the thread (blocks)."""
+        if self._thread is None:
+            return
+        self._jobs.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def wake(self, conn: ClientConnection):
+        self._woken.append(conn)
+
+    def schedule(self):
+        """Submit everything collected so far (after a tick or an ingress command)."""
+        if self._woken:
+            batch, self._woken = self._woken, []
+            self._submit(batch)
+
+    def resume(self, conn: ClientConnection):
+        """From the sender: encode the frame that waited for the previous one to be sent."""
+        self._submit([conn])
+
+    def _submit(self, batch: List[ClientConnection]):
+        if self._thread is not None:
+            self._jobs.put(batch)
+        else:
+            self._deliver(batch)
+
+    def _run(self):
+        while True:
+            batch = self._jobs.get()
+            stopping = batch is None
+            conns = dict.fromkeys(batch or ())
+            # Whatever queued up meanwhile goes out in the same batch
+            while not stopping:
+                try:
+                    more = self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if more is None:
+                    stopping = True
+                else:
+                    conns.update(dict.fromkeys(more))
+            if conns:
+                self._deliver(list(conns))
+            if stopping:
+                return
+
+    def _deliver(self, conns: List[ClientConnection]):
+        for conn in conns:
+            try:
+                conn.encode_pending()
+            except Exception as ex:
+                trace.event("tick", WARN, "Encoding a frame for player {pid} failed: {error}",
+                            pid=conn.player_id, error=repr(ex))
+        self.batches += 1
+        try:
+            self.loop.call_soon_threadsafe(self._flush, conns)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def _flush(self, conns: List[ClientConnection]):
+        for conn in conns:
+            conn._wake()
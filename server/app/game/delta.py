@@ -0,0 +1,127 @@
+from __future__ import annotations
+from typing import Dict, Optional, Tuple
+
+# Delta encoding of state snapshots, one DeltaEncoder per connection.
+# A snapshot is first indexed into keyed collections (entity key -> record) so two
+# snapshots can be compared entity by entity; a delta then carries only records that
+# were added or changed ("upd") and keys that disappeared ("del").
+# client/js/net.js mirrors these tables to rebuild the full state on its side.
+
+# Array collections in the snapshot and the record fields that identify an entry
+KEYED_LISTS: Dict[str, Tuple[str, ...]] = {
+    "monsters": ("id",),
+    "npcs": ("id",),
+    "projectiles": ("id",),
+    "resources": ("x", "y"),
+    "effects": ("x", "y"),
+    "damageNumbers": ("x", "y"),
+}
+# Collections that are already dicts keyed by id
+KEYED_MAPS: Tuple[str, ...] = ("players",)
+# Per-tick fields: sent when present, never kept in the baseline
+TRANSIENT: Tuple[str, ...] = ("chat",)
+
+
+def _key(rec: dict, fields: Tuple[str, ...]) -> str:
+    if len(fields) == 1:
+        return str(rec.get(fields[0]))
+    return ",".join(str(rec.get(f)) for f in fields)
+
+
+def index_snapshot(snap: dict) -> dict:
+    """Convert a snapshot into keyed collections. Records are shared, not copied."""
+    out = {}
+    for name, value in snap.items():
+        if name in TRANSIENT:
+            continue
+        fields = KEYED_LISTS.get(name)
+        if fields is not None:
+            out[name] = {_key(r, fields): r for r in value}
+        elif name in KEYED_MAPS:
+            out[name] = {str(k): v for k, v in value.items()}
+        else:
+            out[name] = value
+    return out
+
+
+def expand_indexed(indexed: dict) -> dict:
+    """Inverse of index_snapshot: back to the full snapshot shape (used for keyframes)."""
+    out = {}
+    for name, value in indexed.items():
+        if name in KEYED_LISTS:
+            out[name] = list(value.values())
+        else:
+            out[name] = value
+    return out
+
+
+def diff_indexed(prev: dict, curr: dict) -> dict:
+    """Entities added/changed/removed between two indexed snapshots.
+    Plain fields (mapVersion, cave, pendingSpells, ...) are included only when they changed."""
+    out = {}
+    for name, value in curr.items():
+        old = prev.get(name)
+        if name in KEYED_LISTS or name in KEYED_MAPS:
+            old = old or {}
+            upd = {k: r for k, r in value.items() if old.get(k) != r}
+            removed = [k for k in old if k not in value]
+            if upd or removed:
+                out[name] = {"upd": upd, "del": removed}
+        elif old != value:
+            out[name] = value
+    return out
+
+
+class DeltaEncoder:
+    """Tracks what one connection has received and builds its next state message.
+    A full keyframe is sent on first use, every `keyframe_interval` ticks and on request
+    (client resync, admin wipe); everything else is a delta against the last sent tick.
+    The player's private record is tracked separately and only re-sent when it changed."""
+
+    def __init__(self, keyframe_interval: int = 40):
+        self.keyframe_interval = max(1, int(keyframe_interval))
+        self.last_tick: Optional[int] = None
+        self._baseline: Optional[dict] = None
+        self._private: Optional[dict] = None
+        self._last_keyframe = 0
+        self._force_keyframe = True
+
+    def request_keyframe(self):
+        self._force_keyframe = True
+
+    def _needs_keyframe(self, tick: int) -> bool:
+        if self._force_keyframe or self._baseline is None:
+            return True
+        # tick_index goes back to 0 on admin wipe
+        if tick < self._last_keyframe:
+            return True
+        return tick - self._last_keyframe >= self.keyframe_interval
+
+    def encode(self, tick: int, indexed: dict, transient: Optional[dict] = None,
+               private: Optional[dict] = None, frames: Optional[dict] = None) -> Tuple[dict, Optional[dict]]:
+        """Return (shared message, private record or None if unchanged) for this tick.
+        `indexed` is this connection's view (see index_snapshot); `transient` holds per-tick
+        fields such as chat. Connections that see the same view with the same baseline get the
+        same message: pass a per-tick `frames` dict to build it once and share the object."""
+        keyframe = self._needs_keyframe(tick)
+        key = ("key", id(indexed)) if keyframe else ("delta", id(self._baseline), id(indexed))
+        msg = frames.get(key) if frames is not None else None
+        if msg is None:
+            if keyframe:
+                state = expand_indexed(indexed)
+                msg = {"type": "state", "tick": tick, "keyframe": True, "state": state}
+            else:
+                state = diff_indexed(self._baseline, indexed)
+                msg = {"type": "state", "tick": tick, "delta": True, "base": self.last_tick, "state": state}
+            if transient:
+                state.update(transient)
+            if frames is not None:
+                frames[key] = msg
+        if keyframe:
+            self._last_keyframe = tick
+            self._force_keyframe = False
+        me = private if (keyframe or private != self._private) else None
+        self._private = private
+        self._baseline = indexed
+        self.last_tick = tick
+        return msg, me
@@ -1,57 +1,204 @@
 from __future__ import annotations
-from typing import Dict, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Set
+from collections import Counter
 from fastapi import WebSocket
 import asyncio
-import json
+import random
 from datetime import datetime
-from .state import GameState, Monster, WORLD_W, WORLD_H
+from .state import GameState, Monster, MONSTER_CELL
 from .actions import resolve_actions, resolve_pending_spells
-from ..db import SessionLocal
+from .delta import DeltaEncoder, index_snapshot, TRANSIENT
+from .interest import InterestGrid, CELL_SIZE
+from .pathing import FlowFields
+from .chunks import ChunkWorld
+from .scheduler import Scheduler
+from .metrics import TickMetrics
+from .trace import trace, DEBUG
+from .connection import ClientConnection, WorldFrame
+from .codec import get_codec
+from .persistence import PlayerStore
+from .checkpoint import Checkpointer, encode_player
+from .clock import SimClock
+from .overload import OverloadController, NO_ROAMING, REDUCED_SENDS, PROJECTILE_CAP
+from .simthread import SimulationThread
 
 class GameEngine:
-    def __init__(self, tick_seconds: float = 0.25, debug: bool = False):
+    def __init__(self, tick_seconds: float = 0.25, send_seconds: Optional[float] = None, idle_seconds: float = 10.0,
+                 reduced_send_every: int = 2, distant_send_every: int = 4, debug: bool = False, keyframe_interval: int = 40,
+                 view_radius: Optional[int] = 16, activation_radius: Optional[int] = 24, lod_band: int = 16,
+                 lod_interval: int = 4, world: Optional[ChunkWorld] = None, seed: int = 0,
+                 world_cache: Optional[str] = None, persistence: Optional[PlayerStore] = None,
+                 checkpoints: Optional[Checkpointer] = None, recorder: Optional[Checkpointer] = None,
+                 clock: Optional[Callable[[], float]] = None, rng: Optional[random.Random] = None,
+                 overload: Optional[OverloadController] = None, projectile_cap: int = 64,
+                 threaded: bool = False):
         self.tick_seconds = tick_seconds
+        # Frames are built and published every send_seconds (None: every tick); changes in
+        # between coalesce, as deltas are cut against what each connection last received.
+        # Per connection, players who have not acted for idle_seconds and are not being
+        # fought get every reduced_send_every-th frame, or every distant_send_every-th one
+        # when no other player is within view; players who act always get every frame.
+        self.send_seconds = max(tick_seconds, send_seconds or tick_seconds)
+        self.idle_seconds = idle_seconds
+        self.reduced_send_every = max(1, int(reduced_send_every))
+        self.distant_send_every = max(self.reduced_send_every, int(distant_send_every))
+        # Simulation seconds owed to the send schedule; a frame goes out once it reaches send_seconds
+        self._send_credit = self.send_seconds - tick_seconds
+        self.send_index = 0
+        # Tick of each connected player's last action, and players targeted by an aggro
+        # monster since the previous send (view bookkeeping only, never read by the simulation)
+        self._last_action: Dict[int, int] = {}
+        self._engaged: Set[int] = set()
+        self._send_tiers = {"full": 0, "reduced": 0, "distant": 0}
+        # Simulation time and randomness (see clock.py): read once per tick, injectable so a
+        # recorded session replays to the same result
+        self.clock = clock if clock is not None else SimClock()
+        self.rng = rng if rng is not None else random.Random()
+        # Clock reading of the tick in progress
+        self.now = 0.0
+        # debug turns on DEBUG-level tracing into the ring buffer (see trace.py), not stdout
         self.debug = debug
-        self.state = GameState()
+        if debug:
+            trace.configure(level=DEBUG)
+        # Full state is re-sent every keyframe_interval ticks; deltas in between
+        self.keyframe_interval = keyframe_interval
+        # Players only receive entities within view_radius tiles (square) of the interest cell
+        # they stand in (CELL_SIZE tiles), so players in one cell share one message; None sends everything
+        self.view_radius = view_radius
+        # Monster level of detail: monsters within activation_radius tiles (square, rounded out to
+        # MONSTER_CELL cells) of a player act every tick, those up to lod_band tiles further act every
+        # lod_interval ticks, the rest are dormant. None runs every monster every tick.
+        self.activation_radius = activation_radius
+        self.lod_band = lod_band
+        self.lod_interval = max(1, int(lod_interval))
+        self._lod_counts = {"active": 0, "reduced": 0, "dormant": 0}
+        # world: a ChunkWorld for large lazily generated maps; None keeps the classic 60x40 map,
+        # generated from `seed` and cached as a file in `world_cache` (a directory) if given
+        self.state = GameState(chunks=world, seed=seed, world_cache=world_cache)
+        # Chunked worlds: chunks within this many tiles of a player are generated and sent to them
+        self.chunk_radius = (view_radius or 16) + (world.size // 2 if world is not None else 0)
+        # Encoded chunk messages: (codec name, cx, cy) -> data
+        self._chunk_messages: Dict[tuple, object] = {}
         self.tick_index = 0
-        self._connections: Dict[int, WebSocket] = {}
+        # Outbound queue + sender task per connected player (see connection.py)
+        self._connections: Dict[int, ClientConnection] = {}
         self._ws_to_player: Dict[WebSocket, int] = {}
+        # Encoded map message per codec for the current map version: codec name -> (version, data)
+        self._map_messages: Dict[str, tuple] = {}
+        # (map version, JSON map message) for GET /map: replaced by publish_map() on the ticking
+        # thread whenever the map changes, so HTTP handlers never touch the map themselves
+        self.published_map: Optional[tuple] = None
         self._action_queue: Dict[int, dict] = {}
         self._lock = asyncio.Lock()
-        # Scheduled monster respawns: list of (due_time, kind, x, y)
-        self._monster_respawns: List[Tuple[float, str, int, int]] = []
+        # Scheduled monster respawns on clock time: items (kind, x, y)
+        self._monster_respawns = Scheduler()
+        # Cached BFS flow fields toward players, shared by all monsters chasing them
+        self._flow = FlowFields()
+        # Phase timings, counters and gauges exposed at /metrics
+        self.metrics = TickMetrics()
+        # Write-behind player saves (see persistence.py); None keeps players in memory only
+        self.persistence = persistence
+        # World checkpoints and action journal (see checkpoint.py); None keeps the world in memory only
+        self.checkpoints = checkpoints
+        # Session recording for offline replay: a Checkpointer that keeps everything (see main.py)
+        self.recorder = recorder
+        # Players created since the previous tick, as journal records
+        self._joined: List[list] = []
+        # Load shedding (see overload.py): the controller picks the degradation level from
+        # tick durations, `degrade` is the level the current tick runs with (journaled, so a
+        # replay applies the recorded levels). None never degrades.
+        self.overload = overload
+        self.degrade = 0
+        # Projectiles allowed in flight from degradation level PROJECTILE_CAP on
+        self.projectile_cap = max(0, int(projectile_cap))
+        # threaded: run() ticks on a dedicated thread (see simthread.py) instead of the event
+        # loop; while it runs, calls that change the world are handed to it (self._sim)
+        self.threaded = threaded
+        self._sim: Optional[SimulationThread] = None
 
-    def connect_player(self, user_id: int, ws: WebSocket) -> int:
-        # Authoritative: spawn or get player and attach connection
-        player_id = self.state.ensure_player(user_id)
-        
-        # Load XP from database when player connects
-        # TODO: Re-enable when database schema issue is resolved
-        # db = SessionLocal()
-        # try:
-        #     self.state.load_player_xp(player_id, db)
-        # finally:
-        #     db.close()
-            
-        self._connections[player_id] = ws
+    def connect_player(self, user_id: int, ws: WebSocket, delta: bool = True, protocol: str = "json",
+                       record: Optional[dict] = None) -> int:
+        # Authoritative: spawn or get player and attach connection. `record` is the saved state
+        # (PlayerStore.load, read off the event loop by the caller), used if the player is new.
+        next_id = self.state._next_player_id
+        player_id = self.state.ensure_player(user_id, record=record)
+        if (self.checkpoints is not None or self.recorder is not None) and self.state._next_player_id != next_id:
+            self._joined.append(encode_player(self.state.players[player_id]))
+        if record is not None and self.persistence is not None:
+            self.persistence.remember(record)
+
+        # A reconnect replaces the previous socket of the same player
+        old = self._connections.get(player_id)
+        if old is not None:
+            old.close()
+            self._ws_to_player.pop(old.ws, None)
+        # Clients that opt out of deltas simply get a keyframe every tick
+        encoder = DeltaEncoder(self.keyframe_interval if delta else 1)
+        self._connections[player_id] = ClientConnection(ws, player_id, encoder, codec=get_codec(protocol),
+                                                        metrics=self.metrics,
+                                                        egress=self._sim.egress if self._sim is not None else None)
         self._ws_to_player[ws] = player_id
+        self._last_action[player_id] = self.tick_index
         return player_id
 
+    async def join(self, user_id: int, ws: WebSocket, delta: bool = True, protocol: str = "json",
+                   record: Optional[dict] = None) -> int:
+        """connect_player() from the event loop: on the simulation thread, between ticks, when threaded."""
+        if self._sim is not None:
+            return await self._sim.call(self.connect_player, user_id, ws, delta, protocol, record)
+        return self.connect_player(user_id, ws, delta=delta, protocol=protocol, record=record)
+
+    async def inspect(self, fn, *args):
+        """fn(*args) for a read of world state or tick metrics from the event loop (debug and
+        metrics endpoints): between ticks on the simulation thread when threaded, so it never
+        sees a tick half done."""
+        if self._sim is not None:
+            return await self._sim.call(fn, *args)
+        return fn(*args)
+
     def disconnect_ws(self, ws: WebSocket):
+        if self._sim is not None:
+            self._sim.submit(self._disconnect_ws, ws)
+            return
+        self._disconnect_ws(ws)
+
+    def _disconnect_ws(self, ws: WebSocket):
         pid = self._ws_to_player.pop(ws, None)
         if pid is not None:
-            # Save XP when player disconnects
-            # TODO: Re-enable when database schema issue is resolved
-            # db = SessionLocal()
-            # try:
-            #     self.state.save_player_xp(pid, db)
-            # finally:
-            #     db.close()
-            self._connections.pop(pid, None)
+            # Queue a save of the leaving player; the writer thread stores it
+            p = self.state.players.get(pid)
+            if p is not None and self.persistence is not None:
+                self.persistence.capture_player(p)
+            conn = self._connections.get(pid)
+            if conn is not None and conn.ws is ws:
+                conn.close()
+                self._connections.pop(pid, None)
+                self._last_action.pop(pid, None)
+
+    def request_keyframe(self, player_id: int):
+        """Send a full state to this player on the next broadcast (client lost its baseline)."""
+        conn = self._connections.get(player_id)
+        if conn:
+            conn.request_keyframe()
+
+    def connection_stats(self) -> List[dict]:
+        """Send queue counters per connection, to spot slow clients."""
+        return [conn.stats() for conn in list(self._connections.values())]
 
     def queue_action(self, player_id: int, action_msg):
-        # Replace queued action before the tick resolves, but never downgrade a cast to a move
         msg = action_msg.model_dump()
+        if self._sim is not None:
+            # Checked against the player's casting state on the simulation thread
+            self._sim.submit(self._queue_action, player_id, msg)
+            return
+        self._queue_action(player_id, msg)
+
+    def _queue_action(self, player_id: int, msg: dict):
+        # Replace queued action before the tick resolves, but never downgrade a cast to a move
+        if msg.get("type") == "resync":
+            # Not a game action: just schedule a keyframe for this connection
+            self.request_keyframe(player_id)
+            return
         existing = self._action_queue.get(player_id)
         if existing and existing.get("type") == "cast" and msg.get("type") == "move":
             # Keep the cast; ignore move for the remainder of this tick
@@ -63,12 +210,24 @@ class GameEngine:
                 return
         self._action_queue[player_id] = msg
 
+    async def recover(self) -> Optional[dict]:
+        """Rebuild the world from the newest checkpoint and journal (before run())."""
+        if self.checkpoints is None:
+            return None
+        async with self._lock:
+            self._joined = []
+        return await self.checkpoints.recover(self)
+
     async def run(self):
         # Startup diagnostics
         try:
-            print(f"INFO: Game loop starting with tick_seconds={self.tick_seconds}", flush=True)
+            print(f"INFO: Game loop starting with tick_seconds={self.tick_seconds} send_seconds={self.send_seconds}",
+                  flush=True)
         except Exception:
             pass
+        if self.threaded:
+            await self._run_thread()
+            return
         # Drift-compensated scheduler to keep a steady tick cadence ~1s
         import time
         next_tick = time.perf_counter()
@@ -81,60 +240,91 @@ class GameEngine:
             else:
                 # If consistently late, don't spin: reschedule from now
                 next_tick = time.perf_counter()
+                self.metrics.late_ticks += 1
             await self._tick()
 
+    async def _run_thread(self):
+        loop = asyncio.get_running_loop()
+        sim = self._sim = SimulationThread(self, loop)
+        # Existing connections switch to frames encoded on the egress thread
+        for conn in list(self._connections.values()):
+            conn.egress = sim.egress
+        sim.start()
+        try:
+            await asyncio.shield(sim.done)
+        finally:
+            # Cancelled (shutdown) or the thread failed: wait for the tick in progress, then
+            # the loop owns the engine again
+            await loop.run_in_executor(None, sim.stop)
+            self._sim = None
+            sim.flush()
+            await loop.run_in_executor(None, sim.egress.stop)
+            # Frames still waiting are encoded by their sender tasks from here on
+            for conn in list(self._connections.values()):
+                conn.egress = None
+
     async def _tick(self):
+        """One tick on the event loop (run() without a thread, benchmarks, replay)."""
         async with self._lock:
-            # Tick diagnostics: helpful to verify cadence in logs
-            if self.debug:
-                try:
-                    now = datetime.now().strftime('%H:%M:%S')
-                    print(f"DEBUG: Tick {self.tick_index + 1} start at {now} (interval={self.tick_seconds}s)", flush=True)
-                except Exception:
-                    pass
-            # Monotonic now for time-based logic (casting, cooldowns)
-            import time as _t
-            monotonic_now = _t.perf_counter()
-            # Ensure map exists
-            self.state.ensure_map()
-            # Ensure initial NPCs exist
-            try:
-                self.state.ensure_initial_npcs()
-            except Exception:
-                pass
-            # Clear damage tracking from previous tick
-            self.state.clear_tick_damage_tracking()
-            
-            actions = self._action_queue
-            self._action_queue = {}
-            # Resolve simultaneously
+            self.step()
+
+    def step(self):
+        """Simulate one tick, then build and publish its frame at the send rate. Runs on the
+        simulation thread when threaded, else under the engine lock via _tick()."""
+        metrics = self.metrics
+        import time as _t
+        tick_started = _t.perf_counter()
+        metrics.tick_rate.mark(tick_started)
+        # Tick diagnostics: helpful to verify cadence in logs
+        trace.tick = self.tick_index + 1
+        if trace.enabled("tick"):
+            trace.debug("tick", "Tick {tick} start at {now} (interval={interval}s)", tick=self.tick_index + 1,
+                        now=datetime.now().strftime('%H:%M:%S'), interval=self.tick_seconds)
+        # Simulation time for time-based logic (casting, cooldowns, respawns): one reading per tick
+        monotonic_now = self.now = self.clock()
+        self.state.projectile_cap = self.projectile_cap if self.degrade >= PROJECTILE_CAP else None
+        # Ensure map exists
+        self.publish_map()
+        # Ensure initial NPCs exist
+        try:
+            self.state.ensure_initial_npcs()
+        except Exception:
+            pass
+        if self.state.chunks is not None:
+            with metrics.phase("chunks"):
+                for p in list(self.state.players.values()):
+                    self.state.ensure_chunks_near(p.x, p.y, self.chunk_radius)
+        # Clear damage tracking from previous tick
+        self.state.clear_tick_damage_tracking()
+        # TTL clock (effects, damage numbers, notifications)
+        self.state.tick += 1
+        
+        actions = self._action_queue
+        self._action_queue = {}
+        for pid in actions:
+            if pid in self._last_action:
+                self._last_action[pid] = self.tick_index
+        # Resolve simultaneously
+        with metrics.phase("actions"):
             resolve_actions(self.state, actions, monotonic_now)
-            # Resolve any pending spells (for dodge mechanics)
+        # Resolve any pending spells (for dodge mechanics)
+        with metrics.phase("spells"):
             resolve_pending_spells(self.state)
+        with metrics.phase("monsters"):
             # Ensure initial monsters exist
             self.state.ensure_initial_monsters()
             # Safety: remove any accidental overlaps between players and monsters
             self.state.enforce_no_overlap()
             # Simple monster AI and combat
             self._monsters_act()
-            # Advance projectiles and handle impacts
+        # Advance projectiles and handle impacts
+        with metrics.phase("projectiles"):
             self._advance_projectiles()
-            # Decay effects AFTER damage application
-            self._decay_effects()
-            # Update damage numbers (decay TTL)
-            self.state.update_damage_numbers()
-            # Update notifications TTLs
-            self.state.update_notifications()
+        with metrics.phase("upkeep"):
+            # Expire effects (AFTER damage application), damage numbers and notifications due this tick
+            self.state.run_tick_timers()
             # Process scheduled monster respawns
             self._process_monster_respawns(monotonic_now)
-            # Periodic XP save (every 10 ticks to prevent excessive DB writes)
-            # TODO: Re-enable when database schema issue is resolved
-            # if self.tick_index % 10 == 0:
-            #     db = SessionLocal()
-            #     try:
-            #         self.state.save_all_player_xp(db)
-            #     finally:
-            #         db.close()
             # Handle player death/respawn after all damage for the tick
             self._respawn_dead_players()
             # Regeneration per tick (simple): skip dead players (class system removed)
@@ -144,149 +334,218 @@ class GameEngine:
                 # Default baseline regen
                 p.hp = min(p.hp_max, p.hp + 2)
                 p.mp = min(p.mp_max, p.mp + 1)
-            self.tick_index += 1
-            # Broadcast new state snapshot
-            snapshot = self.state.snapshot(monotonic_now)
-            message = json.dumps({"type": "state", "tick": self.tick_index, "state": snapshot})
-            await self._broadcast(message)
+            # Queue changed players for the write-behind store (no disk access here)
+            if self.persistence is not None:
+                self.persistence.capture(self.state.players.values(), self.tick_index)
+        self.tick_index += 1
+        for journal in (self.checkpoints, self.recorder):
+            if journal is not None:
+                journal.record_tick(self, monotonic_now, actions, self._joined)
+        self._joined = []
+        if self.state.check_occupancy:
+            self.state.validate_occupancy()
+        queued_actions = len(actions)
+        # Capture this tick's state for broadcasting at the send rate, and hand it to the
+        # per-connection senders
+        if self._send_due():
+            with metrics.phase("build_frame"):
+                frame = self._build_frame(monotonic_now)
+            metrics.sends += 1
+            metrics.send_rate.mark()
+            with metrics.phase("publish"):
+                self._publish(frame, self._send_divisors())
+            self.send_index += 1
+            self._engaged.clear()
+        seconds = _t.perf_counter() - tick_started
+        self._record_tick_metrics(seconds, queued_actions)
+        if self.overload is not None:
+            self.degrade = self.overload.observe(seconds)
+
+    def _record_tick_metrics(self, seconds: float, queued_actions: int):
+        state = self.state
+        depths = [conn.queue_depth for conn in self._connections.values()]
+        self.metrics.set_gauges(
+            connections=len(self._connections),
+            actions_queued=queued_actions,
+            send_queue_depth=sum(depths),
+            send_queue_depth_max=max(depths, default=0),
+            players=len(state.players),
+            monsters=len(state.monsters),
+            monsters_active=self._lod_counts["active"],
+            monsters_reduced=self._lod_counts["reduced"],
+            monsters_dormant=self._lod_counts["dormant"],
+            projectiles=len(state.projectiles),
+            effects=len(state.effects),
+            resources=len(state.resources),
+            tick_rate_target_hz=round(1.0 / self.tick_seconds, 3),
+            send_rate_target_hz=round(1.0 / self.send_seconds, 3),
+            connections_full_rate=self._send_tiers["full"],
+            connections_reduced_rate=self._send_tiers["reduced"],
+            connections_distant_rate=self._send_tiers["distant"],
+            overload_level=self.degrade,
+        )
+        if self.overload is not None:
+            self.metrics.set_gauges(**self.overload.stats())
+        if self.persistence is not None:
+            self.metrics.set_gauges(persist_pending=self.persistence.pending)
+        if self.checkpoints is not None:
+            self.metrics.set_gauges(**self.checkpoints.stats())
+        self.metrics.end_tick(seconds, self.tick_seconds)
 
     async def admin_wipe(self):
         """Reset world state: monsters, effects, player positions/xp/stats. Keep connections.
         Does not touch DB users. Admin-only caller ensures authorization."""
+        if self._sim is not None:
+            await self._sim.call(self._wipe)
+            return
         async with self._lock:
-            # Reset monsters/effects
-            self.state.monsters.clear()
-            self.state._next_monster_id = 1
-            self.state.effects.clear()
-            self.state.damage_numbers.clear()
-            self.state.pending_spells.clear()  # Clear pending spells too
-            self.state._damage_this_tick.clear()  # Clear damage tracking
-            # Reset NPCs
-            self.state.npcs.clear()
-            self.state._next_npc_id = 1
-            # Reset players (keep same ids and user ids)
-            cx, cy = WORLD_W // 2, WORLD_H // 2
-            for p in self.state.players.values():
-                p.x, p.y = self.state.find_free_near(cx, cy)
-                p.xp.clear()
-                p.clazz = None
-                p.spells.clear()
-                p.hp_max = 10
-                p.hp = 10
-                p.mp_max = 0
-                p.mp = 0
-            # Reset tick index
-            self.tick_index = 0
-            # Force map regeneration by clearing existing tiles
-            self.state.tiles = None
-            # Rebuild world and entities immediately
-            self.state.ensure_map()
-            self.state.ensure_initial_npcs()
-            self.state.ensure_initial_monsters()
-            self.state.enforce_no_overlap()
-            # Prepare snapshot while holding lock for consistency
-            snapshot = self.state.snapshot()
-        # Broadcast after releasing the lock
-        message = json.dumps({"type": "state", "tick": self.tick_index, "state": snapshot})
-        await self._broadcast(message)
+            self._wipe()
+
+    def _wipe(self):
+        # Reset monsters/effects
+        self.state.clear_monsters()
+        self.state._next_monster_id = 1
+        self.state.effects.clear()
+        self.state.damage_numbers.clear()
+        self.state.pending_spells.clear()  # Clear pending spells too
+        self.state._damage_this_tick.clear()  # Clear damage tracking
+        # Reset NPCs
+        self.state.npcs.clear()
+        self.state._next_npc_id = 1
+        # Reset players (keep same ids and user ids)
+        cx, cy = self.state.spawn_point
+        for p in self.state.players.values():
+            self.state.place_player(p, *self.state.find_free_near(cx, cy))
+            p.xp.clear()
+            p.clazz = None
+            p.spells.clear()
+            p.hp_max = 10
+            p.hp = 10
+            p.mp_max = 0
+            p.mp = 0
+        # Reset tick index
+        self.tick_index = 0
+        # Force map regeneration by clearing existing tiles
+        self.state.tiles = None
+        # Rebuild world and entities immediately
+        self.publish_map()
+        self.state.ensure_initial_npcs()
+        self.state.ensure_initial_monsters()
+        self.state.enforce_no_overlap()
+        # The journal cannot express a wipe: start over from a checkpoint of the wiped world
+        self._joined = []
+        for journal in (self.checkpoints, self.recorder):
+            if journal is not None:
+                journal.checkpoint(self, reset=True)
+        # Everyone needs a fresh baseline after a wipe
+        for conn in self._connections.values():
+            conn.request_keyframe()
+        # Broadcast the wiped world right away
+        self._publish(self._build_frame())
 
     def _monsters_act(self):
         # Peaceful until attacked: monsters only aggro once damaged.
         players = list(self.state.players.values())
         if not players:
             return
-        if self.debug:
-            print(f"DEBUG: Monsters act - {len(self.state.monsters)} monsters, {len(self.state.effects)} effects")
+        if trace.enabled("monsters"):
+            trace.debug("monsters", "Monsters act - {monsters} monsters, {effects} effects",
+                        monsters=len(self.state.monsters), effects=len(self.state.effects))
             for m in self.state.monsters.values():
-                print(f"DEBUG: Monster {m.id} ({m.kind}) at ({m.x}, {m.y}) HP: {m.hp}/{m.hp_max} aggro: {m.aggro}")
+                trace.debug("monsters", "Monster {id} ({kind}) at ({x}, {y}) HP: {hp}/{hp_max} aggro: {aggro}",
+                            id=m.id, kind=m.kind, x=m.x, y=m.y, hp=m.hp, hp_max=m.hp_max, aggro=m.aggro)
+        if trace.enabled("effects"):
             for pos, effect in self.state.effects.items():
-                print(f"DEBUG: Effect at {pos}: {effect}")
+                trace.debug("effects", "Effect at {pos}: {effect}", pos=pos, effect=effect)
         # Apply any AoE effects damage baseline before moving (10 dmg). Damage may cause aggro.
         effect_damage = 10
-        # Damage monsters standing in effects
-        for m in list(self.state.monsters.values()):
-            if (m.x, m.y) in self.state.effects:
-                if self.debug:
-                    print(f"DEBUG: Monster {m.id} at ({m.x}, {m.y}) taking {effect_damage} damage (HP: {m.hp}/{m.hp_max})")
+        # Damage monsters standing in effects (looked up per effect tile, dormant or not)
+        for pos in list(self.state.effects):
+            for m in self.state.monsters_at(*pos):
+                trace.debug("effects", "Monster {id} at ({x}, {y}) taking {dmg} damage (HP: {hp}/{hp_max})",
+                            id=m.id, x=m.x, y=m.y, dmg=effect_damage, hp=m.hp, hp_max=m.hp_max)
                 val = self.state.effects[(m.x, m.y)]
-                ttl, src = val if isinstance(val, tuple) else (val, None)
+                _due, src = val if isinstance(val, tuple) else (val, None)
                 m.hp = max(0, m.hp - effect_damage)
-                if self.debug:
-                    print(f"DEBUG: Monster {m.id} HP after damage: {m.hp}")
+                trace.debug("effects", "Monster {id} HP after damage: {hp}", id=m.id, hp=m.hp)
                 # Add floating damage number
                 self.state.add_damage_number(m.x, m.y, effect_damage)
                 if src is not None:
                     m.last_hit_by = src
                 # Getting hit triggers aggro
                 m.aggro = True
-                if self.debug:
-                    print(f"DEBUG: Monster {m.id} is now aggro: {m.aggro}")
+                trace.debug("monsters", "Monster {id} is now aggro: {aggro}", id=m.id, aggro=m.aggro)
         # Damage players standing in effects (PvP enabled via AoE)
         for p in players:
             if (p.x, p.y) in self.state.effects:
-                if self.debug:
-                    print(f"DEBUG: Player {p.id} at ({p.x}, {p.y}) taking {effect_damage} damage")
+                trace.debug("effects", "Player {id} at ({x}, {y}) taking {dmg} damage",
+                            id=p.id, x=p.x, y=p.y, dmg=effect_damage)
                 _val = self.state.effects[(p.x, p.y)]
                 p.hp = max(0, p.hp - effect_damage)
                 # Add floating damage number for players too
                 self.state.add_damage_number(p.x, p.y, effect_damage)
         # Remove dead monsters and grant XP (credit last hitter if available, else nearest)
-        db = SessionLocal()
-        try:
-            for mid, m in list(self.state.monsters.items()):
-                if m.hp <= 0:
-                    target = None
-                    if m.last_hit_by and m.last_hit_by in self.state.players:
-                        target = self.state.players[m.last_hit_by]
-                    else:
-                        target = min(players, key=lambda p: abs(p.x - m.x) + abs(p.y - m.y))
-                    # Progress 'help_sergeant' quest: require killing a slime and collecting some wood
-                    if target and m.kind == "slime":
-                        q = target.quests.get("help_sergeant")
-                        if q and q.get("status") == "started":
-                            data = q.setdefault("data", {})
-                            # Keep a boolean that the client can easily read and display
-                            data["slimeKilled"] = True
-                            wood_ok = int(data.get("wood", 0)) >= 5
-                            slime_ok = bool(data.get("slimeKilled"))
-                            if wood_ok and slime_ok:
-                                q["status"] = "completed"
-                                self.state.add_notification(target.id, "Quest complete: Help the Sergeant. Talk to him for your reward.")
-                    # Schedule slime respawn at its original spawn after a short delay
-                    try:
-                        import time as _t
-                        due = _t.perf_counter() + 12.0  # 12s respawn delay
-                        self._schedule_monster_respawn("slime", m.spawn_x, m.spawn_y, due)
-                        if self.debug:
-                            print(f"DEBUG: Scheduled slime respawn at ({m.spawn_x},{m.spawn_y}) for t={due:.2f}")
-                    except Exception:
-                        pass
-                    del self.state.monsters[mid]
-        finally:
-            db.close()
-        # Rebuild list after removals
-        monsters = list(self.state.monsters.values())
+        for mid, m in list(self.state.monsters.items()):
+            if m.hp <= 0:
+                target = None
+                if m.last_hit_by and m.last_hit_by in self.state.players:
+                    target = self.state.players[m.last_hit_by]
+                else:
+                    target = min(players, key=lambda p: abs(p.x - m.x) + abs(p.y - m.y))
+                # Progress 'help_sergeant' quest: require killing a slime and collecting some wood
+                if target and m.kind == "slime":
+                    q = target.quests.get("help_sergeant")
+                    if q and q.get("status") == "started":
+                        data = q.setdefault("data", {})
+                        # Keep a boolean that the client can easily read and display
+                        data["slimeKilled"] = True
+                        wood_ok = int(data.get("wood", 0)) >= 5
+                        slime_ok = bool(data.get("slimeKilled"))
+                        if wood_ok and slime_ok:
+                            q["status"] = "completed"
+                            self.state.add_notification(target.id, "Quest complete: Help the Sergeant. Talk to him for your reward.")
+                # Schedule slime respawn at its original spawn after a short delay
+                try:
+                    due = self.now + 12.0  # 12s respawn delay
+                    self._schedule_monster_respawn("slime", m.spawn_x, m.spawn_y, due, key=mid)
+                    trace.debug("respawn", "Scheduled slime respawn at ({x},{y}) for t={due:.2f}",
+                                x=m.spawn_x, y=m.spawn_y, due=due)
+                except Exception:
+                    pass
+                self.state.remove_monster(mid)
+        # Rebuild list after removals, keeping only the monsters that act this tick
+        monsters = self._monsters_to_tick(players)
+        self._flow.prune(self.state.players)
         for m in monsters:
             if not m.aggro:
-                # Peaceful roaming behavior: move randomly within spawn radius
-                self._handle_monster_roaming(m)
+                # Peaceful roaming behavior: move randomly within spawn radius (not while overloaded)
+                if self.degrade < NO_ROAMING:
+                    self._handle_monster_roaming(m)
                 continue  # peaceful: do nothing else unless aggro
             # Find nearest player
             target = min(players, key=lambda p: abs(p.x - m.x) + abs(p.y - m.y))
-            # Move toward target up to m.speed tiles
+            self._engaged.add(target.id)
+            # Move toward target up to m.speed tiles, following the target's flow field
+            field = self._flow.get(self.state, target)
             steps = m.speed
-            while steps > 0 and (m.x != target.x or m.y != target.y):
-                dx = 1 if target.x > m.x else (-1 if target.x < m.x else 0)
-                dy = 1 if target.y > m.y else (-1 if target.y < m.y else 0)
-                # prefer horizontal then vertical to approach
-                nx, ny = (m.x + dx, m.y) if dx != 0 else (m.x, m.y + dy)
-                if self.state.is_free(nx, ny):  # avoid stepping onto occupied tiles
-                    m.x, m.y = nx, ny
+            while steps > 0 and abs(target.x - m.x) + abs(target.y - m.y) > 1:
+                if field is not None and field.distance(m.x, m.y) > 0:
+                    # First free tile that is one step closer along the walkable grid
+                    nxt = next((t for t in field.downhill(m.x, m.y) if self.state.is_free(*t)), None)
+                    if nxt is None:
+                        break  # path blocked by other units this tick
+                    self.state.place_monster(m, *nxt)
+                else:
+                    # No path (cut off or no map): greedy step, horizontal then vertical
+                    dx = 1 if target.x > m.x else (-1 if target.x < m.x else 0)
+                    dy = 1 if target.y > m.y else (-1 if target.y < m.y else 0)
+                    nx, ny = (m.x + dx, m.y) if dx != 0 else (m.x, m.y + dy)
+                    if self.state.is_free(nx, ny):  # avoid stepping onto occupied tiles
+                        self.state.place_monster(m, nx, ny)
                 steps -= 1
             # Attack if adjacent (manhattan 1) and cooldown has passed
             if abs(target.x - m.x) + abs(target.y - m.y) == 1:
-                import time as _t
-                current_time = _t.perf_counter()
+                current_time = self.now
                 # Check attack cooldown (2 seconds between attacks)
                 if current_time >= m.last_attack_time + 2.0:
                     target.hp = max(0, target.hp - m.dmg)
@@ -294,77 +553,230 @@ class GameEngine:
                     self.state.add_damage_number(target.x, target.y, m.dmg)
                     # Update last attack time
                     m.last_attack_time = current_time
-                    if self.debug:
-                        print(f"DEBUG: Monster {m.id} attacked player {target.id} for {m.dmg} damage")
-                elif self.debug:
-                    print(f"DEBUG: Monster {m.id} attack on cooldown (last: {m.last_attack_time:.2f}, current: {current_time:.2f})")
-
-    def _schedule_monster_respawn(self, kind: str, x: int, y: int, due_time: float):
-        """Queue a monster respawn. Deduplicate identical pending entries."""
-        for (due, k, sx, sy) in self._monster_respawns:
-            if k == kind and sx == x and sy == y and abs(due - due_time) < 0.01:
-                return
-        self._monster_respawns.append((due_time, kind, x, y))
+                    trace.debug("combat", "Monster {id} attacked player {target} for {dmg} damage",
+                                id=m.id, target=target.id, dmg=m.dmg)
+                else:
+                    trace.debug("combat", "Monster {id} attack on cooldown (last: {last:.2f}, current: {now:.2f})",
+                                id=m.id, last=m.last_attack_time, now=current_time)
+
+    def _monsters_to_tick(self, players) -> List[Monster]:
+        """Monsters near enough to a player to run AI this tick (see activation_radius)."""
+        monsters = self.state.monsters
+        if self.activation_radius is None:
+            self._lod_counts = {"active": len(monsters), "reduced": 0, "dormant": 0}
+            return list(monsters.values())
+        cs = MONSTER_CELL
+        near_r = -(-self.activation_radius // cs)
+        far_r = -(-(self.activation_radius + self.lod_band) // cs)
+        near, far = set(), set()
+        for (pcx, pcy) in {(p.x // cs, p.y // cs) for p in players}:
+            for cy in range(pcy - far_r, pcy + far_r + 1):
+                for cx in range(pcx - far_r, pcx + far_r + 1):
+                    if abs(cx - pcx) <= near_r and abs(cy - pcy) <= near_r:
+                        near.add((cx, cy))
+                    else:
+                        far.add((cx, cy))
+        far -= near
+        active = self.state.monsters_in_cells(near)
+        # Middle band: each monster acts every lod_interval ticks, staggered by id
+        phase = self.tick_index % self.lod_interval
+        reduced = [m for m in self.state.monsters_in_cells(far) if m.id % self.lod_interval == phase]
+        self._lod_counts = {
+            "active": len(active),
+            "reduced": len(reduced),
+            "dormant": len(monsters) - len(active) - len(reduced),
+        }
+        if reduced:
+            return sorted(active + reduced, key=lambda m: m.id)
+        return active
+
+    def _schedule_monster_respawn(self, kind: str, x: int, y: int, due_time: float, key=None):
+        """Queue a monster respawn. A key (e.g. the dead monster's id) deduplicates:
+        scheduling the same key again replaces the pending entry."""
+        self._monster_respawns.schedule(due_time, (kind, x, y), key=("respawn", key) if key is not None else None)
 
     def _process_monster_respawns(self, now: float):
-        if not self._monster_respawns:
-            return
-        remaining: List[Tuple[float, str, int, int]] = []
-        for (due, kind, x, y) in self._monster_respawns:
-            if now >= due:
-                try:
-                    if kind == "slime":
-                        self.state.spawn_slime(x, y)
-                        if self.debug:
-                            print(f"DEBUG: Respawned slime at ({x},{y})")
-                    # Add other monster kinds here as needed
-                except Exception:
-                    # If spawn failed (e.g., invalid tile), retry shortly
-                    import time as _t
-                    remaining.append((_t.perf_counter() + 2.0, kind, x, y))
-            else:
-                remaining.append((due, kind, x, y))
-        self._monster_respawns = remaining
+        for (kind, x, y) in self._monster_respawns.pop_due(now):
+            try:
+                if kind == "slime":
+                    self.state.spawn_slime(x, y)
+                    trace.debug("respawn", "Respawned slime at ({x},{y})", x=x, y=y)
+                # Add other monster kinds here as needed
+            except Exception:
+                # If spawn failed (e.g., invalid tile), retry shortly
+                self._monster_respawns.schedule(now + 2.0, (kind, x, y))
 
     def _handle_monster_roaming(self, m: Monster):
         """Move a non-aggro monster randomly, staying within its roam radius and avoiding blocked tiles."""
         try:
-            import random
             # 50% chance to stay idle this tick to avoid jittery movement
-            if random.random() < 0.5:
+            if self.rng.random() < 0.5:
                 return
             # Try up to 4 directions in random order
             dirs = [(1,0),(-1,0),(0,1),(0,-1)]
-            random.shuffle(dirs)
+            self.rng.shuffle(dirs)
             for dx, dy in dirs:
                 nx, ny = m.x + dx, m.y + dy
                 # Stay within roam radius of spawn
                 if abs(nx - m.spawn_x) + abs(ny - m.spawn_y) > max(0, int(getattr(m, 'roam_radius', 3))):
                     continue
                 if self.state.is_free(nx, ny):
-                    m.x, m.y = nx, ny
+                    self.state.place_monster(m, nx, ny)
                     return
         except Exception:
             # Be robust if anything goes wrong
             return
 
-    async def _broadcast(self, text: str):
-        # Send to all connected clients; swallow individual errors
-        for ws in list(self._connections.values()):
-            try:
-                await ws.send_text(text)
-            except Exception:
-                pass
+    def protocol_of(self, player_id: int) -> str:
+        """Wire protocol actually used for this player's state messages."""
+        conn = self._connections.get(player_id)
+        return conn.codec.name if conn else "json"
+
+    def map_message(self, codec=None):
+        """Encoded map message for the current map version (cached until the map changes)."""
+        codec = codec or get_codec("json")
+        version = self.state.map_version
+        cached = self._map_messages.get(codec.name)
+        if cached is None or cached[0] != version:
+            cached = (version, codec.encode({"type": "map", **self.state.map_payload()}))
+            self._map_messages[codec.name] = cached
+        return cached[1]
+
+    def publish_map(self):
+        """Generate the map if needed and publish it for /map (see published_map). Call it
+        from the ticking thread, or before run()."""
+        self.state.ensure_map()
+        version = self.state.map_version
+        if self.published_map is None or self.published_map[0] != version:
+            self.published_map = (version, self.map_message())
+
+    def chunk_message(self, chunk, codec=None):
+        """Encoded chunk message (chunks never change once generated, so cached for good)."""
+        codec = codec or get_codec("json")
+        key = (codec.name, chunk.cx, chunk.cy)
+        data = self._chunk_messages.get(key)
+        if data is None:
+            data = self._chunk_messages[key] = codec.encode({"type": "chunk", **chunk.payload()})
+        return data
+
+    def _build_frame(self, now: Optional[float] = None) -> Optional[WorldFrame]:
+        """Snapshot everything the senders need for this tick. Call while holding the lock."""
+        if not self._connections:
+            # Nobody to tell; drop this tick's chat
+            self.state._chat_buffer.clear()
+            return None
+        chunks = {}
+        visible = None
+        if self.state.chunks is not None:
+            # Chunks to stream reach further than the view; resources only come from the
+            # chunks a view actually overlaps (views cover the player's whole interest cell)
+            visible = {}
+            view = self.view_radius + CELL_SIZE if self.view_radius is not None else self.chunk_radius
+            for pid in self._connections:
+                p = self.state.players.get(pid)
+                if p is not None:
+                    chunks[pid] = self.state.chunks_near(p.x, p.y, self.chunk_radius)
+                    visible.update(((c.cx, c.cy), c) for c in self.state.chunks_near(p.x, p.y, view))
+            visible = visible.values()
+        with self.metrics.phase("snapshot"):
+            snapshot = self.state.snapshot(visible)
+        # Index and bucket once; every connection's view is cut from the same indexed snapshot
+        indexed = index_snapshot(snapshot)
+        interest = None
+        if self.view_radius is not None:
+            interest = InterestGrid(cell_size=CELL_SIZE)
+            interest.build(indexed)
+        return WorldFrame(
+            tick=self.tick_index,
+            indexed=indexed,
+            transient={k: snapshot[k] for k in TRANSIENT if k in snapshot},
+            private={pid: self.state.private_snapshot(pid, now) for pid in self._connections},
+            map_version=self.state.map_version,
+            interest=interest,
+            view_radius=self.view_radius,
+            chunks=chunks,
+        )
+
+    def _send_due(self) -> bool:
+        """Whether this tick publishes a frame (see send_seconds)."""
+        self._send_credit += self.tick_seconds
+        # Tolerance for float drift when send_seconds is a multiple of tick_seconds
+        if self._send_credit < self.send_seconds - 1e-9:
+            return False
+        self._send_credit -= self.send_seconds
+        return True
+
+    def _send_divisors(self) -> Dict[int, int]:
+        """Connections on a reduced send rate: player id -> take every n-th frame."""
+        tiers = {"full": len(self._connections), "reduced": 0, "distant": 0}
+        self._send_tiers = tiers
+        # Overloaded: idle and distant connections take half as many frames again
+        slow = 2 if self.degrade >= REDUCED_SENDS else 1
+        reduced_every = max(slow, self.reduced_send_every * slow)
+        distant_every = self.distant_send_every * slow
+        if reduced_every <= 1:
+            return {}
+        players = self.state.players
+        idle_ticks = self.idle_seconds / self.tick_seconds
+        cell = self.view_radius or max(self.state.world_w, self.state.world_h)
+        occupied = None
+        out = {}
+        for pid in self._connections:
+            p = players.get(pid)
+            # Being fought (chased or hurt) or acting recently keeps the full rate
+            if (p is None or pid in self._engaged or p.hp < p.hp_max
+                    or self.tick_index - self._last_action.get(pid, self.tick_index) < idle_ticks):
+                continue
+            if occupied is None:
+                # Players per view-sized cell: anyone else in the 3x3 cells around may be in view
+                occupied = Counter((q.x // cell, q.y // cell) for q in players.values())
+            cx, cy = p.x // cell, p.y // cell
+            alone = sum(occupied[(cx + dx, cy + dy)] for dx in (-1, 0, 1) for dy in (-1, 0, 1)) <= 1
+            tier = "distant" if alone else "reduced"
+            out[pid] = distant_every if alone else reduced_every
+            tiers[tier] += 1
+            tiers["full"] -= 1
+        return out
+
+    def _publish(self, frame: Optional[WorldFrame], divisors: Optional[Dict[int, int]] = None):
+        """Queue the frame on every connection (never blocks; slow sockets drop old frames).
+        Connections that don't have the current map yet get it first, then any nearby chunks
+        they have not received (a few per tick, so the FIFO never drops one). Connections in
+        `divisors` only take every n-th frame (staggered by player id) and hold the others."""
+        if frame is None:
+            return
+        divisors = divisors or {}
+        for pid, conn in list(self._connections.items()):
+            if conn.map_version != frame.map_version:
+                conn.send(self.map_message(conn.codec))
+                conn.map_version = frame.map_version
+                conn.chunks_sent.clear()
+            for chunk in frame.chunks.get(pid, ()):
+                key = (chunk.cx, chunk.cy)
+                if key in conn.chunks_sent:
+                    continue
+                if conn.outbox_room <= 2:
+                    break
+                conn.send(self.chunk_message(chunk, conn.codec))
+                conn.chunks_sent.add(key)
+            n = divisors.get(pid, 1)
+            if n > 1 and conn.frames_sent and (self.send_index + pid) % n:
+                conn.hold(frame)
+                continue
+            conn.offer(frame)
 
     def _respawn_dead_players(self):
         """Respawn players at spawn (center). If spawn is occupied by a slime, the player dies immediately.
         Do not attempt multiple respawns within the same tick to avoid loops.
         """
-        SPAWN_X, SPAWN_Y = WORLD_W // 2, WORLD_H // 2
+        SPAWN_X, SPAWN_Y = self.state.spawn_point
         for p in self.state.players.values():
             if p.hp <= 0:
+                # Death interrupts any cast in progress
+                if self.state.cancel_cast(p):
+                    trace.debug("spells", "Player {pid} died while casting; cast cancelled", pid=p.id)
                 # Respawn at spawn space
-                p.x, p.y = SPAWN_X, SPAWN_Y
+                self.state.place_player(p, SPAWN_X, SPAWN_Y)
                 p.hp = p.hp_max
                 # Optional: restore some MP baseline
                 p.mp = min(p.mp_max, p.mp)
@@ -380,14 +792,14 @@ class GameEngine:
             for pid, pr in list(self.state.projectiles.items()):
                 # First, check immediate impact on the current tile (spawn tile)
                 # This ensures a monster standing on the adjacent tile is hit immediately on spawn.
-                hit_mon_curr = next((m for m in self.state.monsters.values() if m.x == pr.x and m.y == pr.y), None)
+                hit_mon_curr = self.state.monster_at(pr.x, pr.y)
                 if hit_mon_curr is not None:
                     hit_mon_curr.hp = max(0, hit_mon_curr.hp - pr.dmg)
                     hit_mon_curr.last_hit_by = pr.caster_id
                     self.state.add_damage_number(pr.x, pr.y, pr.dmg)
                     to_delete.append(pid)
                     continue
-                hit_pl_curr = next((pl for pl in self.state.players.values() if pl.x == pr.x and pl.y == pr.y and pl.id != pr.caster_id), None)
+                hit_pl_curr = self.state.player_at(pr.x, pr.y, exclude=pr.caster_id)
                 if hit_pl_curr is not None:
                     hit_pl_curr.hp = max(0, hit_pl_curr.hp - pr.dmg)
                     self.state.add_damage_number(pr.x, pr.y, pr.dmg)
@@ -402,11 +814,11 @@ class GameEngine:
                 while steps > 0 and pr.ttl > 0:
                     nx, ny = pr.x + pr.dx, pr.y + pr.dy
                     # Stop if out of bounds or not walkable
-                    if not (0 <= nx < WORLD_W and 0 <= ny < WORLD_H) or not self.state.is_walkable(nx, ny):
+                    if not (0 <= nx < self.state.world_w and 0 <= ny < self.state.world_h) or not self.state.is_walkable(nx, ny):
                         to_delete.append(pid)
                         break
                     # Check monster hit first
-                    hit_mon = next((m for m in self.state.monsters.values() if m.x == nx and m.y == ny), None)
+                    hit_mon = self.state.monster_at(nx, ny)
                     if hit_mon is not None:
                         hit_mon.hp = max(0, hit_mon.hp - pr.dmg)
                         # credit last hitter
@@ -416,7 +828,7 @@ class GameEngine:
                         to_delete.append(pid)
                         break
                     # Check player hit (PvP)
-                    hit_pl = next((pl for pl in self.state.players.values() if pl.x == nx and pl.y == ny and pl.id != pr.caster_id), None)
+                    hit_pl = self.state.player_at(nx, ny, exclude=pr.caster_id)
                     if hit_pl is not None:
                         hit_pl.hp = max(0, hit_pl.hp - pr.dmg)
                         self.state.add_damage_number(nx, ny, pr.dmg)
@@ -431,18 +843,3 @@ class GameEngine:
                     to_delete.append(pid)
             for pid in to_delete:
                 self.state.projectiles.pop(pid, None)
-
-    def _decay_effects(self):
-        """Decay effect TTL and remove expired effects."""
-        expired = []
-        for k in list(self.state.effects.keys()):
-            ttl, src = self.state.effects[k] if isinstance(self.state.effects[k], tuple) else (self.state.effects[k], None)
-            ttl -= 1
-            if ttl <= 0:
-                expired.append(k)
-                if self.debug:
-                    print(f"DEBUG: Effect at {k} expired")
-            else:
-                self.state.effects[k] = (ttl, src)
-        for k in expired:
-            self.state.effects.pop(k, None)
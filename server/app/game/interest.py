@@ -0,0 +1,65 @@
+from __future__ import annotations
+from typing import Dict, List, Optional, Tuple
+from .delta import KEYED_LISTS, KEYED_MAPS
+
+# Area-of-interest filtering for state broadcasts.
+# The indexed snapshot (see delta.index_snapshot) is bucketed into a coarse grid once per
+# tick; each connection's view is then built from the few cells around its player instead
+# of scanning every entity in the world.
+
+# Keyed collections whose records have x/y and are filtered by distance.
+# Anything else (mapVersion, cave, pendingSpells, ...) is visible to everyone.
+SPATIAL: Tuple[str, ...] = tuple(KEYED_LISTS) + KEYED_MAPS
+# Cell size of the engine's grid; players in the same cell share a view (WorldFrame.view)
+CELL_SIZE = 8
+
+
+class InterestGrid:
+    """Spatial hash of snapshot records: (cx, cy) -> [(collection, key, record)]."""
+
+    def __init__(self, cell_size: int = 8):
+        self.cell_size = max(1, int(cell_size))
+        self._cells: Dict[Tuple[int, int], List[Tuple[str, str, dict]]] = {}
+        self._shared: dict = {}
+
+    def build(self, indexed: dict):
+        """Re-bucket all positioned records from this tick's indexed snapshot."""
+        cs = self.cell_size
+        cells: Dict[Tuple[int, int], List[Tuple[str, str, dict]]] = {}
+        shared = {}
+        for name, value in indexed.items():
+            if name not in SPATIAL:
+                shared[name] = value
+                continue
+            for key, rec in value.items():
+                x, y = rec.get("x"), rec.get("y")
+                if x is None or y is None:
+                    continue
+                cells.setdefault((x // cs, y // cs), []).append((name, key, rec))
+        self._cells = cells
+        self._shared = shared
+
+    def view(self, x: int, y: int, radius: int, always: Optional[Dict[str, Dict[str, dict]]] = None) -> dict:
+        """Indexed snapshot restricted to records within `radius` tiles (square) of (x, y).
+        `always` adds records that must be visible regardless of distance (e.g. own player)."""
+        out = self.view_box(x - radius, y - radius, x + radius, y + radius)
+        if always:
+            for name, recs in always.items():
+                out.setdefault(name, {}).update(recs)
+        return out
+
+    def view_box(self, x0: int, y0: int, x1: int, y1: int) -> dict:
+        """Indexed snapshot restricted to records inside the box (inclusive tile bounds)."""
+        cs = self.cell_size
+        out = dict(self._shared)
+        for name in SPATIAL:
+            out[name] = {}
+        for cy in range(y0 // cs, y1 // cs + 1):
+            for cx in range(x0 // cs, x1 // cs + 1):
+                bucket = self._cells.get((cx, cy))
+                if not bucket:
+                    continue
+                for name, key, rec in bucket:
+                    if x0 <= rec["x"] <= x1 and y0 <= rec["y"] <= y1:
+                        out[name][key] = rec
+        return out
@@ -0,0 +1,192 @@
+from __future__ import annotations
+from bisect import bisect_left
+from time import perf_counter
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Tick instrumentation.
+# The engine times each phase of _tick with TickMetrics.phase(name) and records counters
+# and gauges once per tick; /metrics renders everything in the Prometheus text format.
+# Recording is a perf_counter pair and a bisect per phase, cheap enough to stay on.
+
+# Prefix of every exported metric name (the project, TheChessMMORPG); only set here
+PREFIX = "chessmmo"
+
+# Bucket upper bounds (inclusive); an implicit +Inf bucket follows
+MS_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+BYTES_BUCKETS: Tuple[float, ...] = (1e3, 1e4, 1e5, 2.5e5, 5e5, 1e6, 2.5e6, 5e6, 1e7)
+
+
+class Histogram:
+    """Fixed-bucket histogram with sum and count."""
+    __slots__ = ("bounds", "counts", "total", "count")
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.counts: List[int] = [0] * (len(self.bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        out, running = [], 0
+        for bound, n in zip(self.bounds + (float("inf"),), self.counts):
+            running += n
+            out.append(("+Inf" if bound == float("inf") else f"{bound:g}", running))
+        return out
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "buckets": dict(self.cumulative()),
+        }
+
+
+class RateMeter:
+    """Achieved rate of a recurring event: exponentially weighted mean of the intervals
+    between mark() calls (about the last `window` events)."""
+    __slots__ = ("_alpha", "_last", "interval")
+
+    def __init__(self, window: int = 20):
+        self._alpha = 2.0 / (max(1, int(window)) + 1)
+        self._last: Optional[float] = None
+        self.interval: Optional[float] = None
+
+    def mark(self, now: Optional[float] = None):
+        now = perf_counter() if now is None else now
+        if self._last is not None:
+            gap = now - self._last
+            self.interval = gap if self.interval is None else self.interval + self._alpha * (gap - self.interval)
+        self._last = now
+
+    @property
+    def hz(self) -> float:
+        return round(1.0 / self.interval, 3) if self.interval else 0.0
+
+
+class _Phase:
+    """Reusable timer for one phase name: `with metrics.phase("monsters"): ...`"""
+    __slots__ = ("hist", "last", "_t0")
+
+    def __init__(self, hist: Histogram):
+        self.hist = hist
+        self.last = 0.0
+        self._t0 = 0.0
+
+    def __enter__(self):
+        self._t0 = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.last = perf_counter() - self._t0
+        self.hist.observe(self.last * 1000.0)
+        return False
+
+
+class TickMetrics:
+    """Per-phase tick histograms plus counters and gauges for the game loop."""
+
+    def __init__(self):
+        self._phases: Dict[str, _Phase] = {}
+        self.tick_ms = Histogram(MS_BUCKETS)
+        self.encode_ms = Histogram(MS_BUCKETS)
+        self.bytes_per_tick = Histogram(BYTES_BUCKETS)
+        self.ticks = 0
+        # Ticks that took longer than the tick interval
+        self.overruns = 0
+        # Ticks the run loop started late (previous tick + sleep overshot the schedule)
+        self.late_ticks = 0
+        # Bytes written to sockets, maintained by the connections
+        self.bytes_sent = 0
+        # Achieved cadence of ticks and of frame sends (see GameEngine.send_seconds)
+        self.tick_rate = RateMeter()
+        self.send_rate = RateMeter()
+        self.sends = 0
+        # Frames a connection skipped because of its reduced send rate
+        self.frames_held = 0
+        self._bytes_at_last_tick = 0
+        self.gauges: Dict[str, float] = {}
+
+    def phase(self, name: str) -> _Phase:
+        p = self._phases.get(name)
+        if p is None:
+            p = self._phases[name] = _Phase(Histogram(MS_BUCKETS))
+        return p
+
+    def last_phase_seconds(self) -> Dict[str, float]:
+        """Duration of each phase in the most recent tick that ran it."""
+        return {name: p.last for name, p in self._phases.items()}
+
+    def observe_encode(self, seconds: float):
+        self.encode_ms.observe(seconds * 1000.0)
+
+    def end_tick(self, seconds: float, budget: Optional[float] = None):
+        self.ticks += 1
+        self.tick_ms.observe(seconds * 1000.0)
+        if budget is not None and seconds > budget:
+            self.overruns += 1
+        # Bytes the senders wrote since the previous tick ended
+        self.bytes_per_tick.observe(self.bytes_sent - self._bytes_at_last_tick)
+        self._bytes_at_last_tick = self.bytes_sent
+
+    def set_gauges(self, **values: float):
+        self.gauges.update(values)
+
+    def as_dict(self) -> dict:
+        return {
+            "ticks": self.ticks,
+            "overruns": self.overruns,
+            "lateTicks": self.late_ticks,
+            "sends": self.sends,
+            "framesHeld": self.frames_held,
+            "tickRateHz": self.tick_rate.hz,
+            "sendRateHz": self.send_rate.hz,
+            "bytesSent": self.bytes_sent,
+            "tickMs": self.tick_ms.as_dict(),
+            "phaseMs": {name: p.hist.as_dict() for name, p in self._phases.items()},
+            "encodeMs": self.encode_ms.as_dict(),
+            "bytesPerTick": self.bytes_per_tick.as_dict(),
+            "gauges": dict(self.gauges),
+        }
+
+    def render_prometheus(self) -> str:
+        lines: List[str] = []
+
+        def histogram(name: str, help_text: str, series: List[Tuple[str, Histogram]]):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} histogram")
+            for labels, h in series:
+                sep = "," if labels else ""
+                for le, n in h.cumulative():
+                    lines.append(f'{PREFIX}_{name}_bucket{{{labels}{sep}le="{le}"}} {n}')
+                suffix = f"{{{labels}}}" if labels else ""
+                lines.append(f"{PREFIX}_{name}_sum{suffix} {h.total:.6g}")
+                lines.append(f"{PREFIX}_{name}_count{suffix} {h.count}")
+
+        def scalar(name: str, kind: str, help_text: str, value: float):
+            lines.append(f"# HELP {PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+            lines.append(f"{PREFIX}_{name} {value:g}")
+
+        histogram("tick_duration_ms", "Wall time of a whole tick.", [("", self.tick_ms)])
+        histogram("tick_phase_ms", "Wall time of each tick phase.",
+                  [(f'phase="{name}"', p.hist) for name, p in sorted(self._phases.items())])
+        histogram("encode_ms", "Time to encode one state message for one connection.", [("", self.encode_ms)])
+        histogram("bytes_per_tick", "Bytes written to all sockets between two ticks.", [("", self.bytes_per_tick)])
+        scalar("ticks_total", "counter", "Ticks run.", self.ticks)
+        scalar("tick_overruns_total", "counter", "Ticks longer than the tick interval.", self.overruns)
+        scalar("tick_late_total", "counter", "Ticks started behind schedule.", self.late_ticks)
+        scalar("bytes_sent_total", "counter", "Bytes written to sockets.", self.bytes_sent)
+        scalar("sends_total", "counter", "Ticks that published a frame.", self.sends)
+        scalar("frames_held_total", "counter", "Frames skipped by connections on a reduced send rate.",
+               self.frames_held)
+        scalar("tick_rate_hz", "gauge", "Achieved ticks per second.", self.tick_rate.hz)
+        scalar("send_rate_hz", "gauge", "Achieved frame sends per second.", self.send_rate.hz)
+        for name, value in sorted(self.gauges.items()):
+            scalar(name, "gauge", name.replace("_", " ").capitalize() + ".", value)
+        return "\n".join(lines) + "\n"
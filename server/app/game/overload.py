@@ -0,0 +1,70 @@
+from __future__ import annotations
+from .trace import trace, INFO, WARN
+
+# Overload control for the game loop.
+# The engine reports every tick's wall time; the controller keeps a moving average of it
+# as a share of the tick budget (tick_seconds) and steps through the degradation levels
+# below, one at a time: up while the load stays above `high`, back down once it has
+# stayed below `low` for `recover_ticks` ticks. Levels are cumulative (level 2 also skips
+# roaming). The level a tick ran with is journaled, so replays degrade the same way.
+
+NORMAL = 0
+NO_ROAMING = 1       # peaceful monsters stand still instead of roaming
+REDUCED_SENDS = 2    # idle and distant connections take half as many frames again
+PROJECTILE_CAP = 3   # no new projectiles beyond GameEngine.projectile_cap in flight
+
+LEVEL_NAMES = ("normal", "no_roaming", "reduced_sends", "projectile_cap")
+
+
+class OverloadController:
+    """Degradation level from tick durations against a budget, with hysteresis."""
+
+    def __init__(self, budget: float, high: float = 0.9, low: float = 0.5, window: int = 20,
+                 hold_ticks: int = 20, recover_ticks: int = 80, max_level: int = PROJECTILE_CAP):
+        self.budget = float(budget)
+        self.high = high
+        self.low = low
+        self._alpha = 2.0 / (max(1, int(window)) + 1)
+        # Ticks to wait after a step before stepping up again (lets the step take effect)
+        self.hold_ticks = max(1, int(hold_ticks))
+        self.recover_ticks = max(1, int(recover_ticks))
+        self.max_level = max(NORMAL, min(PROJECTILE_CAP, int(max_level)))
+        self.level = NORMAL
+        # Moving average of tick seconds / budget
+        self.load = 0.0
+        self._since_change = 0
+        self._calm = 0
+        self.escalations = 0
+        self.recoveries = 0
+
+    def observe(self, seconds: float) -> int:
+        """Account one tick and return the level for the next one."""
+        self.load += self._alpha * (seconds / self.budget - self.load)
+        self._since_change += 1
+        self._calm = self._calm + 1 if self.load < self.low else 0
+        if self.load > self.high and self.level < self.max_level and self._since_change >= self.hold_ticks:
+            self._step(self.level + 1)
+            self.escalations += 1
+        elif self.level > NORMAL and self._calm >= self.recover_ticks:
+            self._step(self.level - 1)
+            self.recoveries += 1
+        return self.level
+
+    def _step(self, level: int):
+        up = level > self.level
+        self.level = level
+        self._since_change = 0
+        self._calm = 0
+        # Echoed to the server log by default (see trace.echo_subsystems)
+        trace.event("overload", WARN if up else INFO,
+                    "Ticks at {load:.0%} of budget: {verb} degradation level {step} ({name})",
+                    load=self.load, verb="raising to" if up else "lowering to", step=level,
+                    name=LEVEL_NAMES[level])
+
+    def stats(self) -> dict:
+        return {
+            "overload_level": self.level,
+            "overload_load": round(self.load, 3),
+            "overload_escalations": self.escalations,
+            "overload_recoveries": self.recoveries,
+        }
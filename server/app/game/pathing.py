@@ -0,0 +1,131 @@
+from __future__ import annotations
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Flow fields for chasing monsters.
+# One breadth-first search from a player's tile over the static grid (walkable tiles
+# without a blocking resource) gives every tile its step distance to that player. Any
+# number of monsters chasing the player then pick their next step by looking at their
+# four neighbours, so the cost is one BFS per target that moved, not one per monster.
+# On chunked worlds the search covers a window of WINDOW_RADIUS tiles around the target
+# instead of the whole map; monsters outside it fall back to a greedy step.
+
+UNREACHABLE = -1
+
+# Neighbour order: horizontal first, matching the old greedy step preference
+DIRS: Tuple[Tuple[int, int], ...] = ((1, 0), (-1, 0), (0, 1), (0, -1))
+
+# Half-size of the search window on chunked worlds (covers the monster activation radius)
+WINDOW_RADIUS = 32
+
+
+class FlowField:
+    """Step distances from every tile to one target tile (UNREACHABLE if cut off).
+    `passable` covers the w x h area whose top-left tile is (ox, oy)."""
+
+    def __init__(self, w: int, h: int, passable: bytes, tx: int, ty: int, ox: int = 0, oy: int = 0):
+        self.w = w
+        self.h = h
+        self.ox = ox
+        self.oy = oy
+        self.target = (tx, ty)
+        n = w * h
+        dist: List[int] = [UNREACHABLE] * n
+        start = (ty - oy) * w + tx - ox
+        dist[start] = 0
+        queue = deque([start])
+        pop, push = queue.popleft, queue.append
+        while queue:
+            i = pop()
+            d = dist[i] + 1
+            x = i % w
+            # Left/right stay on the same row; up/down stay inside the array
+            if x + 1 < w and passable[i + 1] and dist[i + 1] < 0:
+                dist[i + 1] = d
+                push(i + 1)
+            if x > 0 and passable[i - 1] and dist[i - 1] < 0:
+                dist[i - 1] = d
+                push(i - 1)
+            j = i + w
+            if j < n and passable[j] and dist[j] < 0:
+                dist[j] = d
+                push(j)
+            j = i - w
+            if j >= 0 and passable[j] and dist[j] < 0:
+                dist[j] = d
+                push(j)
+        self.dist = dist
+
+    def distance(self, x: int, y: int) -> int:
+        x -= self.ox
+        y -= self.oy
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return UNREACHABLE
+        return self.dist[y * self.w + x]
+
+    def downhill(self, x: int, y: int) -> List[Tuple[int, int]]:
+        """Neighbouring tiles one step closer to the target, in DIRS order."""
+        d = self.distance(x, y)
+        if d <= 0:
+            return []
+        out = []
+        for dx, dy in DIRS:
+            nx, ny = x + dx, y + dy
+            if self.distance(nx, ny) == d - 1:
+                out.append((nx, ny))
+        return out
+
+
+class FlowFields:
+    """Per-player flow field cache. A player's field is rebuilt only when that player
+    has moved or the static grid changed (GameState.terrain_version)."""
+
+    def __init__(self):
+        self._fields: Dict[int, FlowField] = {}
+        self._terrain_version: Optional[int] = None
+        self._passable: bytes = b""
+        # Number of BFS runs, for profiling
+        self.builds = 0
+
+    def _refresh_passable(self, state):
+        if self._terrain_version == state.terrain_version:
+            return
+        self._terrain_version = state.terrain_version
+        # Every cached field was built on the old grid
+        self._fields.clear()
+        if state.chunks is not None:
+            # Windows are cut from the chunks' own cached masks in get()
+            return
+        tm = state.tilemap
+        passable = bytearray(tm.walkable_mask)
+        w = tm.w
+        for (x, y) in state.resources:
+            if tm.in_bounds(x, y):
+                passable[y * w + x] = 0
+        self._passable = bytes(passable)
+
+    def get(self, state, player) -> Optional[FlowField]:
+        """Flow field toward `player`'s current tile, or None if there is no map."""
+        if state.tilemap is None and state.chunks is None:
+            return None
+        self._refresh_passable(state)
+        field = self._fields.get(player.id)
+        if field is None or field.target != (player.x, player.y):
+            if state.chunks is not None:
+                r = WINDOW_RADIUS
+                x0, y0 = max(0, player.x - r), max(0, player.y - r)
+                x1, y1 = min(state.world_w, player.x + r + 1), min(state.world_h, player.y + r + 1)
+                passable = state.chunks.passable_window(x0, y0, x1 - x0, y1 - y0, state.resources)
+                field = FlowField(x1 - x0, y1 - y0, passable, player.x, player.y, x0, y0)
+            else:
+                tm = state.tilemap
+                field = FlowField(tm.w, tm.h, self._passable, player.x, player.y)
+            self._fields[player.id] = field
+            self.builds += 1
+        return field
+
+    def prune(self, player_ids: Iterable[int]):
+        """Forget fields of players that are gone."""
+        keep = set(player_ids)
+        for pid in [p for p in self._fields if p not in keep]:
+            del self._fields[pid]
@@ -0,0 +1,184 @@
+from __future__ import annotations
+import json
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from ..storage import player_state, save_player_states
+from .trace import trace, WARN
+
+# Write-behind persistence of player state.
+# The tick only captures records: a slice of the players each tick (every player once per
+# `capture_every` ticks), compared with what was captured last time, so only players that
+# changed are queued. A background thread drains the queue every `flush_interval` seconds
+# (or as soon as `batch_size` records wait) with one upsert transaction per batch, so the
+# event loop never waits on SQLite. Loading happens once per player, off the loop.
+
+# Player fields written as JSON documents
+_JSON_FIELDS = ("xp", "spells", "inventory", "quests")
+
+
+def player_record(p) -> dict:
+    """Row for PlayerRecord. Nested fields are serialized here, on the tick, so the writer
+    thread never reads live player dicts."""
+    rec = {
+        "user_id": p.user_id,
+        "x": p.x,
+        "y": p.y,
+        "hp": p.hp,
+        "hp_max": p.hp_max,
+        "mp": p.mp,
+        "mp_max": p.mp_max,
+        "clazz": p.clazz,
+    }
+    for name in _JSON_FIELDS:
+        rec[name] = json.dumps(getattr(p, name) or {}, sort_keys=True, separators=(",", ":"))
+    return rec
+
+
+def apply_record(p, rec: dict):
+    """Restore a loaded row onto a fresh Player (position is left to the caller)."""
+    p.hp_max = int(rec["hp_max"])
+    p.hp = max(1, min(p.hp_max, int(rec["hp"])))
+    p.mp_max = int(rec["mp_max"])
+    p.mp = max(0, min(p.mp_max, int(rec["mp"])))
+    p.clazz = rec.get("clazz")
+    for name in _JSON_FIELDS:
+        try:
+            setattr(p, name, json.loads(rec.get(name) or "{}"))
+        except ValueError:
+            pass
+
+
+class PlayerStore:
+    """Dirty tracking on the tick side, batched upserts on a writer thread."""
+
+    def __init__(self, flush_interval: float = 5.0, batch_size: int = 200, capture_every: int = 20,
+                 flush_on_shutdown: bool = True):
+        self.flush_interval = max(0.05, float(flush_interval))
+        self.batch_size = max(1, int(batch_size))
+        self.capture_every = max(1, int(capture_every))
+        self.flush_on_shutdown = flush_on_shutdown
+        # Tick side: last captured record per user id
+        self._captured: Dict[int, dict] = {}
+        # Shared with the writer: user id -> newest record not written yet
+        self._pending: Dict[int, dict] = {}
+        self._mutex = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        # Counters (see stats())
+        self.rows_written = 0
+        self.flushes = 0
+        self.failures = 0
+        self.last_flush_seconds = 0.0
+
+    # -------------------- Tick side --------------------
+    def capture(self, players: Iterable, tick: int):
+        """Queue this tick's share of players whose record changed since it was last captured."""
+        every = self.capture_every
+        slot = tick % every
+        for p in players:
+            if p.id % every == slot:
+                self.capture_player(p)
+
+    def capture_player(self, p):
+        rec = player_record(p)
+        if self._captured.get(p.user_id) == rec:
+            return
+        self._captured[p.user_id] = rec
+        with self._mutex:
+            self._pending[p.user_id] = rec
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def capture_all(self, players: Iterable):
+        for p in players:
+            self.capture_player(p)
+
+    def remember(self, rec: dict):
+        """Note a record just loaded from the database as already saved."""
+        self._captured[rec["user_id"]] = rec
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    # -------------------- Loading (call off the event loop) --------------------
+    def load(self, user_id: int) -> Optional[dict]:
+        """Saved record of this user, or None. Blocking: run it in an executor."""
+        with self._mutex:
+            rec = self._pending.get(user_id)
+        if rec is not None:
+            return dict(rec)
+        return player_state(user_id)
+
+    # -------------------- Writer thread --------------------
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="player-store", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer; with flush_on_shutdown, write everything still pending first."""
+        thread = self._thread
+        if thread is None:
+            if self.flush_on_shutdown:
+                self.flush()
+            return
+        self._stopping = True
+        self._wakeup.set()
+        thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._stopping:
+                if self.flush_on_shutdown:
+                    self.flush()
+                return
+            self.flush()
+
+    def flush(self) -> int:
+        """Write every pending record in batches of batch_size. Returns rows written."""
+        with self._mutex:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        t0 = time.perf_counter()
+        rows = list(pending.values())
+        written = 0
+        for i in range(0, len(rows), self.batch_size):
+            batch = rows[i:i + self.batch_size]
+            try:
+                self._write(batch)
+                written += len(batch)
+            except Exception as ex:
+                self.failures += 1
+                trace.event("persist", WARN, "Writing {n} player records failed: {error}", n=len(batch), error=str(ex))
+                # Put them back unless a newer record arrived meanwhile; retried next flush
+                with self._mutex:
+                    for rec in rows[i:]:
+                        self._pending.setdefault(rec["user_id"], rec)
+                break
+        self.rows_written += written
+        self.flushes += 1
+        self.last_flush_seconds = time.perf_counter() - t0
+        return written
+
+    def _write(self, batch: List[dict]):
+        now = time.time()
+        save_player_states({**rec, "updated_at": now} for rec in batch)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "rowsWritten": self.rows_written,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "lastFlushMs": round(self.last_flush_seconds * 1000, 3),
+        }
@@ -0,0 +1,108 @@
+from __future__ import annotations
+from heapq import heappop, heappush, heapify
+from itertools import count
+from typing import Any, Dict, Hashable, List, Optional
+
+# Deadline scheduler shared by the timed systems (TTL expiry, cast completion,
+# monster respawns). Entries sit in a min-heap ordered by due time, so a tick only
+# pops what is actually due instead of walking every timed object. The unit of `due`
+# is up to the owner: GameState keeps one scheduler on tick numbers and one on
+# engine clock seconds.
+
+_CANCELLED = object()
+
+
+class Scheduler:
+    """Min-heap of [due, seq, item, key]. Cancelled entries are dropped lazily when they
+    reach the top (or in a compaction once they outnumber the live ones)."""
+
+    def __init__(self):
+        self._heap: List[list] = []
+        self._keyed: Dict[Hashable, list] = {}
+        self._seq = count()
+        self._live = 0
+        self._cancelled = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def schedule(self, due: float, item: Any, key: Optional[Hashable] = None) -> list:
+        """Add `item` due at `due`. A `key` makes the entry cancellable by key and replaces
+        any pending entry with the same key."""
+        if key is not None:
+            self.cancel(key)
+        entry = [due, next(self._seq), item, key]
+        heappush(self._heap, entry)
+        if key is not None:
+            self._keyed[key] = entry
+        self._live += 1
+        return entry
+
+    def cancel(self, key: Hashable) -> bool:
+        """Cancel the pending entry with this key. Returns False if there was none."""
+        entry = self._keyed.pop(key, None)
+        if entry is None:
+            return False
+        self._discard(entry)
+        return True
+
+    def cancel_entry(self, entry: list) -> bool:
+        """Cancel an entry returned by schedule()."""
+        if entry[2] is _CANCELLED:
+            return False
+        if entry[3] is not None:
+            self._keyed.pop(entry[3], None)
+        self._discard(entry)
+        return True
+
+    def pending(self, key: Hashable) -> bool:
+        return key in self._keyed
+
+    def due_of(self, key: Hashable) -> Optional[float]:
+        entry = self._keyed.get(key)
+        return entry[0] if entry is not None else None
+
+    def next_due(self) -> Optional[float]:
+        heap = self._heap
+        while heap and heap[0][2] is _CANCELLED:
+            heappop(heap)
+            self._cancelled -= 1
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now: float) -> List[Any]:
+        """Remove and return the items due at or before `now`, earliest first
+        (ties in scheduling order)."""
+        heap = self._heap
+        out = []
+        while heap and heap[0][0] <= now:
+            entry = heappop(heap)
+            item = entry[2]
+            if item is _CANCELLED:
+                self._cancelled -= 1
+                continue
+            if entry[3] is not None:
+                self._keyed.pop(entry[3], None)
+            self._live -= 1
+            out.append(item)
+        return out
+
+    def entries(self) -> List[tuple]:
+        """(due, item, key) of every pending entry, earliest first (ties in scheduling order),
+        so scheduling them again in this order pops them in the same order."""
+        return [(e[0], e[2], e[3]) for e in sorted(self._heap) if e[2] is not _CANCELLED]
+
+    def clear(self):
+        self._heap.clear()
+        self._keyed.clear()
+        self._live = 0
+        self._cancelled = 0
+
+    def _discard(self, entry: list):
+        entry[2] = _CANCELLED
+        self._live -= 1
+        self._cancelled += 1
+        if self._cancelled > 64 and self._cancelled > self._live:
+            # Mostly tombstones: rebuild without them
+            self._heap = [e for e in self._heap if e[2] is not _CANCELLED]
+            heapify(self._heap)
+            self._cancelled = 0
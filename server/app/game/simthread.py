@@ -0,0 +1,149 @@
+from __future__ import annotations
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+from .connection import Egress
+from .trace import trace, WARN
+
+# The game loop on a dedicated thread (GameEngine(threaded=True)).
+# Ticks are CPU-bound Python; run on the event loop they stall every socket and HTTP request
+# for as long as a tick takes. Here they run on their own thread and the event loop only
+# moves bytes. Whatever changes the world is handed over through the ingress queue and
+# applied on this thread between ticks, in arrival order (actions, joins, leaves, wipes),
+# so the simulation itself stays single-threaded. Frames are built here and encoded on the
+# egress thread (see Egress in connection.py), which wakes the sender tasks on the loop in
+# batches; the loop only sends the bytes. The GIL still runs one thread at a time, but the
+# interpreter switches every few milliseconds (sys.getswitchinterval()), so the loop is
+# never shut out for a whole tick or a whole round of encoding.
+#
+# Encoding has a thread of its own because neither place it could share was good enough:
+# in the tick it counted every connection's encode and made ticks late, on the loop it
+# stalled sockets again. On its own thread a tick never waits for encoding, and when
+# encoding falls behind a connection skips frames (the newest one wins, see
+# ClientConnection.encode_pending) instead of delaying the tick.
+
+
+class SimulationThread:
+    """Runs engine.step() every engine.tick_seconds and the ingress commands in between."""
+
+    def __init__(self, engine, loop: asyncio.AbstractEventLoop):
+        self.engine = engine
+        self.loop = loop
+        # Encodes the frames this thread publishes on a thread of its own, and wakes the
+        # connections' sender tasks on the loop
+        self.egress = Egress(loop)
+        # (fn, args, Future or None); None only wakes the thread up (see stop())
+        self._ingress: "queue.SimpleQueue" = queue.SimpleQueue()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Resolved when the thread exits; with the exception if a tick raised
+        self.done: asyncio.Future = loop.create_future()
+        self.commands = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self.egress.start()
+        self._thread = threading.Thread(target=self._run, name="simulation", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """No more ticks: wait for the one in progress to finish (blocks). Commands still
+        queued are left for flush()."""
+        self._stopping.set()
+        self._ingress.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def flush(self):
+        """Apply the commands still queued when the thread stopped (leaving players, joins
+        awaiting their id), on the calling thread. Call it after stop(), then stop the egress
+        (egress.stop(), blocks until the frames handed to it are encoded)."""
+        while True:
+            try:
+                item = self._ingress.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                self._apply(item)
+        self.egress.schedule()
+
+    def submit(self, fn, *args):
+        """Run fn(*args) on the simulation thread before the next tick."""
+        if not self.running:
+            fn(*args)
+            return
+        self._ingress.put((fn, args, None))
+
+    async def call(self, fn, *args):
+        """Run fn(*args) on the simulation thread before the next tick and return its result."""
+        if not self.running:
+            return fn(*args)
+        future: Future = Future()
+        self._ingress.put((fn, args, future))
+        return await asyncio.wrap_future(future)
+
+    def _apply(self, item):
+        fn, args, future = item
+        self.commands += 1
+        if future is not None and not future.set_running_or_notify_cancel():
+            return
+        try:
+            result = fn(*args)
+        except Exception as ex:
+            if future is not None:
+                future.set_exception(ex)
+            else:
+                trace.event("tick", WARN, "Simulation command {fn} failed: {error}",
+                            fn=getattr(fn, "__name__", fn), error=repr(ex))
+            return
+        if future is not None:
+            future.set_result(result)
+
+    def _drain(self, deadline: float):
+        """Apply ingress commands as they arrive until `deadline` (perf_counter seconds)."""
+        while not self._stopping.is_set():
+            delay = deadline - time.perf_counter()
+            try:
+                item = self._ingress.get(timeout=delay) if delay > 0 else self._ingress.get_nowait()
+            except queue.Empty:
+                return
+            if item is not None:
+                self._apply(item)
+                self.egress.schedule()
+
+    def _run(self):
+        engine = self.engine
+        error = None
+        try:
+            # Drift-compensated like GameEngine.run(): a late tick reschedules from now
+            next_tick = time.perf_counter()
+            while not self._stopping.is_set():
+                next_tick += engine.tick_seconds
+                if next_tick <= time.perf_counter():
+                    next_tick = time.perf_counter()
+                    engine.metrics.late_ticks += 1
+                self._drain(next_tick)
+                if self._stopping.is_set():
+                    break
+                engine.step()
+                self.egress.schedule()
+        except BaseException as ex:
+            error = ex
+        try:
+            self.loop.call_soon_threadsafe(self._finish, error)
+        except RuntimeError:
+            pass  # event loop already closed
+
+    def _finish(self, error: Optional[BaseException]):
+        if self.done.done():
+            return
+        if error is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(error)
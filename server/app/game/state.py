@@ -1,10 +1,19 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
-from typing import Dict, Tuple, Optional, Iterable, List
+from functools import partial
+from typing import Dict, Tuple, Optional, Iterable, List, Set
 from sqlalchemy.orm import Session
+from .tilemap import TileMap, GRASS, WATER, CAVE, MINE
+from .chunks import ChunkWorld
+from .worldfile import artifact_path, load_world, save_world
+from .scheduler import Scheduler
+from .trace import trace, WARN
+from .persistence import apply_record
 
 WORLD_W = 60
 WORLD_H = 40
+# Side of the coarse cells monsters are bucketed in (level-of-detail activation)
+MONSTER_CELL = 8
 
 @dataclass
 class Player:
@@ -21,15 +30,15 @@ class Player:
     inventory: Dict[str, int] = field(default_factory=dict)
     # Simple quest tracking: quest_id -> {status: str, data: dict}
     quests: Dict[str, dict] = field(default_factory=dict)
-    # Per-player notifications (text + ttl ticks)
-    notifications: List[Tuple[str, int]] = field(default_factory=list)
+    # Per-player notifications: id -> text, in arrival order (expired by GameState.tick_timers)
+    notifications: Dict[int, str] = field(default_factory=dict)
     # Vital stats
     hp: int = 10
     hp_max: int = 10
     mp: int = 0
     mp_max: int = 0
     # Runtime-only fields (not persisted): cooldowns and casting state
-    # cooldowns: Dict[str, float] -> monotonic "ready at" time
+    # cooldowns: Dict[str, float] -> engine clock "ready at" time
     # casting: Optional[dict] -> { spell, target(x,y), end: float, rng, rad, mana }
     cooldowns: Dict[str, float] = field(default_factory=dict)
     casting: Optional[dict] = None
@@ -79,7 +88,7 @@ class Projectile:
     just_spawned: bool = True
 
 class GameState:
-    def __init__(self):
+    def __init__(self, chunks: Optional[ChunkWorld] = None, seed: int = 0, world_cache: Optional[str] = None):
         # Players and identifiers
         self.players: Dict[int, Player] = {}
         self._next_player_id = 1
@@ -95,17 +104,41 @@ class GameState:
         # Moving projectiles
         self.projectiles: Dict[int, Projectile] = {}
         self._next_projectile_id = 1
+        # Most projectiles allowed in flight; set by the engine while overloaded (see overload.py)
+        self.projectile_cap: Optional[int] = None
+        # Tick counter for TTLs; advanced by the engine at the start of every tick, never reset
+        self.tick = 0
+        # Deadlines: tick_timers on self.tick (TTL expiry callbacks), cast_timers on
+        # engine clock seconds (player id of each cast in progress, keyed by player id)
+        self.tick_timers = Scheduler()
+        self.cast_timers = Scheduler()
+        self._next_notification_id = 1
         # Track damage dealt this tick to prevent duplicate numbers
         self._damage_this_tick: Dict[Tuple[int, int], int] = {}
         # Tile map and resources
         # tiles: list of chars: 'G' grass, 'W' water, 'R' cave wall (solid), 'C' cave entrance, 'M' mine entrance
-        self.tiles: Optional[List[str]] = None
+        # Stored as a TileMap (bytearray + cached masks); `tiles` gives the list-of-strings form
+        self.tilemap: Optional[TileMap] = None
+        # Chunked mode: a large world generated piecewise around players (see chunks.py).
+        # tilemap then stays None and the map message carries no tiles.
+        self.chunks = chunks
+        self.world_w, self.world_h = (chunks.w, chunks.h) if chunks is not None else (WORLD_W, WORLD_H)
+        # Map generation is a function of this seed alone (chunked worlds use their own)
+        self.world_seed = chunks.seed if chunks is not None else int(seed)
+        # Directory for the generated classic map (see worldfile.py); None never touches disk
+        self.world_cache = world_cache
+        # Content hash of tiles; snapshots carry only this, the map itself is sent once per connection
+        self.map_version: Optional[str] = None
         # resources indexed by (x,y) -> {"type": "tree", "hp": int}
         self.resources: Dict[Tuple[int, int], dict] = {}
+        # Bumped whenever static obstacles (tiles, resources) change; pathing caches key on it
+        self.terrain_version = 0
         # Cave entrance position (set during gen)
-        self.cave_entrance: Tuple[int, int] = (WORLD_W - 8, WORLD_H // 2)
+        self.cave_entrance: Tuple[int, int] = (self.world_w - 8, self.world_h // 2)
         # Mine entrance position (set during gen)
-        self.mine_entrance: Tuple[int, int] = (WORLD_W - 10, WORLD_H // 2)
+        self.mine_entrance: Tuple[int, int] = (self.world_w - 10, self.world_h // 2)
+        if chunks is not None:
+            self.cave_entrance, self.mine_entrance = chunks.cave_entrance, chunks.mine_entrance
         # NPCs
         self.npcs: Dict[int, dict] = {}
         self._next_npc_id = 1
@@ -115,6 +148,14 @@ class GameState:
         }
         # Ephemeral per-tick chat buffer (list of {pid,name,text})
         self._chat_buffer = []
+        # Tile occupancy index: (x, y) -> ids of players/monsters standing there.
+        # Kept in sync by add_*/place_*/remove_* below; never assign x/y directly.
+        self._player_tiles: Dict[Tuple[int, int], List[int]] = {}
+        self._monster_tiles: Dict[Tuple[int, int], List[int]] = {}
+        # Coarser index: (x // MONSTER_CELL, y // MONSTER_CELL) -> monster ids
+        self._monster_cells: Dict[Tuple[int, int], Set[int]] = {}
+        # Consistency check mode: the engine validates the index every tick when set
+        self.check_occupancy = False
 
     # -------------------- World generation --------------------
     def ensure_map(self):
@@ -122,74 +163,114 @@ class GameState:
         Regenerating every tick caused server-side obstacles to shift, which
         felt like invisible walls to clients between snapshots.
         """
-        if self.tiles is None:
+        if self.chunks is not None:
+            if self.map_version is None:
+                # First run or after a wipe: start over from the seed
+                self.chunks.reset()
+                self.resources.clear()
+                self.map_version = self.chunks.version
+                sx, sy = self.spawn_point
+                first = self._generate_chunks_near(sx, sy, self.chunks.size)
+                # The starting monsters go in before the chunks' own spawns
+                self.ensure_initial_monsters()
+                for chunk in first:
+                    self._spawn_chunk_monsters(chunk)
+                try:
+                    self.ensure_initial_npcs()
+                except Exception:
+                    pass
+        elif self.tilemap is None:
+            if self._load_world():
+                return
             self._generate_forest_map()
             # Place NPCs after initial map gen
             try:
                 self.ensure_initial_npcs()
             except Exception:
                 pass
+            self._save_world()
+
+    def _load_world(self) -> bool:
+        """Take map, resources, entrances and NPCs from the cached artifact for this seed."""
+        if not self.world_cache:
+            return False
+        data = load_world(artifact_path(self.world_cache, self.world_seed), self.world_seed, WORLD_W, WORLD_H)
+        if data is None:
+            return False
+        self.tilemap = TileMap.from_rows(data["tiles"])
+        self.map_version = self._hash_tiles()
+        self.terrain_version += 1
+        self.resources = {(x, y): {"type": t, "hp": hp} for x, y, t, hp in data["resources"]}
+        self.cave_entrance = tuple(data["cave"])
+        self.mine_entrance = tuple(data["mine"])
+        if not self.npcs:
+            self.npcs = {int(n["id"]): dict(n) for n in data["npcs"]}
+            self._next_npc_id = max(self.npcs, default=0) + 1
+        trace.info("world", "Loaded world seed={seed} from {path}", seed=self.world_seed, path=self.world_cache)
+        return True
+
+    def _save_world(self):
+        if not self.world_cache:
+            return
+        try:
+            save_world(self, artifact_path(self.world_cache, self.world_seed))
+        except OSError as ex:
+            # Only a cache: the server runs fine without it
+            trace.event("world", WARN, "Could not save world artifact: {error}", error=str(ex))
 
     def _generate_forest_map(self):
-        import random, math
+        """Build the classic map from self.world_seed (same seed, same map)."""
+        import random
+        rng = random.Random(self.world_seed)
         # Base grass everywhere
-        grid = [['G' for _ in range(WORLD_W)] for _ in range(WORLD_H)]
+        grid = TileMap(WORLD_W, WORLD_H, GRASS)
         # Big pond: ellipse near center-left
         cx, cy = WORLD_W // 2 - 6, WORLD_H // 2
         rx, ry = WORLD_W // 4, WORLD_H // 3
-        for y in range(WORLD_H):
-            for x in range(WORLD_W):
-                # ellipse equation (x-cx)^2/rx^2 + (y-cy)^2/ry^2 <= 1
-                dx = (x - cx) / max(1, rx)
-                dy = (y - cy) / max(1, ry)
-                if dx * dx + dy * dy <= 1.0:
-                    grid[y][x] = 'W'
+        grid.fill_ellipse(cx, cy, rx, ry, WATER)
         # Keep spawn area clear (center radius 2)
         sx, sy = WORLD_W // 2, WORLD_H // 2
-        for y in range(max(0, sy - 2), min(WORLD_H, sy + 3)):
-            for x in range(max(0, sx - 2), min(WORLD_W, sx + 3)):
-                grid[y][x] = 'G'
+        grid.fill_rect(sx - 2, sy - 2, sx + 2, sy + 2, GRASS)
         
         # Add a small bridge to connect the island to the mainland
         # Create a 2-tile wide horizontal bridge from the island eastward
         bridge_y = sy  # Bridge at spawn level
         bridge_start_x = sx + 3  # Start just outside spawn area
         bridge_end_x = min(WORLD_W - 1, sx + 8)  # Extend to mainland
-        for x in range(bridge_start_x, bridge_end_x + 1):
-            grid[bridge_y][x] = 'G'  # Main bridge path
-            if bridge_y > 0:
-                grid[bridge_y - 1][x] = 'G'  # Make bridge 2 tiles wide for easier navigation
+        grid.fill_span(bridge_y, bridge_start_x, bridge_end_x, GRASS)  # Main bridge path
+        if bridge_y > 0:
+            grid.fill_span(bridge_y - 1, bridge_start_x, bridge_end_x, GRASS)  # Make bridge 2 tiles wide for easier navigation
         # Scatter trees (no rocks in forest), denser toward edges
         self.resources.clear()
+        rand = rng.random
+        cells = grid.cells
+        g = GRASS[0]
+        span = max(WORLD_W, WORLD_H)
         for y in range(WORLD_H):
-            for x in range(WORLD_W):
-                if grid[y][x] != 'G':
-                    continue
+            row = y * WORLD_W
+            # Only grass tiles can hold trees; find them without visiting water
+            x = cells.find(g, row, row + WORLD_W)
+            while x != -1:
+                tx = x - row
                 # Avoid very center area (radius 3) for initial breathing room
-                if abs(x - sx) + abs(y - sy) <= 3:
-                    continue
-                # Higher chance near edges
-                edge_factor = max(
-                    x, y, WORLD_W - 1 - x, WORLD_H - 1 - y
-                ) / max(WORLD_W, WORLD_H)
-                # Lower overall density of trees; no rocks in forest
-                base_p = 0.04 + 0.08 * edge_factor
-                if random.random() < base_p:
-                    # tree only in forest
-                    self.resources[(x, y)] = {"type": "tree", "hp": 3}
+                if abs(tx - sx) + abs(y - sy) > 3:
+                    # Higher chance near edges
+                    edge_factor = max(tx, y, WORLD_W - 1 - tx, WORLD_H - 1 - y) / span
+                    # Lower overall density of trees; no rocks in forest
+                    if rand() < 0.04 + 0.08 * edge_factor:
+                        # tree only in forest
+                        self.resources[(tx, y)] = {"type": "tree", "hp": 3}
+                x = cells.find(g, x + 1, row + WORLD_W)
 
         # Place a single cave entrance 'C' on a reachable grass tile near the east side.
         # Scan leftwards from the right edge along center row until we find grass.
         ey = WORLD_H // 2
-        ex = None
-        for x in range(WORLD_W - 4, 3, -1):
-            if grid[ey][x] == 'G':
-                ex = x
-                break
+        ex = cells.rfind(g, ey * WORLD_W + 4, ey * WORLD_W + WORLD_W - 3)
+        ex = ex - ey * WORLD_W if ex != -1 else None
         # Fallback to a reasonable location if scan fails
         if ex is None:
             ex = max(3, WORLD_W - 8)
-        grid[ey][ex] = 'C'
+        grid.set(ex, ey, CAVE)
         self.cave_entrance = (ex, ey)
         # Ensure the entrance tile has no blocking resource
         self.resources.pop((ex, ey), None)
@@ -199,7 +280,7 @@ class GameState:
         mine_y = ey
         # Make sure the mine entrance is on walkable ground
         if mine_x >= 0 and mine_y >= 0:
-            grid[mine_y][mine_x] = 'M'
+            grid.set(mine_x, mine_y, MINE)
             self.mine_entrance = (mine_x, mine_y)
             # Ensure the mine entrance tile has no blocking resource
             self.resources.pop((mine_x, mine_y), None)
@@ -207,14 +288,82 @@ class GameState:
         # Guarantee a clear 3-tile-wide corridor from spawn to the cave entrance along the center row
         sx, sy = WORLD_W // 2, WORLD_H // 2
         x0, x1 = sorted([sx, ex])
-        for x in range(x0, x1 + 1):
-            for yy in range(max(0, ey - 1), min(WORLD_H, ey + 2)):
-                grid[yy][x] = 'G'
+        grid.fill_rect(x0, ey - 1, x1, ey + 1, GRASS)
+        for yy in range(max(0, ey - 1), min(WORLD_H, ey + 2)):
+            for x in range(x0, x1 + 1):
                 self.resources.pop((x, yy), None)
-        # Save tiles as strings
-        self.tiles = [''.join(row) for row in grid]
+        self.tilemap = grid
+        self.map_version = self._hash_tiles()
+        self.terrain_version += 1
+
+    def _hash_tiles(self) -> str:
+        import hashlib
+        h = hashlib.sha1(f"{WORLD_W}x{WORLD_H}".encode())
+        if self.tilemap is not None:
+            h.update(self.tilemap.cells)
+        return h.hexdigest()[:16]
 
-    def ensure_player(self, user_id: int) -> int:
+    def map_payload(self) -> dict:
+        """Static map data sent to clients once per map version. In chunked mode the tiles
+        follow as chunk messages (see chunk_payload)."""
+        if self.chunks is not None:
+            return {
+                "version": self.map_version,
+                "world": {"w": self.world_w, "h": self.world_h},
+                "chunkSize": self.chunks.size,
+                "tiles": [],
+            }
+        return {
+            "version": self.map_version,
+            "world": {"w": WORLD_W, "h": WORLD_H},
+            "tiles": self.tiles or [],
+        }
+
+    @property
+    def spawn_point(self) -> Tuple[int, int]:
+        return self.world_w // 2, self.world_h // 2
+
+    # -------------------- Chunks --------------------
+    def ensure_chunks_near(self, x: int, y: int, radius: int) -> int:
+        """Generate the missing chunks within `radius` tiles of (x, y) and bring their trees
+        and monsters into the world. Returns the number of chunks generated."""
+        made = self._generate_chunks_near(x, y, radius)
+        for chunk in made:
+            self._spawn_chunk_monsters(chunk)
+        return len(made)
+
+    def _generate_chunks_near(self, x: int, y: int, radius: int) -> list:
+        world = self.chunks
+        if world is None:
+            return []
+        made = []
+        for key in world.keys_near(x, y, radius):
+            if key in world.chunks:
+                continue
+            chunk = world.generate(*key)
+            made.append(chunk)
+            self.resources.update(chunk.resources)
+            trace.debug("chunks", "Generated chunk {cx},{cy}: {trees} trees, {spawns} spawns",
+                        cx=key[0], cy=key[1], trees=len(chunk.resources), spawns=len(chunk.spawns))
+        if made:
+            self.terrain_version += 1
+        return made
+
+    def _spawn_chunk_monsters(self, chunk):
+        for kind, sx, sy in chunk.spawns:
+            if kind == "slime" and self.is_free(sx, sy):
+                self.spawn_slime(sx, sy)
+
+    def chunks_near(self, x: int, y: int, radius: int) -> list:
+        """Generated chunks within `radius` tiles of (x, y), nearest first."""
+        world = self.chunks
+        if world is None:
+            return []
+        return [world.chunks[k] for k in world.keys_near(x, y, radius) if k in world.chunks]
+
+    def ensure_player(self, user_id: int, record: Optional[dict] = None) -> int:
+        """Player id of this user, creating the player if needed: from `record` (a saved
+        PlayerRecord row, see persistence.py) when given, else fresh at spawn."""
         # Ensure the map is generated before placing the player
         self.ensure_map()
         # Return existing or create new at spawn
@@ -223,11 +372,23 @@ class GameState:
                 return pid
         pid = self._next_player_id
         self._next_player_id += 1
-        # Find a free spawn near map center
-        sx, sy = WORLD_W // 2, WORLD_H // 2
-        x, y = self.find_free_near(sx, sy)
+        # Saved position if it is still free, else a free spawn near map center
+        pos = None
+        if record is not None:
+            rx, ry = int(record["x"]), int(record["y"])
+            if 0 <= rx < self.world_w and 0 <= ry < self.world_h:
+                if self.chunks is not None:
+                    self.ensure_chunks_near(rx, ry, 0)
+                if self.is_free(rx, ry):
+                    pos = (rx, ry)
+        if pos is None:
+            sx, sy = self.spawn_point
+            pos = self.find_free_near(sx, sy)
+        x, y = pos
         player = Player(id=pid, user_id=user_id, x=x, y=y, xp={})
-        self.players[pid] = player
+        if record is not None:
+            apply_record(player, record)
+        self.add_player(player)
         # Grant starter spell to new players
         self.grant_starter_spell(pid)
         return pid
@@ -238,10 +399,10 @@ class GameState:
         if self.npcs:
             return
         # NPC 1: Sergeant on the mainland just east of the lake/bridge, outside the water
-        sx, sy = WORLD_W // 2, WORLD_H // 2
+        sx, sy = self.spawn_point
         # Scan a small band to the east of spawn along the bridge rows (sy and sy-1)
         serg_pos = None
-        for x in range(min(WORLD_W - 2, sx + 12), sx + 5, -1):
+        for x in range(min(self.world_w - 2, sx + 12), sx + 5, -1):
             for y in (sy, max(0, sy - 1)):
                 if self.is_walkable(x, y) and not self.is_occupied_by_resources(x, y):
                     serg_pos = (x, y)
@@ -311,21 +472,162 @@ class GameState:
         for player_id in self.players:
             self.save_player_xp(player_id, db)
 
+    @property
+    def tiles(self) -> Optional[List[str]]:
+        """Map rows as strings (the client format), or None before generation."""
+        return self.tilemap.rows() if self.tilemap is not None else None
+
+    @tiles.setter
+    def tiles(self, rows: Optional[List[str]]):
+        # Setting None forces regeneration on the next ensure_map()
+        self.tilemap = TileMap.from_rows(rows) if rows is not None else None
+        self.map_version = self._hash_tiles() if rows is not None else None
+        self.terrain_version += 1
+
+    def tile_at(self, x: int, y: int) -> str:
+        if self.chunks is not None:
+            return self.chunks.tile(x, y) or 'G'
+        if self.tilemap is None or not self.tilemap.in_bounds(x, y):
+            return 'G'
+        return self.tilemap.get(x, y)
+
     def is_walkable(self, x: int, y: int) -> bool:
+        if self.chunks is not None:
+            # Not generated yet counts as blocked
+            return self.chunks.is_walkable(x, y)
         if not (0 <= x < WORLD_W and 0 <= y < WORLD_H):
             return False
-        t = self.tiles[y][x] if self.tiles else 'G'
-        # Only water 'W' is unwalkable in the forest; treat any legacy 'R' as walkable
-        if t == 'W':
-            return False
-        # 'C' is a cave entrance tile, walkable; 'M' is a mine entrance tile, walkable; 'G' is grass, walkable; treat everything else as walkable too
-        return True
+        # Only water 'W' is unwalkable in the forest (see tilemap.WALKABLE_TABLE)
+        tm = self.tilemap
+        return tm is None or tm.walkable_rows[y][x] == 1
+
+    # -------------------- Occupancy index --------------------
+    @staticmethod
+    def _occ_add(index: Dict[Tuple[int, int], List[int]], pos: Tuple[int, int], eid: int):
+        index.setdefault(pos, []).append(eid)
+
+    @staticmethod
+    def _occ_remove(index: Dict[Tuple[int, int], List[int]], pos: Tuple[int, int], eid: int):
+        ids = index.get(pos)
+        if not ids:
+            return
+        try:
+            ids.remove(eid)
+        except ValueError:
+            return
+        if not ids:
+            del index[pos]
+
+    def add_player(self, p: Player):
+        self.players[p.id] = p
+        self._occ_add(self._player_tiles, (p.x, p.y), p.id)
+
+    def place_player(self, p: Player, x: int, y: int):
+        """Move a player to (x, y), keeping the occupancy index in sync."""
+        if (p.x, p.y) == (x, y):
+            return
+        self._occ_remove(self._player_tiles, (p.x, p.y), p.id)
+        p.x, p.y = x, y
+        self._occ_add(self._player_tiles, (x, y), p.id)
+
+    def add_monster(self, m: Monster):
+        self.monsters[m.id] = m
+        self._occ_add(self._monster_tiles, (m.x, m.y), m.id)
+        self._monster_cells.setdefault((m.x // MONSTER_CELL, m.y // MONSTER_CELL), set()).add(m.id)
+
+    def place_monster(self, m: Monster, x: int, y: int):
+        """Move a monster to (x, y), keeping the occupancy index in sync."""
+        if (m.x, m.y) == (x, y):
+            return
+        self._occ_remove(self._monster_tiles, (m.x, m.y), m.id)
+        old_cell = (m.x // MONSTER_CELL, m.y // MONSTER_CELL)
+        m.x, m.y = x, y
+        self._occ_add(self._monster_tiles, (x, y), m.id)
+        new_cell = (x // MONSTER_CELL, y // MONSTER_CELL)
+        if new_cell != old_cell:
+            self._cell_remove(old_cell, m.id)
+            self._monster_cells.setdefault(new_cell, set()).add(m.id)
+
+    def remove_monster(self, mid: int) -> Optional[Monster]:
+        m = self.monsters.pop(mid, None)
+        if m is not None:
+            self._occ_remove(self._monster_tiles, (m.x, m.y), m.id)
+            self._cell_remove((m.x // MONSTER_CELL, m.y // MONSTER_CELL), m.id)
+        return m
+
+    def clear_monsters(self):
+        self.monsters.clear()
+        self._monster_tiles.clear()
+        self._monster_cells.clear()
+
+    def _cell_remove(self, cell: Tuple[int, int], mid: int):
+        ids = self._monster_cells.get(cell)
+        if ids is not None:
+            ids.discard(mid)
+            if not ids:
+                del self._monster_cells[cell]
+
+    def monsters_in_cells(self, cells: Iterable[Tuple[int, int]]) -> List[Monster]:
+        """Monsters bucketed in the given MONSTER_CELL cells, in id order."""
+        ids: List[int] = []
+        for cell in cells:
+            bucket = self._monster_cells.get(cell)
+            if bucket:
+                ids.extend(bucket)
+        return [self.monsters[i] for i in sorted(ids)]
+
+    def players_at(self, x: int, y: int) -> List[Player]:
+        return [self.players[i] for i in sorted(self._player_tiles.get((x, y), ()))]
+
+    def monsters_at(self, x: int, y: int) -> List[Monster]:
+        return [self.monsters[i] for i in sorted(self._monster_tiles.get((x, y), ()))]
+
+    def player_at(self, x: int, y: int, exclude: Optional[int] = None) -> Optional[Player]:
+        """Lowest-id player on the tile (other than `exclude`), like scanning players in order."""
+        ids = [i for i in self._player_tiles.get((x, y), ()) if i != exclude]
+        return self.players[min(ids)] if ids else None
+
+    def monster_at(self, x: int, y: int) -> Optional[Monster]:
+        ids = self._monster_tiles.get((x, y))
+        return self.monsters[min(ids)] if ids else None
+
+    def rebuild_occupancy(self):
+        self._player_tiles.clear()
+        self._monster_tiles.clear()
+        for p in self.players.values():
+            self._occ_add(self._player_tiles, (p.x, p.y), p.id)
+        self._monster_cells.clear()
+        for m in self.monsters.values():
+            self._occ_add(self._monster_tiles, (m.x, m.y), m.id)
+            self._monster_cells.setdefault((m.x // MONSTER_CELL, m.y // MONSTER_CELL), set()).add(m.id)
+
+    def validate_occupancy(self):
+        """Raise AssertionError if the occupancy index disagrees with the entity dicts."""
+        for name, index, entities in (
+            ("player", self._player_tiles, self.players),
+            ("monster", self._monster_tiles, self.monsters),
+        ):
+            expected: Dict[Tuple[int, int], List[int]] = {}
+            for e in entities.values():
+                expected.setdefault((e.x, e.y), []).append(e.id)
+            actual = {pos: sorted(ids) for pos, ids in index.items()}
+            expected = {pos: sorted(ids) for pos, ids in expected.items()}
+            if actual != expected:
+                diff = {pos: (actual.get(pos), expected.get(pos)) for pos in set(actual) | set(expected)
+                        if actual.get(pos) != expected.get(pos)}
+                raise AssertionError(f"{name} occupancy index out of sync (index, entities): {diff}")
+        expected_cells: Dict[Tuple[int, int], Set[int]] = {}
+        for m in self.monsters.values():
+            expected_cells.setdefault((m.x // MONSTER_CELL, m.y // MONSTER_CELL), set()).add(m.id)
+        if expected_cells != self._monster_cells:
+            raise AssertionError(f"monster cell index out of sync (index, entities): "
+                                 f"{self._monster_cells} != {expected_cells}")
 
     def is_occupied_by_players(self, x: int, y: int) -> bool:
-        return any(p.x == x and p.y == y for p in self.players.values())
+        return (x, y) in self._player_tiles
 
     def is_occupied_by_monsters(self, x: int, y: int) -> bool:
-        return any(m.x == x and m.y == y for m in self.monsters.values())
+        return (x, y) in self._monster_tiles
 
     def is_occupied_by_resources(self, x: int, y: int) -> bool:
         return (x, y) in self.resources
@@ -350,12 +652,13 @@ class GameState:
                     if self.is_free(x, y):
                         return x, y
         # Fallback to clamped position
-        sx = max(0, min(WORLD_W - 1, sx))
-        sy = max(0, min(WORLD_H - 1, sy))
+        sx = max(0, min(self.world_w - 1, sx))
+        sy = max(0, min(self.world_h - 1, sy))
         return sx, sy
 
     def add_damage_number(self, x: int, y: int, damage: int, ttl: int = 60):
-        """Add a floating damage number at the given position. Only adds if no damage was dealt this tick at this position."""
+        """Add a floating damage number at the given position. Only adds if no damage was dealt this tick at this position.
+        Numbers are stored as (damage, expiry tick); the snapshot derives the remaining ttl."""
         pos = (x, y)
         
         # If we already dealt damage at this position this tick, accumulate it instead of creating duplicate
@@ -363,45 +666,74 @@ class GameState:
             self._damage_this_tick[pos] += damage
             # Update the existing damage number with the new total
             if pos in self.damage_numbers and self.damage_numbers[pos]:
-                # Update the most recent damage number (highest ttl)
+                # Update the most recent damage number (latest expiry)
                 most_recent_idx = 0
-                highest_ttl = 0
-                for i, (dmg, curr_ttl) in enumerate(self.damage_numbers[pos]):
-                    if curr_ttl > highest_ttl:
-                        highest_ttl = curr_ttl
+                latest_due = -1
+                for i, (dmg, due) in enumerate(self.damage_numbers[pos]):
+                    if due > latest_due:
+                        latest_due = due
                         most_recent_idx = i
                 # Update the damage amount
-                old_damage, old_ttl = self.damage_numbers[pos][most_recent_idx]
-                self.damage_numbers[pos][most_recent_idx] = (self._damage_this_tick[pos], old_ttl)
+                old_damage, old_due = self.damage_numbers[pos][most_recent_idx]
+                self.damage_numbers[pos][most_recent_idx] = (self._damage_this_tick[pos], old_due)
             return
         
         # First damage at this position this tick
         self._damage_this_tick[pos] = damage
         if pos not in self.damage_numbers:
             self.damage_numbers[pos] = []
-        self.damage_numbers[pos].append((damage, ttl))
+        due = self.tick + ttl
+        self.damage_numbers[pos].append((damage, due))
+        self.tick_timers.schedule(due, partial(self._expire_damage_numbers, pos))
 
     def clear_tick_damage_tracking(self):
         """Clear the damage tracking for this tick. Call this at the start of each tick."""
         self._damage_this_tick.clear()
 
-    def update_damage_numbers(self):
-        """Update damage number TTLs and remove expired ones."""
-        expired_positions = []
-        for pos, numbers in self.damage_numbers.items():
-            # Decrement TTL for each number
-            updated_numbers = []
-            for damage, ttl in numbers:
-                if ttl > 0:
-                    updated_numbers.append((damage, ttl - 1))
-            if updated_numbers:
-                self.damage_numbers[pos] = updated_numbers
-            else:
-                expired_positions.append(pos)
-        # Remove positions with no numbers left
-        for pos in expired_positions:
+    def _expire_damage_numbers(self, pos: Tuple[int, int]):
+        numbers = self.damage_numbers.get(pos)
+        if numbers is None:
+            return
+        remaining = [(d, due) for d, due in numbers if due > self.tick]
+        if remaining:
+            self.damage_numbers[pos] = remaining
+        else:
             del self.damage_numbers[pos]
 
+    # -------------------- Timed state --------------------
+    def run_tick_timers(self):
+        """Expire everything whose TTL ends this tick (effects, damage numbers, notifications)."""
+        for expire in self.tick_timers.pop_due(self.tick):
+            expire()
+
+    def add_effect(self, x: int, y: int, src: Optional[int] = None, ttl: int = 1):
+        """Area effect on a tile for `ttl` ticks (including this one); value is (expiry tick, source pid)."""
+        pos = (x, y)
+        due = self.tick + ttl - 1
+        self.effects[pos] = (due, src)
+        self.tick_timers.schedule(due, partial(self._expire_effect, pos), key=("effect", pos))
+
+    def _expire_effect(self, pos: Tuple[int, int]):
+        if self.effects.pop(pos, None) is not None:
+            trace.debug("effects", "Effect at {pos} expired", pos=pos)
+
+    def remove_effect(self, x: int, y: int):
+        self.effects.pop((x, y), None)
+        self.tick_timers.cancel(("effect", (x, y)))
+
+    def begin_cast(self, p: Player, casting: dict):
+        """Put the player into casting state; resolve_actions completes it once casting["end"] is due."""
+        p.casting = casting
+        self.cast_timers.schedule(float(casting.get("end", 0)), p.id, key=p.id)
+
+    def cancel_cast(self, p: Player) -> bool:
+        """Interrupt a cast in progress (no effect, no cooldown)."""
+        self.cast_timers.cancel(p.id)
+        if p.casting is None:
+            return False
+        p.casting = None
+        return True
+
     def update_pending_spells(self):
         """Update pending spells and resolve any that are ready."""
         resolved_spells = []
@@ -437,7 +769,11 @@ class GameState:
         self.pending_spells.append(spell)
         return True
 
-    def spawn_projectile(self, caster_id: int, x: int, y: int, dx: int, dy: int, speed: int, ttl: int, dmg: int = 10) -> int:
+    def spawn_projectile(self, caster_id: int, x: int, y: int, dx: int, dy: int, speed: int, ttl: int,
+                         dmg: int = 10) -> Optional[int]:
+        """Launch a projectile; None (nothing spawned) when projectile_cap are already in flight."""
+        if self.projectile_cap is not None and len(self.projectiles) >= self.projectile_cap:
+            return None
         pid = self._next_projectile_id
         self._next_projectile_id += 1
         self.projectiles[pid] = Projectile(
@@ -446,46 +782,68 @@ class GameState:
         )
         return pid
 
-    def snapshot(self, now: Optional[float] = None):
+    def private_snapshot(self, player_id: int, now: Optional[float] = None) -> Optional[dict]:
+        """State only the owning player receives (merged into its public record by the client)."""
+        p = self.players.get(player_id)
+        if not p:
+            return None
+        return {
+            "class": None,
+            "mp": p.mp,
+            "mpMax": p.mp_max,
+            "xp": 0,
+            # lightweight lists for UI
+            "inventory": {k: v for k, v in (p.inventory or {}).items() if v > 0},
+            "spellsKnown": list((p.spells or {}).keys()),
+            # Include quest status and progress data for client UI
+            "quests": {
+                qid: {
+                    "status": (q.get("status") if isinstance(q, dict) else q),
+                    # copy: the delta baseline must not alias live quest data
+                    "data": (dict(q.get("data", {})) if isinstance(q, dict) else {})
+                }
+                for qid, q in (p.quests or {}).items()
+            },
+            "notifications": list(p.notifications.values()),
+            # Expose lightweight casting/cooldown info for client UX
+            "casting": (
+                {
+                    "spell": p.casting.get("spell"),
+                    "x": p.casting.get("target", (p.x, p.y))[0],
+                    "y": p.casting.get("target", (p.x, p.y))[1],
+                    "timeLeft": max(0.0, (p.casting.get("end", 0) - (now or 0)))
+                }
+                if getattr(p, 'casting', None) else None
+            ),
+            "cooldowns": (
+                {k: max(0.0, (v - (now or 0))) for k, v in (p.cooldowns or {}).items()}
+                if now is not None else {}
+            ),
+        }
+
+    def snapshot(self, chunks: Optional[Iterable] = None):
+        """World state shared by every connection (before area-of-interest filtering).
+        On chunked worlds `chunks` limits resources to those chunks (the ones near players),
+        so the snapshot does not grow with the explored area."""
+        if chunks is None:
+            resources = [
+                {"x": x, "y": y, "type": r.get("type"), "hp": r.get("hp", 1)}
+                for (x, y), r in self.resources.items()
+            ]
+        else:
+            resources = [rec for c in chunks for rec in c.records(self.resources)]
         snap = {
-            "world": {"w": WORLD_W, "h": WORLD_H},
-            "tiles": self.tiles or [],
+            # Tiles/world come from the separate map message; this only says which map is current
+            "mapVersion": self.map_version,
+            # Public per-player record; inventory, quests, cooldowns etc. go through private_snapshot
             "players": {
                 pid: {
                     "x": p.x,
                     "y": p.y,
-                    "class": None,
                     "hp": p.hp,
                     "hpMax": p.hp_max,
-                    "mp": p.mp,
-                    "mpMax": p.mp_max,
-                    "xp": 0,
-                    # lightweight lists for UI
-                    "inventory": {k: v for k, v in (p.inventory or {}).items() if v > 0},
-                    "spellsKnown": list((p.spells or {}).keys()),
-                    # Include quest status and progress data for client UI
-                    "quests": {
-                        qid: {
-                            "status": (q.get("status") if isinstance(q, dict) else q),
-                            "data": (q.get("data", {}) if isinstance(q, dict) else {})
-                        }
-                        for qid, q in (p.quests or {}).items()
-                    },
-                    "notifications": [text for (text, ttl) in (p.notifications or []) if ttl > 0],
-                    # Expose lightweight casting/cooldown info for client UX
-                    "casting": (
-                        {
-                            "spell": p.casting.get("spell"),
-                            "x": p.casting.get("target", (p.x, p.y))[0],
-                            "y": p.casting.get("target", (p.x, p.y))[1],
-                            "timeLeft": max(0.0, (p.casting.get("end", 0) - (now or 0)))
-                        }
-                        if getattr(p, 'casting', None) else None
-                    ),
-                    "cooldowns": (
-                        {k: max(0.0, (v - (now or 0))) for k, v in (p.cooldowns or {}).items()}
-                        if now is not None else {}
-                    ),
+                    # Casting indicator only; target and timing are private
+                    "casting": ({"spell": p.casting.get("spell")} if getattr(p, 'casting', None) else None),
                 }
                 for pid, p in self.players.items()
             },
@@ -497,10 +855,7 @@ class GameState:
                 {"id": m.id, "type": m.kind, "name": m.kind.capitalize(), "x": m.x, "y": m.y, "hp": m.hp, "hpMax": m.hp_max, "aggro": m.aggro}
                 for m in self.monsters.values()
             ],
-            "resources": [
-                {"x": x, "y": y, "type": r.get("type"), "hp": r.get("hp", 1)}
-                for (x, y), r in self.resources.items()
-            ],
+            "resources": resources,
             "effects": [ {"x": x, "y": y} for (x, y), _val in self.effects.items() ],
             "projectiles": [
                 {"id": pr.id, "x": pr.x, "y": pr.y, "dx": pr.dx, "dy": pr.dy, "caster": pr.caster_id}
@@ -511,7 +866,7 @@ class GameState:
                 for s in self.pending_spells
             ],
             "damageNumbers": [
-                {"x": x, "y": y, "numbers": [{"damage": d, "ttl": t} for d, t in numbers]}
+                {"x": x, "y": y, "numbers": [{"damage": d, "ttl": due - self.tick - 1} for d, due in numbers]}
                 for (x, y), numbers in self.damage_numbers.items()
             ],
             # Expose cave entrance marker so client can draw it differently
@@ -527,13 +882,12 @@ class GameState:
         """Ensure no monster occupies the same tile as any player.
         If overlap is found (e.g., due to legacy state), relocate the monster to the nearest free tile.
         """
-        player_tiles = {(p.x, p.y) for p in self.players.values()}
-        if not player_tiles:
+        if not self._player_tiles:
             return
-        for m in list(self.monsters.values()):
-            if (m.x, m.y) in player_tiles:
+        for pos in list(self._player_tiles):
+            for m in self.monsters_at(*pos):
                 nx, ny = self.find_free_near(m.x, m.y)
-                m.x, m.y = nx, ny
+                self.place_monster(m, nx, ny)
 
     # Monster helpers
     def spawn_slime(self, x: int, y: int):
@@ -544,10 +898,10 @@ class GameState:
         fx, fy = (x, y)
         if not self.is_free(x, y):
             fx, fy = self.find_free_near(x, y)
-        self.monsters[mid] = Monster(
+        self.add_monster(Monster(
             id=mid, kind="slime", x=fx, y=fy, hp=hp, hp_max=hp,
             dmg=6, speed=2, spawn_x=x, spawn_y=y, roam_radius=3
-        )
+        ))
         return mid
 
     def spawn_bat(self, x: int, y: int):
@@ -557,10 +911,10 @@ class GameState:
         fx, fy = (x, y)
         if not self.is_free(x, y):
             fx, fy = self.find_free_near(x, y)
-        self.monsters[mid] = Monster(
+        self.add_monster(Monster(
             id=mid, kind="bat", x=fx, y=fy, hp=hp, hp_max=hp,
             dmg=12, speed=3, xp_reward=10, aggro=True, spawn_x=x, spawn_y=y, roam_radius=5
-        )
+        ))
         return mid
 
     def spawn_dummy(self, x: int, y: int):
@@ -573,7 +927,7 @@ class GameState:
         if not self.is_free(x, y):
             fx, fy = self.find_free_near(x, y)
         hp = 9999
-        self.monsters[mid] = Monster(
+        self.add_monster(Monster(
             id=mid,
             kind="dummy",
             x=fx,
@@ -587,7 +941,7 @@ class GameState:
             spawn_x=fx,
             spawn_y=fy,
             roam_radius=0,
-        )
+        ))
         return mid
 
     def ensure_initial_monsters(self):
@@ -596,7 +950,7 @@ class GameState:
         # Always ensure a stationary training dummy exists near spawn for testing
         has_dummy = any(m.kind == "dummy" for m in self.monsters.values()) if self.monsters else False
         if not has_dummy:
-            cx, cy = WORLD_W // 2, WORLD_H // 2
+            cx, cy = self.spawn_point
             # Prefer a tile to the right of spawn; fallback to any free nearby tile
             dx, dy = cx + 1, cy
             if not self.is_free(dx, dy):
@@ -608,7 +962,7 @@ class GameState:
         if non_dummy_count > 0:
             return
         # First-run population (no non-dummy monsters yet): spawn slimes and bats
-        cx, cy = WORLD_W // 2, WORLD_H // 2
+        cx, cy = self.spawn_point
         offsets = [(0, 0), (2, 0), (-2, 0), (0, 2), (0, -2)]
         for dx, dy in offsets:
             self.spawn_slime(cx + dx, cy + dy)
@@ -616,7 +970,7 @@ class GameState:
         ex, ey = self.cave_entrance
         bat_spawns = [(ex + 4, ey), (ex + 8, ey - 3), (ex + 8, ey + 3), (ex + 12, ey)]
         for bx, by in bat_spawns:
-            if 0 <= bx < WORLD_W and 0 <= by < WORLD_H:
+            if 0 <= bx < self.world_w and 0 <= by < self.world_h:
                 self.spawn_bat(bx, by)
 
     # -------------------- Gathering --------------------
@@ -638,28 +992,25 @@ class GameState:
             if r_hp <= 0:
                 # Remove resource when depleted
                 del self.resources[pos]
+                self.terrain_version += 1
             else:
                 r["hp"] = r_hp
+            if self.chunks is not None:
+                self.chunks.resource_changed(*pos)
             # Optional: floating number to indicate gather (small green could be client-implemented later)
             return r_type or None
         return None
 
     # -------------------- Notifications --------------------
     def add_notification(self, player_id: int, text: str, ttl: int = 20):
+        """Show `text` to the player for `ttl` ticks (counting the current one as the first)."""
         p = self.players.get(player_id)
         if not p:
             return
-        p.notifications.append((text, ttl))
-
-    def update_notifications(self):
-        for p in self.players.values():
-            if not p.notifications:
-                continue
-            updated: List[Tuple[str, int]] = []
-            for text, ttl in p.notifications:
-                if ttl > 1:
-                    updated.append((text, ttl - 1))
-            p.notifications = updated
+        nid = self._next_notification_id
+        self._next_notification_id += 1
+        p.notifications[nid] = text
+        self.tick_timers.schedule(self.tick + ttl - 1, partial(p.notifications.pop, nid, None))
 
     # -------------------- Spells & Items --------------------
     def unlock_spell_if_requirement_met(self, player_id: int, spell_name: str):
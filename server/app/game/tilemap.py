@@ -0,0 +1,134 @@
+from __future__ import annotations
+from functools import cached_property
+from typing import List
+import math
+
+# Tile characters: 'G' grass, 'W' water, 'R' cave wall (legacy), 'C' cave entrance, 'M' mine entrance
+GRASS, WATER, ROCK, CAVE, MINE = b"G", b"W", b"R", b"C", b"M"
+
+# Terrain type per tile byte (bytes.translate table); unknown characters count as grass
+TERRAIN_GRASS, TERRAIN_WATER, TERRAIN_ROCK, TERRAIN_CAVE, TERRAIN_MINE = range(5)
+_TERRAIN = bytearray(TERRAIN_GRASS for _ in range(256))
+_TERRAIN[WATER[0]] = TERRAIN_WATER
+_TERRAIN[ROCK[0]] = TERRAIN_ROCK
+_TERRAIN[CAVE[0]] = TERRAIN_CAVE
+_TERRAIN[MINE[0]] = TERRAIN_MINE
+TERRAIN_TABLE = bytes(_TERRAIN)
+
+# 1 = walkable. Only water blocks movement; legacy 'R' is walkable in the forest.
+_WALK = bytearray(1 for _ in range(256))
+_WALK[WATER[0]] = 0
+WALKABLE_TABLE = bytes(_WALK)
+
+
+class TileMap:
+    """Row-major tile grid stored as one bytearray (one ASCII byte per tile).
+    The walkable and terrain masks are derived with bytes.translate and cached until the
+    next write, so per-tile queries are an index into a bytes object."""
+
+    def __init__(self, w: int, h: int, fill: bytes = GRASS):
+        self.w = w
+        self.h = h
+        self.cells = bytearray(fill * (w * h))
+
+    @classmethod
+    def from_rows(cls, rows: List[str]) -> "TileMap":
+        h = len(rows)
+        w = len(rows[0]) if rows else 0
+        tm = cls(w, h)
+        tm.cells[:] = "".join(rows).encode("ascii")
+        return tm
+
+    def _dirty(self):
+        # Drop the cached_property values; they are rebuilt on next access
+        for name in ("walkable_mask", "walkable_rows", "terrain_mask", "_rows"):
+            self.__dict__.pop(name, None)
+
+    # -------------------- Reads --------------------
+    def in_bounds(self, x: int, y: int) -> bool:
+        return 0 <= x < self.w and 0 <= y < self.h
+
+    def get(self, x: int, y: int) -> str:
+        return chr(self.cells[y * self.w + x])
+
+    @cached_property
+    def walkable_mask(self) -> bytes:
+        """One byte per tile, 1 where units can stand."""
+        return bytes(self.cells).translate(WALKABLE_TABLE)
+
+    @cached_property
+    def walkable_rows(self) -> List[bytes]:
+        """walkable_mask split per row, for walkable_rows[y][x] lookups."""
+        w, mask = self.w, self.walkable_mask
+        return [mask[y * w:(y + 1) * w] for y in range(self.h)]
+
+    @cached_property
+    def terrain_mask(self) -> bytes:
+        """One TERRAIN_* code per tile."""
+        return bytes(self.cells).translate(TERRAIN_TABLE)
+
+    def is_walkable(self, x: int, y: int) -> bool:
+        if not (0 <= x < self.w and 0 <= y < self.h):
+            return False
+        return self.walkable_rows[y][x] == 1
+
+    def terrain(self, x: int, y: int) -> int:
+        return self.terrain_mask[y * self.w + x]
+
+    @cached_property
+    def _rows(self) -> List[str]:
+        w = self.w
+        data = bytes(self.cells)
+        return [data[y * w:(y + 1) * w].decode("ascii") for y in range(self.h)]
+
+    def rows(self) -> List[str]:
+        """The map as a list of strings, the form clients receive (cached)."""
+        return self._rows
+
+    # -------------------- Writes --------------------
+    def set(self, x: int, y: int, ch: bytes):
+        self.cells[y * self.w + x] = ch[0]
+        self._dirty()
+
+    def fill_span(self, y: int, x0: int, x1: int, ch: bytes):
+        """Fill tiles x0..x1 (inclusive) of row y, clipped to the map."""
+        if not (0 <= y < self.h):
+            return
+        x0, x1 = max(0, x0), min(self.w - 1, x1)
+        if x0 > x1:
+            return
+        start = y * self.w
+        self.cells[start + x0:start + x1 + 1] = ch * (x1 - x0 + 1)
+        self._dirty()
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, ch: bytes):
+        """Fill the inclusive rectangle (x0, y0)-(x1, y1), clipped to the map."""
+        for y in range(max(0, y0), min(self.h - 1, y1) + 1):
+            self.fill_span(y, x0, x1, ch)
+
+    def fill_ellipse(self, cx: int, cy: int, rx: int, ry: int, ch: bytes):
+        """Fill tiles with ((x-cx)/rx)^2 + ((y-cy)/ry)^2 <= 1, one slice per row."""
+        rx, ry = max(1, rx), max(1, ry)
+
+        def inside(x: int, y: int) -> bool:
+            dx = (x - cx) / rx
+            dy = (y - cy) / ry
+            return dx * dx + dy * dy <= 1.0
+
+        for y in range(max(0, cy - ry), min(self.h - 1, cy + ry) + 1):
+            dy = (y - cy) / ry
+            rem = 1.0 - dy * dy
+            if rem < 0:
+                continue
+            half = rx * math.sqrt(rem)
+            x0, x1 = math.ceil(cx - half), math.floor(cx + half)
+            # sqrt rounding can be off by one tile at the rim: settle it with the exact test
+            while x0 > cx - rx - 1 and inside(x0 - 1, y):
+                x0 -= 1
+            while x0 <= x1 and not inside(x0, y):
+                x0 += 1
+            while x1 < cx + rx + 1 and inside(x1 + 1, y):
+                x1 += 1
+            while x1 >= x0 and not inside(x1, y):
+                x1 -= 1
+            self.fill_span(y, x0, x1, ch)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Set
+import threading
+import time
+
+# Structured, gated tracing for the game loop.
+# Call sites pass a subsystem, a message template and fields; nothing is formatted
+# unless the event is kept, and a disabled subsystem costs one dict lookup. Kept events
+# go to an in-memory ring buffer (dumped via /admin/trace) and, only when echo is on
+# (globally or for their subsystem), to stdout. Loops that would trace per entity check
+# trace.enabled() first.
+# Events come from the simulation thread (GameEngine(threaded=True)) while /admin/trace
+# reads the buffer on the event loop, so the buffer is only touched under _lock.
+
+DEBUG, INFO, WARN, OFF = 10, 20, 30, 100
+LEVEL_NAMES = {"debug": DEBUG, "info": INFO, "warn": WARN, "off": OFF}
+
+# Subsystems used by the engine and actions
+SUBSYSTEMS = ("tick", "monsters", "effects", "respawn", "combat", "spells", "chunks", "world", "persist",
+              "overload")
+
+
+def parse_level(value) -> int:
+    if isinstance(value, int):
+        return value
+    try:
+        return LEVEL_NAMES[str(value).lower()]
+    except KeyError:
+        raise ValueError(f"Unknown trace level: {value}")
+
+
+class Tracer:
+    """Level + per-subsystem gate, 1-in-N sampling and a bounded ring buffer."""
+
+    def __init__(self, level: int = INFO, capacity: int = 2000, echo: bool = False,
+                 echo_subsystems: Iterable[str] = ()):
+        self.level = level
+        self.echo = echo
+        # Subsystems whose kept events are printed even when echo is off
+        self.echo_subsystems: Set[str] = set(echo_subsystems)
+        # subsystem -> level overriding the global one
+        self.subsystem_levels: Dict[str, int] = {}
+        # subsystem -> keep one event in N (1 = keep all)
+        self.sample_every: Dict[str, int] = {}
+        self._seen: Dict[str, int] = {}
+        self.buffer: Deque[tuple] = deque(maxlen=max(1, int(capacity)))
+        # Guards buffer: appends, snapshots and resizes
+        self._lock = threading.Lock()
+        self.dropped_by_sampling = 0
+        # Tick number stamped on events (set by the engine)
+        self.tick = 0
+
+    def configure(self, level=None, subsystems: Optional[Dict[str, object]] = None,
+                  sample: Optional[Dict[str, int]] = None, echo: Optional[bool] = None,
+                  capacity: Optional[int] = None, echo_subsystems: Optional[Dict[str, bool]] = None):
+        """Change settings at runtime; omitted arguments keep their current value."""
+        if level is not None:
+            self.level = parse_level(level)
+        if subsystems is not None:
+            for name, lvl in subsystems.items():
+                if lvl is None:
+                    self.subsystem_levels.pop(name, None)
+                else:
+                    self.subsystem_levels[name] = parse_level(lvl)
+        if sample is not None:
+            for name, every in sample.items():
+                self.sample_every[name] = max(1, int(every))
+        if echo is not None:
+            self.echo = bool(echo)
+        if echo_subsystems is not None:
+            for name, on in echo_subsystems.items():
+                if on:
+                    self.echo_subsystems.add(name)
+                else:
+                    self.echo_subsystems.discard(name)
+        if capacity is not None:
+            with self._lock:
+                self.buffer = deque(self.buffer, maxlen=max(1, int(capacity)))
+
+    def enabled(self, subsystem: str, level: int = DEBUG) -> bool:
+        return level >= self.subsystem_levels.get(subsystem, self.level)
+
+    def event(self, subsystem: str, level: int, msg: str, **fields):
+        if level < self.subsystem_levels.get(subsystem, self.level):
+            return
+        every = self.sample_every.get(subsystem, 1)
+        if every > 1:
+            n = self._seen.get(subsystem, 0) + 1
+            self._seen[subsystem] = n
+            if n % every:
+                self.dropped_by_sampling += 1
+                return
+        record = (time.time(), self.tick, subsystem, level, msg, fields)
+        with self._lock:
+            self.buffer.append(record)
+        if self.echo or subsystem in self.echo_subsystems:
+            print(f"{_level_name(level)}: [{subsystem}] {_format(msg, fields)}", flush=True)
+
+    def debug(self, subsystem: str, msg: str, **fields):
+        # Checked here too so a disabled call returns without a second call
+        if DEBUG >= self.subsystem_levels.get(subsystem, self.level):
+            self.event(subsystem, DEBUG, msg, **fields)
+
+    def info(self, subsystem: str, msg: str, **fields):
+        self.event(subsystem, INFO, msg, **fields)
+
+    def dump(self, limit: Optional[int] = None, subsystem: Optional[str] = None) -> List[dict]:
+        """Buffered events, oldest first, formatted for JSON."""
+        with self._lock:
+            snapshot = list(self.buffer)
+        records = [r for r in snapshot if subsystem is None or r[2] == subsystem]
+        if limit is not None:
+            records = records[-max(0, int(limit)):] if limit else []
+        return [
+            {"time": t, "tick": tick, "subsystem": sub, "level": _level_name(lvl),
+             "message": _format(msg, fields), "fields": fields}
+            for (t, tick, sub, lvl, msg, fields) in records
+        ]
+
+    def settings(self) -> dict:
+        return {
+            "level": _level_name(self.level),
+            "subsystems": {k: _level_name(v) for k, v in self.subsystem_levels.items()},
+            "sample": dict(self.sample_every),
+            "echo": self.echo,
+            "echoSubsystems": sorted(self.echo_subsystems),
+            "capacity": self.buffer.maxlen,
+            "buffered": len(self.buffer),
+            "droppedBySampling": self.dropped_by_sampling,
+        }
+
+
+def _level_name(level: int) -> str:
+    for name, value in LEVEL_NAMES.items():
+        if value == level:
+            return name.upper()
+    return str(level)
+
+
+def _format(msg: str, fields: dict) -> str:
+    try:
+        return msg.format(**fields)
+    except Exception:
+        return f"{msg} {fields}"
+
+
+# Process-wide tracer used by the game modules. Overload steps are rare and operationally
+# relevant: they go to the server log too, not only the ring buffer.
+trace = Tracer(echo_subsystems=("overload",))
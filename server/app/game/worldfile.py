@@ -0,0 +1,57 @@
+from __future__ import annotations
+import json
+import os
+from typing import Optional
+
+# On-disk cache of the generated classic map.
+# Generation is a pure function of (seed, GENERATOR_VERSION), so its result (tiles,
+# resources, entrances, NPC placements) is written once and read back on later starts,
+# wipes and other nodes using the same seed. Bump GENERATOR_VERSION whenever the output of
+# GameState._generate_forest_map or ensure_initial_npcs changes: old files then stop
+# matching and are regenerated.
+
+GENERATOR_VERSION = 1
+
+
+def artifact_path(directory: str, seed: int) -> str:
+    return os.path.join(directory, f"world-{seed}-v{GENERATOR_VERSION}.json")
+
+
+def save_world(state, path: str):
+    """Write the state's map, resources, entrances and NPCs (atomically: tmp file + rename)."""
+    data = {
+        "generator": GENERATOR_VERSION,
+        "seed": state.world_seed,
+        "w": state.tilemap.w,
+        "h": state.tilemap.h,
+        "version": state.map_version,
+        "tiles": state.tiles,
+        "resources": [[x, y, r.get("type"), r.get("hp", 1)] for (x, y), r in state.resources.items()],
+        "cave": list(state.cave_entrance),
+        "mine": list(state.mine_entrance),
+        "npcs": list(state.npcs.values()),
+    }
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def load_world(path: str, seed: int, w: int, h: int) -> Optional[dict]:
+    """The saved world if it exists and was made by this generator version from this seed
+    at this size; None otherwise (missing, stale or unreadable file)."""
+    try:
+        with open(path) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (data.get("generator") != GENERATOR_VERSION or data.get("seed") != seed
+            or data.get("w") != w or data.get("h") != h):
+        return None
+    tiles = data.get("tiles") or []
+    if len(tiles) != h or any(len(row) != w for row in tiles):
+        return None
+    return data
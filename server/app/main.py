@@ -1,16 +1,22 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Header
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Response
 from fastapi.responses import RedirectResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pathlib import Path
 from fastapi.middleware.cors import CORSMiddleware
 from starlette.websockets import WebSocketState
-from .auth import get_current_user, router as auth_router, is_admin_user
+from .auth import get_current_user, router as auth_router, check_admin, reload_admin_users, auth_cache_stats
 from .game.engine import GameEngine
-from .schemas import ActionMessage, ClientHello
-from sqlalchemy.orm import Session
-from .db import get_db
+from .game.chunks import ChunkWorld, CHUNK_SIZE
+from .game.persistence import PlayerStore
+from .game.checkpoint import Checkpointer
+from .game.overload import OverloadController
+from .game.trace import trace
+from .schemas import ActionMessage, ClientHello, TraceConfig
+from .workers import db_pool, pool_stats, shutdown_pools
 import asyncio
 import json
+import os
+import time
 
 app = FastAPI(title="Turn-Based RPG Prototype")
 app.include_router(auth_router, prefix="/auth", tags=["auth"]) 
@@ -23,14 +29,109 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Run a faster tick loop (0.25s) and keep debug logs for now
-engine = GameEngine(tick_seconds=0.25, debug=True)
+# Both world kinds are generated from WORLD_SEED; the classic map is cached in WORLD_CACHE_DIR
+WORLD_SEED = int(os.getenv("WORLD_SEED", "0"))
+
+def _world_from_env():
+    """WORLD_SIZE=<w>x<h> (e.g. 4096x4096) switches to a chunked, lazily generated world;
+    WORLD_CHUNK sets its chunk size. Unset keeps the classic map."""
+    size = os.getenv("WORLD_SIZE")
+    if not size:
+        return None
+    w, _, h = size.lower().partition("x")
+    return ChunkWorld(int(w), int(h or w), seed=WORLD_SEED,
+                      size=int(os.getenv("WORLD_CHUNK", str(CHUNK_SIZE))))
+
+# Player state is saved behind the game: changed players are queued by the tick and written
+# every PERSIST_FLUSH_SECONDS in transactions of up to PERSIST_BATCH_SIZE rows by a thread
+player_store = PlayerStore(
+    flush_interval=float(os.getenv("PERSIST_FLUSH_SECONDS", "5")),
+    batch_size=int(os.getenv("PERSIST_BATCH_SIZE", "200")),
+    flush_on_shutdown=os.getenv("PERSIST_FLUSH_ON_SHUTDOWN", "1").lower() not in ("0", "false", "no"),
+)
+
+# The world survives restarts: a checkpoint every CHECKPOINT_TICKS ticks plus a journal of
+# the actions in between, in CHECKPOINT_DIR (off unless set, e.g. CHECKPOINT_DIR=checkpoints)
+def _checkpoints_from_env():
+    directory = os.getenv("CHECKPOINT_DIR")
+    if not directory:
+        return None
+    return Checkpointer(directory, interval_ticks=int(os.getenv("CHECKPOINT_TICKS", "240")),
+                        keep=int(os.getenv("CHECKPOINT_KEEP", "2")))
+
+# RECORD_DIR records each server run into its own subdirectory (one checkpoint, then every
+# tick with a world digest every RECORD_DIGEST_TICKS ticks) for replay_session.py
+def _recorder_from_env():
+    directory = os.getenv("RECORD_DIR")
+    if not directory:
+        return None
+    return Checkpointer(os.path.join(directory, time.strftime("session-%Y%m%d-%H%M%S")), interval_ticks=0,
+                        keep=0, digest_every=int(os.getenv("RECORD_DIGEST_TICKS", "10")))
+
+# Simulation ticks per second (SIM_HZ, default 4) and state frames sent per second (SEND_HZ,
+# default: every tick). Game rules count in ticks, so SIM_HZ also sets the game's pace.
+SIM_HZ = float(os.getenv("SIM_HZ", "4"))
+SEND_HZ = float(os.getenv("SEND_HZ", str(SIM_HZ)))
+# Ticks run on a dedicated thread and frames are encoded on another, so sockets and HTTP stay
+# responsive during a tick (see game/simthread.py); SIM_THREAD=0 runs both on the event loop
+SIM_THREAD = os.getenv("SIM_THREAD", "1").lower() not in ("0", "false", "no", "off")
+
+# Load shedding when ticks overrun their budget (see game/overload.py): on unless
+# OVERLOAD_CONTROL=0; OVERLOAD_HIGH / OVERLOAD_LOW are the tick time shares of the budget
+# that step the degradation level up / back down, OVERLOAD_MAX_LEVEL the deepest step
+def _overload_from_env():
+    if os.getenv("OVERLOAD_CONTROL", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    return OverloadController(1.0 / SIM_HZ, high=float(os.getenv("OVERLOAD_HIGH", "0.9")),
+                              low=float(os.getenv("OVERLOAD_LOW", "0.5")),
+                              max_level=int(os.getenv("OVERLOAD_MAX_LEVEL", "3")))
+
+# Trace level of the ring buffer (TRACE_LEVEL: debug, info, warn or off; default info).
+# Also adjustable at runtime, per subsystem too, through POST /admin/trace
+trace.configure(level=os.getenv("TRACE_LEVEL", "info"))
+
+engine = GameEngine(tick_seconds=1.0 / SIM_HZ, send_seconds=1.0 / SEND_HZ,
+                    idle_seconds=float(os.getenv("SEND_IDLE_SECONDS", "10")),
+                    world=_world_from_env(), seed=WORLD_SEED,
+                    world_cache=os.getenv("WORLD_CACHE_DIR", "world_cache"), persistence=player_store,
+                    checkpoints=_checkpoints_from_env(), recorder=_recorder_from_env(),
+                    overload=_overload_from_env(),
+                    projectile_cap=int(os.getenv("OVERLOAD_PROJECTILE_CAP", "64")),
+                    threaded=SIM_THREAD)
+_engine_task = None
 
 @app.on_event("startup")
 async def on_startup():
-    # Ensure map exists before engine loop
-    engine.state.ensure_map()
-    asyncio.create_task(engine.run())
+    global _engine_task
+    # Ensure map exists (and is published for /map) before engine loop
+    engine.publish_map()
+    # Pick up where the last run stopped (or crashed), then start checkpointing from there
+    if engine.checkpoints is not None:
+        recovered = await engine.recover()
+        if recovered:
+            print(f"INFO: Recovered world: {recovered}", flush=True)
+        engine.checkpoints.start(engine)
+    if engine.recorder is not None:
+        engine.recorder.start(engine)
+    player_store.start()
+    _engine_task = asyncio.create_task(engine.run())
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    loop = asyncio.get_running_loop()
+    # No ticks after the final checkpoint
+    if _engine_task is not None:
+        _engine_task.cancel()
+        await asyncio.gather(_engine_task, return_exceptions=True)
+    if engine.checkpoints is not None:
+        engine.checkpoints.checkpoint(engine)
+        await loop.run_in_executor(None, engine.checkpoints.stop)
+    if engine.recorder is not None:
+        await loop.run_in_executor(None, engine.recorder.stop)
+    # Queue every player as it is now, then let the writer finish (final flush if enabled)
+    player_store.capture_all(engine.state.players.values())
+    await loop.run_in_executor(None, player_store.stop)
+    shutdown_pools(wait=False)
 
 @app.get("/")
 async def root():
@@ -61,6 +162,17 @@ async def get_sergeant_audio():
         raise HTTPException(status_code=404, detail="Sergeant audio not found")
     return FileResponse(str(fpath), media_type="audio/mpeg", filename=fpath.name)
 
+@app.get("/map")
+async def get_map(if_none_match: str | None = Header(default=None)):
+    """Static tile map, cacheable by its version hash (also pushed over the socket on connect)."""
+    # Published by the ticking thread: one read of a (version, message) pair, never a half-built map
+    version, body = engine.published_map
+    etag = f'"{version}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
     await ws.accept()
@@ -69,8 +181,13 @@ async def websocket_endpoint(ws: WebSocket):
         raw = await ws.receive_text()
         hello = ClientHello.model_validate_json(raw)
         user = await get_current_user(token=hello.token)
-        player_id = engine.connect_player(user_id=user.id, ws=ws)
-        await ws.send_text(json.dumps({"type": "connected", "playerId": player_id, "tick": engine.tick_index}))
+        # Saved player state, read on the DB pool (only used if the player is not in the world yet)
+        record = await db_pool.run(player_store.load, user.id)
+        player_id = await engine.join(user_id=user.id, ws=ws, delta=hello.delta, protocol=hello.protocol,
+                                      record=record)
+        # Always JSON; tells the client which protocol the following messages use
+        await ws.send_text(json.dumps({"type": "connected", "playerId": player_id, "tick": engine.tick_index,
+                                       "protocol": engine.protocol_of(player_id)}))
         # Main receive loop
         while True:
             raw_msg = await ws.receive_text()
@@ -83,26 +200,78 @@ async def websocket_endpoint(ws: WebSocket):
             await ws.send_text(json.dumps({"type": "error", "message": str(ex)}))
         engine.disconnect_ws(ws)
 
-@app.get("/debug/state")
-async def debug_state():
-    """Debug endpoint to inspect cave entrance position"""
+def _world_debug() -> dict:
     state = engine.state
     return {
-        "world_size": {"width": state.WORLD_W, "height": state.WORLD_H},
+        "world_size": {"width": state.world_w, "height": state.world_h},
+        "world_seed": state.world_seed,
+        "chunks_generated": len(state.chunks.chunks) if state.chunks is not None else None,
         "cave_entrance": {"x": state.cave_entrance[0], "y": state.cave_entrance[1]},
         "mine_entrance": {"x": state.mine_entrance[0], "y": state.mine_entrance[1]},
-        "tile_at_cave": state.tiles[state.cave_entrance[1]][state.cave_entrance[0]],
-        "tile_at_mine": state.tiles[state.mine_entrance[1]][state.mine_entrance[0]],
-        "players": [{"id": p.id, "x": p.x, "y": p.y} for p in state.players.values()]
+        "tile_at_cave": state.tile_at(*state.cave_entrance),
+        "tile_at_mine": state.tile_at(*state.mine_entrance),
+        "players": [{"id": p.id, "x": p.x, "y": p.y} for p in state.players.values()],
     }
 
-@app.post("/admin/wipe")
-async def admin_wipe(authorization: str | None = Header(default=None), db: Session = Depends(get_db)):
+@app.get("/debug/state")
+async def debug_state():
+    """Debug endpoint to inspect cave entrance position"""
+    # World reads go through the ticking thread (see GameEngine.inspect)
+    return {
+        **await engine.inspect(_world_debug),
+        "persistence": player_store.stats(),
+        "workers": pool_stats(),
+        "auth_cache": auth_cache_stats(),
+    }
+
+@app.get("/debug/connections")
+async def debug_connections():
+    """Per-connection send queue depth and dropped frame counters (find slow clients)"""
+    return {"connections": await engine.inspect(engine.connection_stats)}
+
+@app.get("/metrics")
+async def metrics(format: str = "prometheus"):
+    """Tick phase histograms, overrun counters and gauges (Prometheus text; ?format=json for JSON)"""
+    if format == "json":
+        return await engine.inspect(engine.metrics.as_dict)
+    body = await engine.inspect(engine.metrics.render_prometheus)
+    return Response(content=body, media_type="text/plain; version=0.0.4")
+
+async def require_admin(authorization: str | None):
     if not authorization or not authorization.lower().startswith("bearer "):
         raise HTTPException(status_code=401, detail="Missing token")
     token = authorization.split(" ", 1)[1]
     user = await get_current_user(token=token)
-    if not is_admin_user(db, user.id):
+    if not await check_admin(user.id):
         raise HTTPException(status_code=403, detail="Forbidden")
+    return user
+
+@app.post("/admin/wipe")
+async def admin_wipe(authorization: str | None = Header(default=None)):
+    await require_admin(authorization)
     await engine.admin_wipe()
     return {"status": "wiped"}
+
+@app.post("/admin/reload-admins")
+async def admin_reload_admins(authorization: str | None = Header(default=None)):
+    """Re-read ADMIN_USERS / ADMIN_USERS_FILE and drop the cached roles"""
+    await require_admin(authorization)
+    return {"admins": sorted(reload_admin_users())}
+
+@app.get("/admin/trace")
+async def admin_trace_dump(limit: int | None = 500, subsystem: str | None = None,
+                           authorization: str | None = Header(default=None)):
+    """Dump the trace ring buffer (newest `limit` events, optionally one subsystem) and current settings"""
+    await require_admin(authorization)
+    return {"settings": trace.settings(), "events": trace.dump(limit=limit, subsystem=subsystem)}
+
+@app.post("/admin/trace")
+async def admin_trace_configure(cfg: TraceConfig, authorization: str | None = Header(default=None)):
+    """Change trace level, per-subsystem levels, sampling and echo at runtime"""
+    await require_admin(authorization)
+    try:
+        trace.configure(level=cfg.level, subsystems=cfg.subsystems, sample=cfg.sample,
+                        echo=cfg.echo, capacity=cfg.capacity, echo_subsystems=cfg.echo_subsystems)
+    except ValueError as ex:
+        raise HTTPException(status_code=400, detail=str(ex))
+    return trace.settings()
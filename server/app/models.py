@@ -1,6 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text
+from sqlalchemy import Column, Integer, String, Text, Float
 from .db import Base
-import json
 
 class User(Base):
     __tablename__ = "users"
@@ -14,14 +13,29 @@ class User(Base):
         """Get class XP as a dictionary."""
         # TODO: Re-enable after database migration
         return {}
-        # try:
-        #     return json.loads(self.class_xp or "{}")
-        # except json.JSONDecodeError:
-        #     return {}
     
     def set_class_xp(self, xp_dict: dict):
         """Set class XP from a dictionary."""
         # TODO: Re-enable after database migration
         pass
-        # self.class_xp = json.dumps(xp_dict or {})
 
+
+class PlayerRecord(Base):
+    """Saved in-game state of a user's player (written behind by game/persistence.py).
+    Kept out of `users` so it is created by create_all without a migration."""
+    __tablename__ = "player_state"
+    user_id = Column(Integer, primary_key=True)
+    x = Column(Integer, nullable=False)
+    y = Column(Integer, nullable=False)
+    hp = Column(Integer, nullable=False)
+    hp_max = Column(Integer, nullable=False)
+    mp = Column(Integer, nullable=False)
+    mp_max = Column(Integer, nullable=False)
+    clazz = Column(String, nullable=True)
+    # JSON documents
+    xp = Column(Text, default="{}")
+    spells = Column(Text, default="{}")
+    inventory = Column(Text, default="{}")
+    quests = Column(Text, default="{}")
+    # Unix time of the write
+    updated_at = Column(Float, nullable=False)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Literal, Optional
+from typing import Dict, Literal, Optional
 
 class Token(BaseModel):
     access_token: str
@@ -17,11 +17,28 @@ class UserOut(BaseModel):
 class ClientHello(BaseModel):
     token: str
     client: str = "web"
+    # Receive per-connection deltas between keyframes instead of the full state every tick
+    delta: bool = True
+    # Encoding of server messages: "json" text frames or "msgpack" binary frames
+    protocol: str = "json"
 
 class Move(BaseModel):
     dx: int
     dy: int
 
 class ActionMessage(BaseModel):
-    type: Literal["move", "rest", "talk", "choose_class", "cast", "gather", "chat"]
+    type: Literal["move", "rest", "talk", "choose_class", "cast", "gather", "chat", "resync"]
     payload: Optional[dict] = None
+
+class TraceConfig(BaseModel):
+    # Levels: "debug", "info", "warn", "off"; omitted fields keep their current value
+    level: Optional[str] = None
+    # Per-subsystem level overrides (null removes the override)
+    subsystems: Optional[Dict[str, Optional[str]]] = None
+    # Keep one event in N per subsystem
+    sample: Optional[Dict[str, int]] = None
+    # Also print kept events to stdout
+    echo: Optional[bool] = None
+    # Per-subsystem echo, on even when echo is off (overload is on by default)
+    echo_subsystems: Optional[Dict[str, bool]] = None
+    capacity: Optional[int] = None
@@ -0,0 +1,191 @@
+"""Micro-benchmark of the database hot paths, before and after the SQLite tuning.
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.bench_db --users 5000 --lookups 20000 --saves 20000
+
+Both variants run in a temporary directory, each on its own fresh database with the same
+users and player rows:
+
+  before  a plain engine (default rollback journal, synchronous=FULL, no pragmas), the
+          login lookup as an ORM query in a new Session and the player save as an upsert
+          built per call and run through a Session: the code paths before storage.py
+  after   the tuned engine from db.py (WAL, synchronous=NORMAL, page cache, sized pool)
+          and the prepared statements in storage.py
+
+Measured per variant: login lookups per second (user by name; bcrypt is left out, see
+load_logins for the full login), player-state saves per second in transactions of 1 and
+of `--batch` rows, and lookups per second on `--readers` threads while one writer thread
+keeps saving single rows (readers against a writer is where WAL matters). `--json`
+prints the results as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+
+def player_row(user_id: int, n: int) -> dict:
+    return {
+        "user_id": user_id, "x": n % 60, "y": n % 40, "hp": 10, "hp_max": 10, "mp": 0, "mp_max": 0,
+        "clazz": None, "xp": "{}", "spells": '{"punch":{}}', "inventory": f'{{"wood":{n % 9}}}',
+        "quests": "{}", "updated_at": time.time(),
+    }
+
+
+def rate(count: int, fn: Callable[[int], None]) -> float:
+    t0 = time.perf_counter()
+    for i in range(count):
+        fn(i)
+    return round(count / (time.perf_counter() - t0), 1)
+
+
+def before_variant():
+    """The old code paths on an untuned engine."""
+    from sqlalchemy import create_engine
+    from sqlalchemy.dialects.sqlite import insert
+    from sqlalchemy.orm import sessionmaker
+    from server.app.db import Base
+    from server.app.models import User, PlayerRecord
+
+    engine = create_engine("sqlite:///./before.db", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    def lookup(username: str):
+        db = Session()
+        try:
+            u = db.query(User).filter(User.username == username).first()
+            return (u.id, u.password_hash) if u else None
+        finally:
+            db.close()
+
+    def save(rows: list):
+        stmt = insert(PlayerRecord)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PlayerRecord.user_id],
+            set_={c.name: stmt.excluded[c.name] for c in PlayerRecord.__table__.columns if c.name != "user_id"},
+        )
+        db = Session()
+        try:
+            db.execute(stmt, rows)
+            db.commit()
+        finally:
+            db.close()
+
+    return engine, lookup, save
+
+
+def after_variant():
+    from server.app.db import Base, engine
+    from server.app import storage
+
+    Base.metadata.create_all(bind=engine)
+    return engine, storage.user_by_name, storage.save_player_states
+
+
+def run_variant(name: str, users: int, lookups: int, saves: int, batch: int, readers: int, seconds: float) -> dict:
+    from server.app.models import User
+
+    engine, lookup, save = before_variant() if name == "before" else after_variant()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"username": f"user{i}", "password_hash": "x" * 60}
+                                               for i in range(users)])
+    save([player_row(uid, 0) for uid in range(1, users + 1)])
+    names = [f"user{random.randrange(users)}" for _ in range(lookups)]
+    ids = [random.randrange(1, users + 1) for _ in range(max(saves, batch))]
+
+    result = {
+        "lookupsPerSec": rate(lookups, lambda i: lookup(names[i])),
+        "savesPerSec": rate(saves // 10, lambda i: save([player_row(ids[i], i)])),
+    }
+    batches = max(1, saves // batch)
+    result[f"batch{batch}RowsPerSec"] = round(rate(batches, lambda i: save(
+        [player_row(ids[(i * batch + k) % len(ids)], i) for k in range(batch)])) * batch, 1)
+
+    # Readers against one writer
+    stop = threading.Event()
+    counts = [0] * readers
+    errors = []
+
+    def reader(slot: int):
+        while not stop.is_set():
+            try:
+                lookup(random.choice(names))
+                counts[slot] += 1
+            except Exception as ex:
+                errors.append(str(ex))
+
+    def writer():
+        i = 0
+        while not stop.is_set():
+            try:
+                save([player_row(ids[i % len(ids)], i)])
+            except Exception as ex:
+                errors.append(str(ex))
+            i += 1
+
+    threads = [threading.Thread(target=reader, args=(k,)) for k in range(readers)] + [threading.Thread(target=writer)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    result["mixedLookupsPerSec"] = round(sum(counts) / seconds, 1)
+    result["mixedErrors"] = len(errors)
+    with engine.connect() as conn:
+        result["journalMode"] = conn.exec_driver_sql("PRAGMA journal_mode").scalar()
+    engine.dispose()
+    return result
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark login lookups and player saves, before/after tuning")
+    parser.add_argument("--users", type=int, default=5000, help="Users and player rows (default: 5000)")
+    parser.add_argument("--lookups", type=int, default=20000, help="Login lookups timed (default: 20000)")
+    parser.add_argument("--saves", type=int, default=20000,
+                        help="Rows saved in batches; a tenth as many single-row saves (default: 20000)")
+    parser.add_argument("--batch", type=int, default=200, help="Rows per batched save (default: 200)")
+    parser.add_argument("--readers", type=int, default=4, help="Reader threads in the mixed case (default: 4)")
+    parser.add_argument("--seconds", type=float, default=3.0, help="Length of the mixed case (default: 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        # db.py opens ./game.db: run in the temporary directory so nothing real is touched
+        os.chdir(tmp)
+        try:
+            for name in ("before", "after"):
+                random.seed(args.seed)
+                results[name] = run_variant(name, args.users, args.lookups, args.saves, args.batch,
+                                            args.readers, args.seconds)
+        finally:
+            os.chdir(cwd)
+    report = {"python": platform.python_version(), "args": {k: v for k, v in vars(args).items() if k != "json"},
+              "results": results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    keys = list(results["before"])
+    print(f"{'':>22} {'before':>12} {'after':>12}")
+    for key in keys:
+        b, a = results["before"][key], results["after"][key]
+        ratio = f"  x{a / b:.1f}" if isinstance(b, float) and b else ""
+        print(f"{key:>22} {b:>12} {a:>12}{ratio}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
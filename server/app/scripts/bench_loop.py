@@ -0,0 +1,160 @@
+"""Live benchmark of tick cadence and event loop responsiveness, with the simulation on the
+event loop or on its own thread (GameEngine(threaded=True), see game/simthread.py).
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.bench_loop --players 50 200 --monsters 2000 --seconds 10
+
+Unlike bench_tick, the engine runs for real: GameEngine.run() at its tick rate, with the
+players on fake sockets (see bench_protocol) and scripted actions arriving through
+queue_action the way the WebSocket handler delivers them. Alongside it a probe coroutine
+sleeps `--probe-ms` at a time and records how late it wakes up: that lag is what every
+socket read and HTTP request on the same event loop waits, on top of its own work.
+
+Reported per case: tick time (p50/p99), interval between tick starts (p50/p99/max, the
+cadence), late ticks, actions per tick (fewer when a stalled loop delays them, which also
+makes those ticks cheaper), event loop lag (p50/p99/max) and frames sent and dropped
+(superseded before they went out, when encoding or sending fell behind). `--mode loop` or
+`--mode thread` runs one of the two (default: both). `--json` prints the results as JSON,
+`--out FILE` writes them to a file.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+from typing import List, Optional
+
+from server.app.scripts.bench_tick import (build_engine, percentile, script_actions, top_up_monsters,
+                                           top_up_projectiles)
+
+
+def ms(values: List[float], pct: float) -> float:
+    return round(percentile(values, pct) * 1000, 3)
+
+
+async def run_case(mode: str, players: int, monsters: int, projectiles: int, aggro: float, seconds: float,
+                   tick_hz: float, probe_ms: float, protocol: str, seed: int) -> dict:
+    random.seed(seed)
+    engine = build_engine(players, monsters, aggro, protocol)
+    engine.tick_seconds = engine.send_seconds = 1.0 / tick_hz
+    engine.threaded = mode == "thread"
+    pids = list(engine.state.players)
+
+    starts: List[float] = []
+    durations: List[float] = []
+    actions: List[int] = []
+    step = engine.step
+
+    def timed_step():
+        t0 = time.perf_counter()
+        starts.append(t0)
+        step()
+        durations.append(time.perf_counter() - t0)
+        actions.append(engine.metrics.gauges.get("actions_queued", 0))
+        # Keep the load steady (this runs on whichever thread ticks)
+        top_up_monsters(engine, monsters, aggro)
+        top_up_projectiles(engine, projectiles)
+
+    engine.step = timed_step
+    lags: List[float] = []
+    stop = asyncio.Event()
+
+    async def probe():
+        interval = probe_ms / 1000.0
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - t0 - interval))
+
+    async def clients():
+        # Actions trickle in between ticks, as from real sockets
+        while not stop.is_set():
+            script_actions(engine, pids)
+            await asyncio.sleep(engine.tick_seconds / 2)
+
+    task = asyncio.create_task(engine.run())
+    helpers = [asyncio.create_task(probe()), asyncio.create_task(clients())]
+    await asyncio.sleep(seconds)
+    stop.set()
+    task.cancel()
+    await asyncio.gather(task, *helpers, return_exceptions=True)
+
+    intervals = [b - a for a, b in zip(starts, starts[1:])]
+    stats = engine.connection_stats()
+    return {
+        "mode": mode,
+        "players": players,
+        "monsters": monsters,
+        "projectiles": projectiles,
+        "tickHz": tick_hz,
+        "ticks": len(starts),
+        "tickMs": {"p50": ms(durations, 50), "p99": ms(durations, 99)},
+        "intervalMs": {"p50": ms(intervals, 50), "p99": ms(intervals, 99),
+                       "max": round(max(intervals, default=0.0) * 1000, 3)},
+        "lateTicks": engine.metrics.late_ticks,
+        # Scripted actions that made it into a tick: a stalled loop delivers fewer
+        "actionsPerTick": round(sum(actions) / len(actions), 1) if actions else 0.0,
+        "loopLagMs": {"p50": ms(lags, 50), "p99": ms(lags, 99), "max": round(max(lags, default=0.0) * 1000, 3)},
+        "bytesSent": sum(s["bytesSent"] for s in stats),
+        # Frames superseded before they were sent (encoding or the socket fell behind)
+        "framesSent": sum(s["framesSent"] for s in stats),
+        "framesDropped": sum(s["framesDropped"] for s in stats),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tick cadence and event loop lag, simulation on the loop vs a thread")
+    parser.add_argument("--players", type=int, nargs="+", default=[50, 200])
+    parser.add_argument("--monsters", type=int, default=1000, help="Monsters kept alive (default: 1000)")
+    parser.add_argument("--aggro", type=float, default=0.3, help="Share of spawned monsters that chase (default: 0.3)")
+    parser.add_argument("--projectiles", type=int, default=20, help="Projectiles kept in flight (default: 20)")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Run time per case (default: 10)")
+    parser.add_argument("--tick-hz", type=float, default=4.0, help="Ticks per second (default: 4)")
+    parser.add_argument("--probe-ms", type=float, default=10.0, help="Event loop probe interval (default: 10)")
+    parser.add_argument("--mode", choices=["loop", "thread", "both"], default="both")
+    parser.add_argument("--protocol", default="json", help="Wire protocol of the fake clients (default: json)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--out", help="Also write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    modes = ["loop", "thread"] if args.mode == "both" else [args.mode]
+    results = []
+    for players in args.players:
+        for mode in modes:
+            results.append(asyncio.run(run_case(mode, players, args.monsters, args.projectiles, args.aggro,
+                                                args.seconds, args.tick_hz, args.probe_ms, args.protocol,
+                                                args.seed)))
+    report = {
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "out")},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    header = (f"{'mode':>6} {'players':>7} {'monsters':>8} {'ticks':>5} {'tick p50':>8} {'tick p99':>8} "
+              f"{'ivl p50':>8} {'ivl p99':>8} {'ivl max':>8} {'late':>5} {'actions':>7} "
+              f"{'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'sent':>6} {'dropped':>7}")
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(f"{r['mode']:>6} {r['players']:>7} {r['monsters']:>8} {r['ticks']:>5} "
+              f"{r['tickMs']['p50']:>8} {r['tickMs']['p99']:>8} {r['intervalMs']['p50']:>8} "
+              f"{r['intervalMs']['p99']:>8} {r['intervalMs']['max']:>8} {r['lateTicks']:>5} "
+              f"{r['actionsPerTick']:>7} "
+              f"{r['loopLagMs']['p50']:>8} {r['loopLagMs']['p99']:>8} {r['loopLagMs']['max']:>8} "
+              f"{r['framesSent']:>6} {r['framesDropped']:>7}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
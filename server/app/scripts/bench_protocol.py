@@ -0,0 +1,115 @@
+"""Compare the JSON and MessagePack wire protocols on simulated players.
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.bench_protocol --players 10 100 500 --ticks 40
+
+For every player count and protocol a fresh engine is filled with that many players
+scattered over the map, each on a fake socket that discards what it is sent. The
+players move randomly while the engine ticks. The report takes the per-connection
+counters and shows bytes sent per tick (all connections, keyframes and deltas
+included) and the time spent encoding them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+from typing import Optional
+
+from server.app.game.codec import CODECS
+from server.app.game.engine import GameEngine
+from server.app.game.state import WORLD_W, WORLD_H
+from server.app.schemas import ActionMessage
+
+
+class FakeSocket:
+    """Stands in for a WebSocket; accepts both frame types and drops the data."""
+
+    async def send_text(self, data: str) -> None:
+        pass
+
+    async def send_bytes(self, data: bytes) -> None:
+        pass
+
+
+def build_engine(players: int, protocol: str, seed: int) -> GameEngine:
+    random.seed(seed)
+    engine = GameEngine(debug=False, rng=random.Random(random.randrange(1 << 30)))
+    state = engine.state
+    state.ensure_map()
+    state.ensure_initial_npcs()
+    state.ensure_initial_monsters()
+    for uid in range(1, players + 1):
+        pid = engine.connect_player(user_id=uid, ws=FakeSocket(), protocol=protocol)
+        # Scatter players instead of stacking them around spawn
+        for _ in range(50):
+            x, y = random.randrange(WORLD_W), random.randrange(WORLD_H)
+            if state.is_free(x, y):
+                state.place_player(state.players[pid], x, y)
+                break
+    return engine
+
+
+async def run_case(players: int, protocol: str, ticks: int, seed: int) -> dict:
+    engine = build_engine(players, protocol, seed)
+    pids = list(engine.state.players)
+    dirs = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+    async def drain():
+        # Let every sender task flush its queue
+        while any(c["queueDepth"] for c in engine.connection_stats()):
+            await asyncio.sleep(0)
+
+    # Warm-up tick: first keyframe and map message for every connection
+    await engine._tick()
+    await drain()
+    base = engine.connection_stats()
+    for _ in range(ticks):
+        for pid in pids:
+            if random.random() < 0.5:
+                dx, dy = random.choice(dirs)
+                engine.queue_action(pid, ActionMessage(type="move", payload={"dx": dx, "dy": dy}))
+        await engine._tick()
+        await drain()
+    stats = engine.connection_stats()
+    sent = sum(s["bytesSent"] for s in stats) - sum(s["bytesSent"] for s in base)
+    encode = sum(s["encodeSeconds"] for s in stats) - sum(s["encodeSeconds"] for s in base)
+    return {
+        "players": players,
+        "protocol": protocol,
+        "ticks": ticks,
+        "bytesPerTick": round(sent / ticks),
+        "bytesPerPlayerTick": round(sent / ticks / max(1, players), 1),
+        "encodeMsPerTick": round(encode / ticks * 1000, 3),
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark JSON vs MessagePack state messages")
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--ticks", type=int, default=40, help="Measured ticks per case (default: 40)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for n in args.players:
+        for protocol in CODECS:
+            results.append(asyncio.run(run_case(n, protocol, args.ticks, args.seed)))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    if "msgpack" not in CODECS:
+        print("msgpack is not installed; only JSON was measured")
+    print(f"{'players':>8} {'protocol':>9} {'bytes/tick':>12} {'bytes/player':>13} {'encode ms/tick':>15}")
+    for r in results:
+        print(f"{r['players']:>8} {r['protocol']:>9} {r['bytesPerTick']:>12} "
+              f"{r['bytesPerPlayerTick']:>13} {r['encodeMsPerTick']:>15}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
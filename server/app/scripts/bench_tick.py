@@ -0,0 +1,242 @@
+"""Headless benchmark of GameEngine._tick.
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.bench_tick --players 10 100 500 --monsters 200 --projectiles 50
+
+For every player count a fresh engine is filled with that many players on fake sockets
+(they count bytes and discard the data), topped up to the requested number of monsters
+(a share of them aggro) and live projectiles, and driven tick by tick with scripted
+move/gather/chat actions fed through queue_action. No event loop timer or real socket
+is involved; each tick runs as fast as possible. `--world 4096x4096` runs on a chunked,
+lazily generated world instead of the classic map, with players scattered over
+`--spread` tiles around the spawn point. `--send-every N` publishes a frame every N ticks
+(the engine's send_seconds) and `--idle` is the share of players who never act, so
+they drop to a reduced send rate after `--idle-seconds` of simulated time.
+
+Reported per case: ticks/sec, p50/p99/max tick time (tick plus draining every sender),
+mean time per tick phase as recorded by the engine's own TickMetrics (the same numbers
+/metrics serves), encode time on the sender tasks and bytes sent per tick. `--json`
+prints the results as JSON, `--out FILE` writes them to a file, for comparing runs.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import time
+from typing import Dict, List, Optional
+
+from server.app.game.engine import GameEngine
+from server.app.game.chunks import ChunkWorld
+from server.app.schemas import ActionMessage
+from server.app.scripts.bench_protocol import FakeSocket
+
+PHASES = ("chunks", "actions", "spells", "monsters", "projectiles", "upkeep", "snapshot", "build_frame", "publish", "encode")
+DIRS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def random_tile(state):
+    """Random tile of the classic map, or of an already generated chunk."""
+    if state.chunks is None:
+        return random.randrange(state.world_w), random.randrange(state.world_h)
+    chunk = random.choice(list(state.chunks.chunks.values()))
+    return chunk.x0 + random.randrange(chunk.tilemap.w), chunk.y0 + random.randrange(chunk.tilemap.h)
+
+
+def build_engine(players: int, monsters: int, aggro: float, protocol: str,
+                 activation_radius: Optional[int] = 24, world: Optional[tuple] = None,
+                 spread: int = 256, send_every: int = 1, idle_seconds: float = 10.0) -> GameEngine:
+    chunks = ChunkWorld(world[0], world[1], seed=random.randrange(1 << 30)) if world else None
+    engine = GameEngine(debug=False, activation_radius=activation_radius, world=chunks,
+                        rng=random.Random(random.randrange(1 << 30)), send_seconds=0.25 * send_every,
+                        idle_seconds=idle_seconds)
+    state = engine.state
+    state.ensure_map()
+    state.ensure_initial_npcs()
+    state.ensure_initial_monsters()
+    sx, sy = state.spawn_point
+    for uid in range(1, players + 1):
+        pid = engine.connect_player(user_id=uid, ws=FakeSocket(), protocol=protocol)
+        for _ in range(50):
+            if chunks is not None:
+                x = min(state.world_w - 1, max(0, sx + random.randint(-spread, spread)))
+                y = min(state.world_h - 1, max(0, sy + random.randint(-spread, spread)))
+                state.ensure_chunks_near(x, y, engine.chunk_radius)
+            else:
+                x, y = random_tile(state)
+            if state.is_free(x, y):
+                state.place_player(state.players[pid], x, y)
+                break
+    top_up_monsters(engine, monsters, aggro)
+    return engine
+
+
+def top_up_monsters(engine: GameEngine, target: int, aggro: float):
+    state = engine.state
+    for _ in range(max(0, target - len(state.monsters)) * 4):
+        if len(state.monsters) >= target:
+            break
+        x, y = random_tile(state)
+        if not state.is_free(x, y):
+            continue
+        mid = state.spawn_slime(x, y)
+        state.monsters[mid].aggro = random.random() < aggro
+
+
+def top_up_projectiles(engine: GameEngine, target: int):
+    state = engine.state
+    pids = list(state.players)
+    if not pids:
+        return
+    while len(state.projectiles) < target:
+        dx, dy = random.choice(DIRS)
+        x, y = random_tile(state)
+        state.spawn_projectile(random.choice(pids), x, y, dx, dy, speed=2, ttl=12, dmg=1)
+
+
+def script_actions(engine: GameEngine, pids: List[int]):
+    for pid in pids:
+        r = random.random()
+        if r < 0.6:
+            dx, dy = random.choice(DIRS)
+            engine.queue_action(pid, ActionMessage(type="move", payload={"dx": dx, "dy": dy}))
+        elif r < 0.7:
+            engine.queue_action(pid, ActionMessage(type="gather"))
+        elif r < 0.72:
+            engine.queue_action(pid, ActionMessage(type="chat", payload={"text": "hello"}))
+
+
+async def run_case(players: int, monsters: int, projectiles: int, aggro: float, ticks: int, warmup: int,
+                   protocol: str, seed: int, activation_radius: Optional[int] = 24,
+                   world: Optional[tuple] = None, spread: int = 256, send_every: int = 1,
+                   idle: float = 0.0, idle_seconds: float = 10.0) -> dict:
+    random.seed(seed)
+    engine = build_engine(players, monsters, aggro, protocol, activation_radius, world, spread,
+                          send_every, idle_seconds)
+    # The first `idle` share of the players never act
+    pids = list(engine.state.players)[int(round(players * idle)):]
+    totals: Dict[str, float] = {name: 0.0 for name in PHASES}
+
+    async def drain():
+        while any(c["queueDepth"] for c in engine.connection_stats()):
+            await asyncio.sleep(0)
+
+    def counters():
+        stats = engine.connection_stats()
+        return sum(s["bytesSent"] for s in stats), sum(s["encodeSeconds"] for s in stats)
+
+    tick_times: List[float] = []
+    for i in range(warmup + ticks):
+        if i == warmup:
+            bytes0, encode0 = counters()
+            started = time.perf_counter()
+        top_up_monsters(engine, monsters, aggro)
+        top_up_projectiles(engine, projectiles)
+        script_actions(engine, pids)
+        t0 = time.perf_counter()
+        await engine._tick()
+        await drain()
+        if i >= warmup:
+            tick_times.append(time.perf_counter() - t0)
+            for name, seconds in engine.metrics.last_phase_seconds().items():
+                if name in totals:
+                    totals[name] += seconds
+    elapsed = time.perf_counter() - started
+    bytes1, encode1 = counters()
+    totals["encode"] = encode1 - encode0
+    return {
+        "players": players,
+        "monsters": monsters,
+        "projectiles": projectiles,
+        "protocol": protocol,
+        "sendEvery": send_every,
+        "idle": idle,
+        "ticks": ticks,
+        "ticksPerSec": round(ticks / elapsed, 2),
+        "tickMs": {
+            "mean": round(sum(tick_times) / len(tick_times) * 1000, 3),
+            "p50": round(percentile(tick_times, 50) * 1000, 3),
+            "p99": round(percentile(tick_times, 99) * 1000, 3),
+            "max": round(max(tick_times) * 1000, 3),
+        },
+        "phaseMs": {name: round(total / ticks * 1000, 3) for name, total in totals.items()},
+        "overruns": engine.metrics.overruns,
+        "framesHeld": engine.metrics.frames_held,
+        "bytesPerTick": round((bytes1 - bytes0) / ticks),
+        "entities": {
+            "monsters": len(engine.state.monsters),
+            "monstersDormant": engine.metrics.gauges.get("monsters_dormant", 0),
+            "projectiles": len(engine.state.projectiles),
+            "chunks": len(engine.state.chunks.chunks) if engine.state.chunks is not None else None,
+        },
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark GameEngine ticks without sockets")
+    parser.add_argument("--players", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--monsters", type=int, default=100, help="Monsters kept alive (default: 100)")
+    parser.add_argument("--aggro", type=float, default=0.3, help="Share of spawned monsters that chase (default: 0.3)")
+    parser.add_argument("--projectiles", type=int, default=20, help="Projectiles kept in flight (default: 20)")
+    parser.add_argument("--ticks", type=int, default=100, help="Measured ticks per case (default: 100)")
+    parser.add_argument("--warmup", type=int, default=5, help="Unmeasured ticks first (default: 5)")
+    parser.add_argument("--protocol", default="json", help="Wire protocol of the fake clients (default: json)")
+    parser.add_argument("--activation-radius", type=int, default=24,
+                        help="Monster activation radius in tiles; -1 runs every monster every tick (default: 24)")
+    parser.add_argument("--world", help="Chunked world size WxH (e.g. 4096x4096); default is the classic map")
+    parser.add_argument("--spread", type=int, default=256,
+                        help="Chunked worlds: players start within this many tiles of spawn (default: 256)")
+    parser.add_argument("--send-every", type=int, default=1, help="Publish a frame every N ticks (default: 1)")
+    parser.add_argument("--idle", type=float, default=0.0, help="Share of players who never act (default: 0)")
+    parser.add_argument("--idle-seconds", type=float, default=1.0,
+                        help="Simulated seconds without an action before a player counts as idle (default: 1)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--out", help="Also write the JSON results to this file")
+    args = parser.parse_args(argv)
+    world = None
+    if args.world:
+        w, _, h = args.world.lower().partition("x")
+        world = (int(w), int(h or w))
+
+    results = [
+        asyncio.run(run_case(n, args.monsters, args.projectiles, args.aggro, args.ticks, args.warmup,
+                             args.protocol, args.seed,
+                             None if args.activation_radius < 0 else args.activation_radius,
+                             world, args.spread, args.send_every, args.idle, args.idle_seconds))
+        for n in args.players
+    ]
+    report = {
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "out")},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{'players':>8} {'ticks/s':>8} {'p50 ms':>8} {'p99 ms':>8} " +
+          " ".join(f"{name[:11]:>11}" for name in PHASES) + f" {'bytes/tick':>11}")
+    for r in results:
+        print(f"{r['players']:>8} {r['ticksPerSec']:>8} {r['tickMs']['p50']:>8} {r['tickMs']['p99']:>8} " +
+              " ".join(f"{r['phaseMs'][name]:>11}" for name in PHASES) + f" {r['bytesPerTick']:>11}")
+    print("phase columns: mean ms per tick; snapshot is part of build_frame, encode runs on the sender tasks")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
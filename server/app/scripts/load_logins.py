@@ -0,0 +1,180 @@
+"""Login storm against the auth endpoints while the game loop ticks.
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.load_logins --logins 300 --players 50
+
+The script works in a temporary directory, so the SQLite database it fills with test
+users is thrown away afterwards. It creates `--logins` users (one bcrypt hash shared by
+all, so setup is quick), starts a GameEngine with `--players` players on fake sockets
+running its real tick loop, and serves the auth router through httpx's in-process ASGI
+transport on the same event loop. It first measures ticks while idle, then fires every
+login at once (each one a DB lookup on the DB pool and a bcrypt verify on the hash pool,
+see workers.py) and measures ticks until the last login is answered.
+
+Reported per phase: tick start lag (how late each tick started against the 0.25 s
+cadence, the symptom of a blocked loop) and tick duration, p50/p99/max; and for the
+storm, login latency, logins per second and the status codes returned. `--json`
+prints the results as JSON.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+from typing import List, Optional
+
+PASSWORD = "load-test-password"
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[k]
+
+
+def summary_ms(values: List[float]) -> dict:
+    return {
+        "p50": round(percentile(values, 50) * 1000, 3),
+        "p99": round(percentile(values, 99) * 1000, 3),
+        "max": round(max(values, default=0.0) * 1000, 3),
+    }
+
+
+class TickProbe:
+    """Wraps engine._tick to record when each tick started (against its schedule) and how long it took."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.starts: List[float] = []
+        self.durations: List[float] = []
+        self._tick = engine._tick
+        engine._tick = self._probe
+
+    async def _probe(self):
+        t0 = time.perf_counter()
+        self.starts.append(t0)
+        await self._tick()
+        self.durations.append(time.perf_counter() - t0)
+
+    def mark(self) -> int:
+        return len(self.starts)
+
+    def report(self, since: int) -> dict:
+        step = self.engine.tick_seconds
+        starts = self.starts[since:]
+        lags = [max(0.0, (b - a) - step) for a, b in zip(starts, starts[1:])]
+        return {
+            "ticks": len(starts),
+            "startLagMs": summary_ms(lags),
+            "tickMs": summary_ms(self.durations[since:]),
+        }
+
+
+async def run(logins: int, players: int, idle: float, seed: int) -> dict:
+    # Imported here: the database lives in the working directory chosen by main()
+    import httpx
+    from fastapi import FastAPI
+    from server.app.auth import router, get_password_hash
+    from server.app.db import SessionLocal
+    from server.app.game.engine import GameEngine
+    from server.app.models import User
+    from server.app.scripts.bench_protocol import FakeSocket
+    from server.app.workers import pool_stats
+
+    random.seed(seed)
+    password_hash = get_password_hash(PASSWORD)
+    db = SessionLocal()
+    try:
+        db.add_all([User(username=f"load{i}", password_hash=password_hash) for i in range(logins)])
+        db.commit()
+    finally:
+        db.close()
+
+    engine = GameEngine(debug=False, rng=random.Random(random.randrange(1 << 30)))
+    engine.state.ensure_map()
+    engine.state.ensure_initial_npcs()
+    engine.state.ensure_initial_monsters()
+    for uid in range(1, players + 1):
+        engine.connect_player(user_id=uid, ws=FakeSocket())
+    probe = TickProbe(engine)
+    loop_task = asyncio.create_task(engine.run())
+
+    app = FastAPI()
+    app.include_router(router, prefix="/auth")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://load", timeout=None) as client:
+        await asyncio.sleep(idle)
+        idle_report = probe.report(0)
+
+        async def login(i: int):
+            t0 = time.perf_counter()
+            r = await client.post("/auth/login", json={"username": f"load{i}", "password": PASSWORD})
+            return r.status_code, time.perf_counter() - t0
+
+        mark = probe.mark()
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(login(i) for i in range(logins)))
+        elapsed = time.perf_counter() - t0
+        # One more tick so the last storm interval is measured
+        await asyncio.sleep(engine.tick_seconds)
+        storm_report = probe.report(mark)
+    loop_task.cancel()
+
+    statuses: dict = {}
+    for code, _ in results:
+        statuses[str(code)] = statuses.get(str(code), 0) + 1
+    storm_report.update({
+        "logins": logins,
+        "seconds": round(elapsed, 3),
+        "loginsPerSec": round(logins / elapsed, 2),
+        "loginMs": summary_ms([s for _, s in results]),
+        "status": statuses,
+        "pools": pool_stats(),
+    })
+    return {"idle": idle_report, "storm": storm_report}
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Tick latency during a login storm")
+    parser.add_argument("--logins", type=int, default=300, help="Concurrent logins (default: 300)")
+    parser.add_argument("--players", type=int, default=50, help="Players in the world (default: 50)")
+    parser.add_argument("--idle", type=float, default=3.0, help="Seconds of idle ticks measured first (default: 3)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args(argv)
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        try:
+            results = asyncio.run(run(args.logins, args.players, args.idle, args.seed))
+        finally:
+            os.chdir(cwd)
+    report = {"python": platform.python_version(), "cpus": os.cpu_count(),
+              "args": {k: v for k, v in vars(args).items() if k != "json"}, **results}
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{'phase':>6} {'ticks':>6} {'lag p50':>8} {'lag p99':>8} {'lag max':>8} {'tick p50':>9} {'tick p99':>9}")
+    for name in ("idle", "storm"):
+        r = report[name]
+        print(f"{name:>6} {r['ticks']:>6} {r['startLagMs']['p50']:>8} {r['startLagMs']['p99']:>8} "
+              f"{r['startLagMs']['max']:>8} {r['tickMs']['p50']:>9} {r['tickMs']['p99']:>9}")
+    s = report["storm"]
+    print(f"{s['logins']} logins in {s['seconds']} s ({s['loginsPerSec']}/s), login ms p50 {s['loginMs']['p50']} "
+          f"p99 {s['loginMs']['p99']}, status {s['status']}")
+    print("lag: how late each tick started against the tick cadence (ms); tick: tick duration (ms)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,184 @@
+"""Headless replay of a recorded session (or of a checkpoint directory) at full speed.
+
+Run as a module from the repository root:
+
+  python -m server.app.scripts.replay_session recordings/session-20261017-093000 --connections
+
+A recording is what the server writes with RECORD_DIR set (see main.py): one checkpoint
+of the world when the run started, then the journal of every tick (clock reading, action
+batch, players who joined) with a world digest every few ticks. The replay rebuilds the
+engine from the checkpoint (same seed, world size and simulation settings), restores the
+engine RNG and feeds the recorded ticks to GameEngine._tick as fast as it can. Since the
+simulation only depends on those inputs, every digest must match: a mismatch means the
+simulation changed behaviour, and the run exits with status 1. A plain CHECKPOINT_DIR
+works too, replayed from its oldest checkpoint.
+
+`--connections` attaches a fake socket (see bench_protocol) to every player, so frame
+building, encoding and sending are exercised as well; without it only the simulation
+runs. Reported: ticks/sec, p50/p99/max tick time, mean time per tick phase from the
+engine's TickMetrics and the slowest ticks by tick index, to profile a slow tick offline
+(`--profile FILE` writes cProfile stats of the whole replay). `--json` prints the results
+as JSON, `--out FILE` writes them to a file, so replays can serve as a regression corpus.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import cProfile
+import json
+import platform
+import sys
+import time
+from typing import Dict, List, Optional
+
+from server.app.game.checkpoint import (Checkpointer, add_joined_player, read_checkpoint, read_journal,
+                                        replay_journal, restore_state, state_digest)
+from server.app.game.chunks import ChunkWorld
+from server.app.game.engine import GameEngine
+from server.app.scripts.bench_protocol import FakeSocket
+from server.app.scripts.bench_tick import PHASES, percentile
+
+
+def build_engine(data: dict) -> GameEngine:
+    """Engine with the recorded world and settings, restored to the checkpoint."""
+    seed, w, h, chunk_size, _ = data["world"]
+    world = ChunkWorld(w, h, seed=seed, size=chunk_size) if chunk_size else None
+    engine = GameEngine(debug=False, world=world, seed=seed, **data["engine"])
+    if not restore_state(engine, data):
+        raise SystemExit("the recording does not match this world (map generation changed?)")
+    return engine
+
+
+async def replay(directory: str, connections: bool, protocol: str, limit: Optional[int]) -> dict:
+    session = Checkpointer(directory).session()
+    start = next((i for i, (_, ckpt, _) in enumerate(session) if ckpt and read_checkpoint(ckpt)), None)
+    if start is None:
+        raise SystemExit(f"no readable checkpoint in {directory}")
+    engine = build_engine(read_checkpoint(session[start][1]))
+    state = engine.state
+
+    def connect_new():
+        for p in list(state.players.values()):
+            if p.id not in engine._connections:
+                engine.connect_player(p.user_id, FakeSocket(), protocol=protocol)
+
+    def entries(path: str):
+        for n, entry in enumerate(read_journal(path)):
+            if limit is not None and len(tick_times) + n >= limit:
+                return
+            if connections:
+                # Join ahead of replay_journal (which then skips them) so they get a socket
+                for record in entry[2]:
+                    add_joined_player(state, record)
+                connect_new()
+            yield entry
+
+    async def drain():
+        while any(c.queue_depth for c in engine._connections.values()):
+            await asyncio.sleep(0)
+
+    if connections:
+        connect_new()
+    tick_times: List[float] = []
+    tick_indexes: List[int] = []
+    totals: Dict[str, float] = {name: 0.0 for name in PHASES}
+    checked = mismatches = 0
+    first_mismatch = None
+
+    async def after_tick():
+        tick_indexes.append(engine.tick_index)
+        for name, seconds in engine.metrics.last_phase_seconds().items():
+            if name in totals:
+                totals[name] += seconds
+        if connections:
+            await drain()
+
+    started = time.perf_counter()
+    for i, (seq, ckpt, journal) in enumerate(session[start:]):
+        if i and ckpt:
+            # The world was replaced outside the tick (admin wipe): continue from there
+            data = read_checkpoint(ckpt)
+            if data is not None and data.get("reset"):
+                restore_state(engine, data)
+        if journal is None or (limit is not None and len(tick_times) >= limit):
+            continue
+        result = await replay_journal(engine, entries(journal), tick_times, after_tick)
+        mismatches += result["digestMismatches"]
+        if first_mismatch is None:
+            first_mismatch = result["firstMismatch"]
+    elapsed = time.perf_counter() - started
+    for path in (j for _, _, j in session[start:] if j):
+        checked += sum(1 for e in read_journal(path) if e[4] is not None)
+    ticks = len(tick_times)
+    slowest = sorted(zip(tick_times, tick_indexes), reverse=True)[:5]
+    stats = engine.connection_stats()
+    return {
+        "directory": directory,
+        "ticks": ticks,
+        "fromTick": tick_indexes[0] if tick_indexes else None,
+        "toTick": engine.tick_index,
+        "ticksPerSec": round(ticks / elapsed, 2) if elapsed else None,
+        "tickMs": {
+            "mean": round(sum(tick_times) / ticks * 1000, 3) if ticks else 0.0,
+            "p50": round(percentile(tick_times, 50) * 1000, 3),
+            "p99": round(percentile(tick_times, 99) * 1000, 3),
+            "max": round(max(tick_times, default=0.0) * 1000, 3),
+        },
+        "phaseMs": {name: round(total / ticks * 1000, 3) if ticks else 0.0 for name, total in totals.items()},
+        "slowestTicks": [{"tick": t, "ms": round(s * 1000, 3)} for s, t in slowest],
+        "bytesSent": sum(s["bytesSent"] for s in stats),
+        # Digests journaled in the replayed range (all of them unless --limit cut it short)
+        "digests": {"journaled": checked, "mismatches": mismatches, "firstMismatch": first_mismatch},
+        "finalDigest": state_digest(engine),
+        "entities": {"players": len(state.players), "monsters": len(state.monsters),
+                     "projectiles": len(state.projectiles)},
+    }
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Replay a recorded session headlessly at full speed")
+    parser.add_argument("directory", help="Session recording (RECORD_DIR/session-*) or checkpoint directory")
+    parser.add_argument("--connections", action="store_true",
+                        help="Attach a fake socket to every player (frames are built and encoded)")
+    parser.add_argument("--protocol", default="json", help="Wire protocol of the fake sockets (default: json)")
+    parser.add_argument("--limit", type=int, help="Replay at most this many ticks")
+    parser.add_argument("--profile", help="Write cProfile stats of the replay to this file")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    parser.add_argument("--out", help="Also write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    result = asyncio.run(replay(args.directory, args.connections, args.protocol, args.limit))
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+    report = {
+        "python": platform.python_version(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("json", "out")},
+        "result": result,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    failed = bool(result["digests"]["mismatches"])
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 1 if failed else 0
+
+    r = result
+    print(f"{r['ticks']} ticks ({r['fromTick']}..{r['toTick']}) at {r['ticksPerSec']} ticks/s; "
+          f"tick ms p50 {r['tickMs']['p50']} p99 {r['tickMs']['p99']} max {r['tickMs']['max']}")
+    print("phase ms: " + " ".join(f"{name} {ms}" for name, ms in r["phaseMs"].items()))
+    print("slowest: " + ", ".join(f"tick {s['tick']} {s['ms']} ms" for s in r["slowestTicks"]))
+    d = r["digests"]
+    print(f"digests: {d['journaled']} journaled, {d['mismatches']} mismatched"
+          + (f" (first at tick {d['firstMismatch']})" if d["mismatches"] else "") + f"; final {r['finalDigest']}")
+    if failed:
+        print("replay diverged from the recording", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
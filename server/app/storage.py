@@ -0,0 +1,52 @@
+from __future__ import annotations
+from typing import Iterable, Optional
+from sqlalchemy import bindparam, select
+from sqlalchemy.dialects.sqlite import insert
+from .db import engine
+from .models import User, PlayerRecord
+
+# Hot queries as Core statements built once at import.
+# An ORM query per request pays for Query construction, entity loading and a Session on
+# every call; these statements run on a pooled connection, hit SQLAlchemy's compiled cache
+# (same statement object, values only in bind parameters) and sqlite3's per-connection
+# prepared-statement cache. All of them block: call them from the worker pools in
+# workers.py or from the persistence thread, never from the event loop.
+
+_USER_BY_NAME = select(User.id, User.password_hash).where(User.username == bindparam("username"))
+_USER_BY_ID = select(User.id, User.username).where(User.id == bindparam("user_id"))
+
+_PLAYER_COLUMNS = [c for c in PlayerRecord.__table__.columns if c.name != "updated_at"]
+_PLAYER_BY_ID = select(*_PLAYER_COLUMNS).where(PlayerRecord.user_id == bindparam("user_id"))
+
+_upsert = insert(PlayerRecord)
+_UPSERT_PLAYER = _upsert.on_conflict_do_update(
+    index_elements=[PlayerRecord.user_id],
+    set_={c.name: _upsert.excluded[c.name] for c in PlayerRecord.__table__.columns if c.name != "user_id"},
+)
+
+
+def user_by_name(username: str) -> Optional[tuple]:
+    """(id, password_hash) of this user, or None."""
+    with engine.connect() as conn:
+        return conn.execute(_USER_BY_NAME, {"username": username}).first()
+
+
+def user_by_id(user_id: int) -> Optional[tuple]:
+    """(id, username) of this user, or None."""
+    with engine.connect() as conn:
+        return conn.execute(_USER_BY_ID, {"user_id": user_id}).first()
+
+
+def player_state(user_id: int) -> Optional[dict]:
+    """Saved PlayerRecord row of this user as a dict (without updated_at), or None."""
+    with engine.connect() as conn:
+        row = conn.execute(_PLAYER_BY_ID, {"user_id": user_id}).first()
+    return dict(row._mapping) if row is not None else None
+
+
+def save_player_states(rows: Iterable[dict]):
+    """Upsert PlayerRecord rows (each with updated_at) in one transaction."""
+    rows = list(rows)
+    if rows:
+        with engine.begin() as conn:
+            conn.execute(_UPSERT_PLAYER, rows)
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+from fastapi import HTTPException
+
+# Bounded thread pools for blocking work requested from the event loop.
+# The game tick shares the loop with every HTTP and websocket handler, so SQLAlchemy calls
+# and bcrypt hashing must never run on it. Each pool has a fixed number of threads and a
+# cap on calls in flight (running plus waiting for a thread); a call beyond the cap fails at
+# once with 503 instead of piling up, so a login storm costs queued requests, not ticks.
+
+
+class WorkerPool:
+    """`max_workers` threads; at most `max_pending` calls admitted at a time."""
+
+    def __init__(self, name: str, max_workers: int, max_pending: int):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(self.max_workers, int(max_pending))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        # Only touched from the event loop
+        self.in_flight = 0
+        self.completed = 0
+        self.rejected = 0
+        # Added to by the pool threads, under _busy_lock
+        self.busy_seconds = 0.0
+        self._busy_lock = threading.Lock()
+
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on a pool thread and return its result (or raise its exception)."""
+        if self.in_flight >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail=f"Server busy ({self.name})")
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self._timed, fn, args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+
+    def _timed(self, fn: Callable, args: tuple):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - t0
+            with self._busy_lock:
+                self.busy_seconds += elapsed
+
+    def shutdown(self, wait: bool = True):
+        self._executor.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "maxPending": self.max_pending,
+            "inFlight": self.in_flight,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "busySeconds": round(self.busy_seconds, 3),
+        }
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+# SQLite takes one writer at a time, so a few threads are enough; bcrypt is CPU-bound and
+# releases the GIL, so one thread per core (capped) hashes in parallel without starving the loop
+db_pool = WorkerPool("db", _env_int("DB_WORKERS", 4), _env_int("DB_MAX_PENDING", 1024))
+hash_pool = WorkerPool("hash", _env_int("HASH_WORKERS", min(4, os.cpu_count() or 1)),
+                       _env_int("HASH_MAX_PENDING", 512))
+
+
+def pool_stats() -> dict:
+    return {pool.name: pool.stats() for pool in (db_pool, hash_pool)}
+
+
+def shutdown_pools(wait: bool = True):
+    for pool in (db_pool, hash_pool):
+        pool.shutdown(wait=wait)
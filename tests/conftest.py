@@ -0,0 +1,7 @@
+"""Point the app at a throwaway SQLite file before anything imports server.app.db, so the
+tests never touch the repository's game.db."""
+import os
+import tempfile
+
+os.environ.setdefault("DATABASE_URL",
+                      "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="tests-"), "game.db"))
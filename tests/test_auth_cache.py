@@ -0,0 +1,90 @@
+"""Token and user caches (auth.py): repeated lookups skip the JWT check and the database,
+invalidate_user() drops the user and every token of it (and nobody else's), and a lookup
+that was in flight during an invalidation is not cached."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from server.app import auth
+
+
+class FakeUsers:
+    """Stands in for the users table and the DB pool; counts lookups."""
+
+    def __init__(self, **names):
+        self.names = {int(uid[1:]): name for uid, name in names.items()}
+        self.lookups = 0
+        self.during_lookup = None
+
+    def user_by_id(self, user_id: int):
+        self.lookups += 1
+        if self.during_lookup is not None:
+            self.during_lookup()
+        name = self.names.get(user_id)
+        return SimpleNamespace(id=user_id, username=name) if name is not None else None
+
+    async def run(self, fn, *args):
+        return fn(*args)
+
+
+@pytest.fixture
+def users(monkeypatch):
+    fake = FakeUsers(u1="alice", u2="bob")
+    monkeypatch.setattr(auth, "db_pool", fake)
+    monkeypatch.setattr(auth, "user_by_id", fake.user_by_id)
+    monkeypatch.setattr(auth, "_admins", {"admin"})
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+    yield fake
+    auth._token_cache.clear()
+    auth._user_cache.clear()
+
+
+def test_tokens_are_cached_until_their_user_is_invalidated(users, monkeypatch):
+    tokens = [auth.create_access_token({"sub": "1"}), auth.create_access_token({"sub": "1", "n": 2}),
+              auth.create_access_token({"sub": "2"})]
+    assert [auth._decode_token(t) for t in tokens] == [1, 1, 2]
+    # Served from the cache: no signature check
+    monkeypatch.setattr(auth.jwt, "decode", lambda *a, **k: pytest.fail("token decoded again"))
+    assert [auth._decode_token(t) for t in tokens] == [1, 1, 2]
+    auth.invalidate_user(1)
+    assert auth._token_cache.get(tokens[0]) is None
+    assert auth._token_cache.get(tokens[1]) is None
+    assert auth._token_cache.get(tokens[2]) == 2
+
+
+def test_invalid_token_is_rejected_and_not_cached(users):
+    with pytest.raises(HTTPException) as err:
+        auth._decode_token("not-a-token")
+    assert err.value.status_code == 401
+    assert len(auth._token_cache) == 0
+
+
+def test_user_info_is_cached_until_invalidated(users):
+    async def scenario():
+        first = await auth._user_info(1)
+        again = await auth._user_info(1)
+        lookups = users.lookups
+        users.names[1] = "admin"
+        stale = await auth._user_info(1)
+        auth.invalidate_user(1)
+        fresh = await auth._user_info(1)
+        return first, again, lookups, stale, fresh, await auth.check_admin(1)
+
+    first, again, lookups, stale, fresh, is_admin = asyncio.run(scenario())
+    assert first == again == stale == ("alice", False)
+    assert lookups == 1
+    assert fresh == ("admin", True)
+    assert is_admin
+    assert users.lookups == 2
+
+
+def test_lookup_in_flight_during_invalidation_is_not_cached(users):
+    users.during_lookup = lambda: auth.invalidate_user(2)
+    assert asyncio.run(auth._user_info(2)) == ("bob", False)
+    assert auth._user_cache.get(2) is None
+    users.during_lookup = None
+    asyncio.run(auth._user_info(2))
+    assert auth._user_cache.get(2) == ("bob", False)
@@ -0,0 +1,134 @@
+"""Crash recovery (game/checkpoint.py): a checkpoint plus the journal of the ticks after it
+rebuilds the world to the same digest, also when the journal ends in a torn record or the
+newest checkpoint is unreadable, and the ticks after a wipe are never replayed on the world
+before it."""
+import asyncio
+import os
+import random
+from typing import Optional
+
+from server.app.game.checkpoint import Checkpointer, read_journal, state_digest
+from server.app.game.clock import SimClock
+from server.app.game.engine import GameEngine
+from server.app.schemas import ActionMessage
+from server.app.scripts.bench_protocol import FakeSocket
+
+DIRS = ["up", "down", "left", "right"]
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class ManualClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def make_engine(directory: str, source: ManualClock, interval_ticks: int = 25) -> GameEngine:
+    engine = GameEngine(seed=3, clock=SimClock(source), rng=random.Random(1),
+                        checkpoints=Checkpointer(directory, interval_ticks=interval_ticks, fsync_seconds=0.05))
+    engine.state.ensure_map()
+    return engine
+
+
+async def play(directory: str, ticks: int, wipe_at: Optional[int] = None) -> dict:
+    """Run a session with checkpoints on; returns tick index -> world digest after that tick
+    (after a wipe the tick index starts over, overwriting the first entries)."""
+    source = ManualClock()
+    engine = make_engine(directory, source)
+    state = engine.state
+    state.ensure_initial_monsters()
+    for m in list(state.monsters.values())[:4]:
+        m.aggro = True
+    engine.checkpoints.start(engine)
+    for uid in range(1, 6):
+        engine.connect_player(uid, FakeSocket())
+    for p in state.players.values():
+        p.spells["fireball"] = {"cooldown": 0.0, "castTime": 0.25}
+        p.mp_max = p.mp = 1000
+    rnd = random.Random(7)
+    digests = {engine.tick_index: state_digest(engine)}
+    for t in range(ticks):
+        source.t += 0.25 + rnd.random() * 0.05
+        if t == ticks // 2:
+            engine.connect_player(99, FakeSocket())
+        if t == wipe_at:
+            await engine.admin_wipe()
+        for pid in list(state.players):
+            r = rnd.random()
+            if r < 0.5:
+                dx, dy = rnd.choice(STEPS)
+                engine.queue_action(pid, ActionMessage(type="move", payload={"dx": dx, "dy": dy}))
+            elif r < 0.7:
+                engine.queue_action(pid, ActionMessage(type="gather"))
+            elif r < 0.85:
+                engine.queue_action(pid, ActionMessage(type="cast", payload={"spell": "fireball",
+                                                                             "dir": rnd.choice(DIRS)}))
+        await engine._tick()
+        digests[engine.tick_index] = state_digest(engine)
+    engine.checkpoints.stop()
+    return digests
+
+
+def recover(directory: str) -> GameEngine:
+    engine = make_engine(directory, ManualClock())
+    assert asyncio.run(engine.recover()) is not None
+    return engine
+
+
+def newest(directory: str, kind: str) -> str:
+    names = sorted(n for n in os.listdir(directory) if n.startswith(kind))
+    return os.path.join(directory, names[-1])
+
+
+def test_recover_replays_journal_to_same_digest(tmp_path):
+    digests = asyncio.run(play(str(tmp_path), 60))
+    engine = recover(str(tmp_path))
+    assert engine.tick_index == max(digests)
+    assert state_digest(engine) == digests[engine.tick_index]
+
+
+def test_recover_stops_at_torn_journal_record(tmp_path):
+    digests = asyncio.run(play(str(tmp_path), 60))
+    journal = newest(str(tmp_path), "journal")
+    records = len(list(read_journal(journal)))
+    assert records > 1
+    # Crash in the middle of writing the last record
+    with open(journal, "r+b") as f:
+        f.truncate(os.path.getsize(journal) - 3)
+    assert len(list(read_journal(journal))) == records - 1
+    engine = recover(str(tmp_path))
+    assert engine.tick_index == max(digests) - 1
+    assert state_digest(engine) == digests[engine.tick_index]
+
+
+def test_recover_falls_back_to_older_checkpoint(tmp_path):
+    digests = asyncio.run(play(str(tmp_path), 60))
+    checkpoint = newest(str(tmp_path), "checkpoint")
+    with open(checkpoint, "r+b") as f:
+        f.seek(20)
+        f.write(b"XXXX")
+    # The older checkpoint and both journal segments still get there
+    engine = recover(str(tmp_path))
+    assert engine.tick_index == max(digests)
+    assert state_digest(engine) == digests[engine.tick_index]
+
+
+def test_recover_does_not_replay_past_unreadable_wipe_checkpoint(tmp_path):
+    digests = asyncio.run(play(str(tmp_path), 60, wipe_at=45))
+    # The newest checkpoint is the wipe's; without it only the world before the wipe is left
+    checkpoint = newest(str(tmp_path), "checkpoint")
+    with open(checkpoint, "r+b") as f:
+        f.seek(20)
+        f.write(b"XXXX")
+    engine = recover(str(tmp_path))
+    assert engine.tick_index == 45
+    assert state_digest(engine) == digests[45]
+
+
+def test_recover_refuses_another_world(tmp_path):
+    asyncio.run(play(str(tmp_path), 10))
+    engine = GameEngine(seed=4, checkpoints=Checkpointer(str(tmp_path)))
+    engine.state.ensure_map()
+    assert asyncio.run(engine.recover()) is None
@@ -0,0 +1,51 @@
+"""Wire codecs (game/codec.py): add_field splices the private `me` record into an encoded
+message and decodes to the same thing as encoding the whole message, for JSON and for every
+msgpack map header (fixmap in place, the 15 -> 16 entry step to map16, and map16)."""
+import json
+
+import pytest
+
+from server.app.game.codec import CODECS, JsonCodec, get_codec
+
+ME = {"inventory": {"wood": 3}, "quests": [], "name": "ä"}
+
+needs_msgpack = pytest.mark.skipif("msgpack" not in CODECS, reason="msgpack is not installed")
+
+
+def message(fields: int) -> dict:
+    msg = {"type": "state", "tick": 7}
+    for i in range(fields - len(msg)):
+        msg[f"f{i}"] = i
+    return msg
+
+
+@pytest.mark.parametrize("fields", [2, 14, 15, 16, 40])
+def test_json_add_field_matches_full_encoding(fields):
+    codec = JsonCodec()
+    msg = message(fields)
+    data = codec.add_field(codec.encode(msg), "me", ME)
+    assert json.loads(data) == {**msg, "me": ME}
+
+
+@needs_msgpack
+@pytest.mark.parametrize("fields", [0, 1, 14, 15, 16, 40])
+def test_msgpack_add_field_matches_full_encoding(fields):
+    import msgpack
+    codec = CODECS["msgpack"]
+    msg = message(fields) if fields >= 2 else {f"f{i}": i for i in range(fields)}
+    encoded = codec.encode(msg)
+    data = codec.add_field(encoded, "me", ME)
+    assert msgpack.unpackb(data) == {**msg, "me": ME}
+    if fields < 15:
+        # Still a fixmap: spliced, not re-encoded
+        assert data[0] == 0x80 + fields + 1
+        assert data.startswith(bytes([data[0]]) + encoded[1:])
+    else:
+        # 16 entries no longer fit a fixmap header
+        assert data[0] == 0xde
+
+
+def test_unknown_protocol_falls_back_to_json():
+    assert get_codec("carrier-pigeon").name == "json"
+    assert get_codec(None).name == "json"
+    assert get_codec("JSON").name == "json"
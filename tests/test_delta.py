@@ -0,0 +1,95 @@
+"""Delta-encoded state messages (game/delta.py): a client applying keyframes and deltas like
+client/js/net.js ends up with the server's snapshot, and keyframes come on first use, on
+request, every keyframe_interval ticks and after a wipe."""
+import copy
+
+from server.app.game.delta import DeltaEncoder, diff_indexed, expand_indexed, index_snapshot
+
+
+def snapshot(tick: int) -> dict:
+    """A snapshot shape with every kind of collection, changing a little each tick."""
+    return {
+        "players": {1: {"id": 1, "x": tick % 5, "y": 2, "hp": 10},
+                    **({2: {"id": 2, "x": 7, "y": 3, "hp": 10}} if tick % 3 else {})},
+        "monsters": [{"id": i, "x": i + tick % 2, "y": 4, "hp": 5} for i in range(tick % 4 + 1)],
+        "resources": [{"x": 1, "y": 1, "type": "tree"}] + ([{"x": 2, "y": 9, "type": "rock"}] if tick < 4 else []),
+        "projectiles": [],
+        "mapVersion": "v1" if tick < 5 else "v2",
+        "chat": [f"t{tick}"],
+    }
+
+
+def apply_message(state: dict, msg: dict) -> dict:
+    """What the client keeps: keyframes replace the indexed state, deltas patch it."""
+    body = msg["state"]
+    if msg.get("keyframe"):
+        return index_snapshot(body)
+    state = copy.deepcopy(state)
+    for name, value in body.items():
+        if name == "chat":
+            continue
+        if isinstance(value, dict) and set(value) == {"upd", "del"}:
+            table = state.setdefault(name, {})
+            table.update(value["upd"])
+            for key in value["del"]:
+                table.pop(key, None)
+        else:
+            state[name] = value
+    return state
+
+
+def test_diff_and_expand_round_trip():
+    prev = index_snapshot(snapshot(1))
+    curr = index_snapshot(snapshot(3))
+    delta = diff_indexed(prev, curr)
+    assert delta["players"]["del"] == ["2"]
+    assert apply_message(prev, {"delta": True, "state": delta}) == curr
+    # Unchanged plain fields are left out
+    assert "mapVersion" not in delta
+    full = expand_indexed(curr)
+    assert index_snapshot(full) == curr
+    assert full["monsters"] == snapshot(3)["monsters"]
+
+
+def test_client_follows_deltas_and_keyframes():
+    encoder = DeltaEncoder(keyframe_interval=4)
+    client = None
+    kinds = []
+    for tick in range(1, 12):
+        indexed = index_snapshot(snapshot(tick))
+        msg, _ = encoder.encode(tick, indexed, {"chat": [f"t{tick}"]})
+        if msg.get("delta"):
+            assert msg["base"] == tick - 1
+        assert msg["state"]["chat"] == [f"t{tick}"]
+        client = apply_message(client, msg)
+        assert client == indexed
+        kinds.append("key" if msg.get("keyframe") else "delta")
+    assert kinds == ["key", "delta", "delta", "delta", "key", "delta", "delta", "delta", "key", "delta", "delta"]
+
+
+def test_resync_and_wipe_force_a_keyframe():
+    encoder = DeltaEncoder(keyframe_interval=40)
+    for tick in (1, 2):
+        encoder.encode(tick, index_snapshot(snapshot(tick)))
+    # Client resync
+    encoder.request_keyframe()
+    msg, _ = encoder.encode(3, index_snapshot(snapshot(3)))
+    assert msg.get("keyframe")
+    msg, _ = encoder.encode(4, index_snapshot(snapshot(4)))
+    assert msg.get("delta")
+    # Admin wipe: the tick index starts over
+    msg, _ = encoder.encode(1, index_snapshot(snapshot(1)))
+    assert msg.get("keyframe")
+
+
+def test_private_record_only_sent_when_changed():
+    encoder = DeltaEncoder()
+    indexed = index_snapshot(snapshot(1))
+    me = {"inventory": {"wood": 1}}
+    assert encoder.encode(1, indexed, private=me)[1] == me
+    assert encoder.encode(2, indexed, private=dict(me))[1] is None
+    changed = {"inventory": {"wood": 2}}
+    assert encoder.encode(3, indexed, private=changed)[1] == changed
+    # Keyframes always carry it
+    encoder.request_keyframe()
+    assert encoder.encode(4, indexed, private=changed)[1] == changed
@@ -0,0 +1,88 @@
+"""Area-of-interest filtering (game/interest.py, WorldFrame.view): view boundaries are
+inclusive across cells and at the map edge, each connection's view holds everything within
+view_radius, and players of one interest cell share their view."""
+import random
+
+from server.app.game.clock import SimClock
+from server.app.game.delta import index_snapshot
+from server.app.game.engine import GameEngine
+from server.app.game.interest import CELL_SIZE, InterestGrid
+from server.app.scripts.bench_protocol import FakeSocket
+
+
+def grid_of(positions) -> InterestGrid:
+    grid = InterestGrid(cell_size=4)
+    grid.build(index_snapshot({
+        "monsters": [{"id": i, "x": x, "y": y} for i, (x, y) in enumerate(positions)],
+        "players": {},
+        "mapVersion": "v1",
+    }))
+    return grid
+
+
+def test_view_boundaries_are_inclusive_across_cells():
+    # Around (10, 10) with radius 3: 7..13 on both axes, spanning cells of size 4
+    inside = [(7, 7), (13, 13), (7, 13), (13, 7), (10, 10), (8, 12)]
+    outside = [(6, 10), (14, 10), (10, 6), (10, 14), (6, 6), (14, 14), (3, 3)]
+    grid = grid_of(inside + outside)
+    view = grid.view(10, 10, 3)
+    assert sorted((m["x"], m["y"]) for m in view["monsters"].values()) == sorted(inside)
+    # Collections without positions go to everyone; spatial ones are always present
+    assert view["mapVersion"] == "v1"
+    assert view["players"] == {}
+    assert grid.view(10, 10, 0)["monsters"] == {"4": {"id": 4, "x": 10, "y": 10}}
+
+
+def test_view_at_the_map_edge_and_always_records():
+    grid = grid_of([(0, 0), (2, 0), (3, 0)])
+    view = grid.view(0, 0, 2, {"players": {"5": {"id": 5, "x": 40, "y": 40}}})
+    assert sorted(view["monsters"]) == ["0", "1"]
+    # Own record even when the distance check would drop it
+    assert "5" in view["players"]
+    assert grid.view_box(2, 0, 3, 0)["monsters"].keys() == {"1", "2"}
+
+
+def make_frame(players: int):
+    engine = GameEngine(seed=3, clock=SimClock(lambda: 1000.0), rng=random.Random(1))
+    state = engine.state
+    state.ensure_map()
+    state.ensure_initial_monsters()
+    rnd = random.Random(5)
+    for uid in range(1, players + 1):
+        p = state.players[engine.connect_player(uid, FakeSocket())]
+        state.place_player(p, *state.find_free_near(rnd.randrange(state.world_w), rnd.randrange(state.world_h)))
+    return engine, engine._build_frame()
+
+
+def test_cell_view_covers_view_radius_and_is_shared():
+    engine, frame = make_frame(60)
+    r = engine.view_radius
+    views = {}
+    for pid, p in engine.state.players.items():
+        view = frame.view(pid)
+        assert str(pid) in view["players"]
+        for name in ("players", "monsters", "resources"):
+            for key, rec in frame.indexed[name].items():
+                dx, dy = abs(rec["x"] - p.x), abs(rec["y"] - p.y)
+                if dx <= r and dy <= r:
+                    assert key in view[name]
+                elif dx > r + CELL_SIZE - 1 or dy > r + CELL_SIZE - 1:
+                    assert key not in view[name]
+        views.setdefault((p.x // CELL_SIZE, p.y // CELL_SIZE), set()).add(id(view))
+    # One view object per occupied cell, whoever asks first
+    assert all(len(ids) == 1 for ids in views.values())
+    assert len(views) < len(engine.state.players)
+
+
+def test_players_in_one_cell_share_the_encoded_message():
+    engine, frame = make_frame(60)
+    by_cell = {}
+    for pid, p in engine.state.players.items():
+        by_cell.setdefault((p.x // CELL_SIZE, p.y // CELL_SIZE), []).append(pid)
+    pids = max(by_cell.values(), key=len)
+    assert len(pids) > 1
+    for pid in pids:
+        engine._connections[pid]._encode(frame)
+    # Keyframe for all of them: built and encoded once
+    assert len(frame.frames) == 1
+    assert len(frame.texts) == 1
@@ -0,0 +1,133 @@
+"""The tile occupancy index (GameState._player_tiles / _monster_tiles / _monster_cells) stays in
+sync with the entity dicts through everything that moves, adds or removes units. With
+check_occupancy set the engine validates it after every tick, so a desync fails the tick."""
+import asyncio
+import random
+
+import pytest
+
+from server.app.game.chunks import ChunkWorld
+from server.app.game.clock import SimClock
+from server.app.game.engine import GameEngine
+from server.app.schemas import ActionMessage
+from server.app.scripts.bench_protocol import FakeSocket
+
+DIRS = ["up", "down", "left", "right"]
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class ManualClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def make_engine(world=None) -> tuple:
+    source = ManualClock()
+    engine = GameEngine(seed=3, world=world, clock=SimClock(source), rng=random.Random(1))
+    engine.state.check_occupancy = True
+    engine.state.ensure_map()
+    engine.state.ensure_initial_npcs()
+    engine.state.ensure_initial_monsters()
+    return engine, source
+
+
+def arm(engine):
+    """Fireballs for everyone, and monsters that fight back."""
+    for p in engine.state.players.values():
+        p.spells["fireball"] = {"cooldown": 0.0, "castTime": 0.25}
+        p.mp_max = p.mp = 1000
+    for m in engine.state.monsters.values():
+        m.aggro = True
+
+
+async def play(engine, source, rnd, ticks: int, stats: dict):
+    for _ in range(ticks):
+        source.t += 0.25
+        for pid in list(engine.state.players):
+            r = rnd.random()
+            if r < 0.6:
+                dx, dy = rnd.choice(STEPS)
+                engine.queue_action(pid, ActionMessage(type="move", payload={"dx": dx, "dy": dy}))
+            elif r < 0.9:
+                engine.queue_action(pid, ActionMessage(type="cast", payload={"spell": "fireball",
+                                                                             "dir": rnd.choice(DIRS)}))
+        dead = sum(1 for p in engine.state.players.values() if p.hp <= 0)
+        await engine._tick()
+        stats["respawns"] += dead
+        stats["projectiles"] = max(stats["projectiles"], len(engine.state.projectiles))
+        engine.state.validate_occupancy()
+
+
+def test_occupancy_holds_through_play_death_respawn_and_wipe():
+    async def scenario():
+        engine, source = make_engine()
+        rnd = random.Random(7)
+        sockets = {}
+        for uid in range(1, 7):
+            ws = FakeSocket()
+            sockets[engine.connect_player(uid, ws)] = ws
+        arm(engine)
+        state = engine.state
+        stats = {"respawns": 0, "projectiles": 0}
+        await play(engine, source, rnd, 60, stats)
+
+        # Killed outright, and killed again on a spawn tile held by a monster
+        victim = state.players[min(state.players)]
+        victim.hp = 0
+        await play(engine, source, rnd, 1, stats)
+        sx, sy = state.spawn_point
+        for p in state.players_at(sx, sy):
+            state.place_player(p, *state.find_free_near(sx + 3, sy + 3))
+        if state.monster_at(sx, sy) is None:
+            state.spawn_slime(sx, sy)
+        victim.hp = 0
+        await play(engine, source, rnd, 2, stats)
+
+        # Leave and join mid-game
+        _, ws = sockets.popitem()
+        engine.disconnect_ws(ws)
+        engine.connect_player(99, FakeSocket())
+        arm(engine)
+        await play(engine, source, rnd, 40, stats)
+
+        await engine.admin_wipe()
+        state.validate_occupancy()
+        arm(engine)
+        await play(engine, source, rnd, 60, stats)
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["respawns"] >= 2
+    assert stats["projectiles"] > 0
+
+
+def test_occupancy_holds_through_chunk_spawns():
+    async def scenario():
+        engine, source = make_engine(ChunkWorld(1024, 1024, seed=5))
+        state = engine.state
+        for uid in range(1, 4):
+            engine.connect_player(uid, FakeSocket())
+        arm(engine)
+        before = len(state.monsters)
+        # Far from spawn: the ticks generate new chunks there, with their own slimes
+        sx, sy = state.spawn_point
+        for i, p in enumerate(state.players.values()):
+            state.ensure_chunks_near(sx + 200 * (i + 1), sy, 1)
+            state.place_player(p, *state.find_free_near(sx + 200 * (i + 1), sy))
+        stats = {"respawns": 0, "projectiles": 0}
+        await play(engine, source, random.Random(11), 40, stats)
+        return len(state.monsters) - before
+
+    assert asyncio.run(scenario()) > 0
+
+
+def test_validate_occupancy_catches_direct_assignment():
+    engine, _ = make_engine()
+    monster = next(iter(engine.state.monsters.values()))
+    # Bypasses place_monster(), so the index still has the old tile
+    monster.x += 1
+    with pytest.raises(AssertionError):
+        engine.state.validate_occupancy()
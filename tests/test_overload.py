@@ -0,0 +1,95 @@
+"""Overload control (game/overload.py): the degradation level steps up one level at a time
+while ticks stay over budget, holds between steps, steps back down after a calm stretch, and
+at PROJECTILE_CAP no more projectiles are launched than the engine's cap allows."""
+import asyncio
+import random
+
+from server.app.game.clock import SimClock
+from server.app.game.engine import GameEngine
+from server.app.game.overload import NORMAL, NO_ROAMING, PROJECTILE_CAP, REDUCED_SENDS, OverloadController
+from server.app.schemas import ActionMessage
+from server.app.scripts.bench_protocol import FakeSocket
+
+DIRS = ["up", "down", "left", "right"]
+
+
+class ManualClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+def run(controller: OverloadController, loads) -> list:
+    return [controller.observe(load) for load in loads]
+
+
+def test_levels_step_up_with_hold_and_down_after_calm():
+    # window=1: the load is exactly the last tick's share of the budget
+    ctl = OverloadController(1.0, high=0.9, low=0.5, window=1, hold_ticks=3, recover_ticks=4)
+    assert run(ctl, [2.0] * 12) == [0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 3]
+    assert ctl.escalations == 3
+    # Between low and high nothing moves, and the calm count starts over
+    assert run(ctl, [0.1, 0.1, 0.1, 0.7, 0.1, 0.1, 0.1]) == [3] * 7
+    assert run(ctl, [0.1]) == [REDUCED_SENDS]
+    assert run(ctl, [0.1] * 8) == [2, 2, 2, NO_ROAMING, 1, 1, 1, NORMAL]
+    assert ctl.recoveries == 3
+    assert run(ctl, [0.1] * 10) == [NORMAL] * 10
+    assert ctl.stats()["overload_level"] == NORMAL
+
+
+def test_max_level_is_respected():
+    ctl = OverloadController(1.0, window=1, hold_ticks=1, max_level=NO_ROAMING)
+    assert run(ctl, [5.0] * 5) == [1, 1, 1, 1, 1]
+
+
+class ScriptedLoad(OverloadController):
+    """Sees `load` times the budget instead of the real tick time."""
+
+    def __init__(self, **kwargs):
+        super().__init__(0.25, window=1, **kwargs)
+        self.load_factor = 0.0
+
+    def observe(self, seconds: float) -> int:
+        return super().observe(self.load_factor * self.budget)
+
+
+def test_projectile_cap_applies_at_its_level_only():
+    async def scenario():
+        source = ManualClock()
+        ctl = ScriptedLoad(hold_ticks=1, recover_ticks=1)
+        engine = GameEngine(seed=3, clock=SimClock(source), rng=random.Random(1), overload=ctl, projectile_cap=2)
+        state = engine.state
+        state.ensure_map()
+        for uid in range(1, 9):
+            engine.connect_player(uid, FakeSocket())
+        for p in state.players.values():
+            p.spells["fireball"] = {"cooldown": 0.0, "castTime": 0.25}
+            p.mp_max = p.mp = 1000
+        rnd = random.Random(5)
+        in_flight = {}
+
+        async def tick(n: int):
+            for _ in range(n):
+                source.t += 0.25
+                for pid in state.players:
+                    engine.queue_action(pid, ActionMessage(type="cast", payload={"spell": "fireball",
+                                                                                 "dir": rnd.choice(DIRS)}))
+                level = engine.degrade
+                await engine._tick()
+                in_flight.setdefault(level, []).append(len(state.projectiles))
+
+        ctl.load_factor = 2.0
+        await tick(10)
+        capped = list(in_flight.get(PROJECTILE_CAP, []))
+        fizzled = sum("fizzles" in text for p in state.players.values() for text in p.notifications.values())
+        ctl.load_factor = 0.1
+        await tick(10)
+        return capped, fizzled, in_flight, engine.degrade
+
+    capped, fizzled, in_flight, final_level = asyncio.run(scenario())
+    assert capped and max(capped) <= 2
+    assert fizzled > 0
+    assert max(in_flight[NORMAL]) > 2
+    assert final_level == NORMAL
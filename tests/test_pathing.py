@@ -0,0 +1,100 @@
+"""Flow fields (game/pathing.py): BFS step distances around water and blocking resources
+match a plain BFS, never wrap across rows, and the per-player cache rebuilds only when the
+player moves or the terrain changes."""
+from collections import deque
+from types import SimpleNamespace
+
+from server.app.game.pathing import FlowField, FlowFields, UNREACHABLE
+from server.app.game.state import GameState
+
+ROWS = [
+    "GGGGGWGG",
+    "GWWWGWGG",
+    "GWGGGGGG",
+    "GWGWWWWG",
+    "GGGWGGGG",
+    "WWWWGWWW",
+    "GGGGGWGG",
+]
+# The only way from the left half to the right half and the bottom
+GAP = (5, 2)
+
+
+def reference(rows, blocked, tx, ty) -> dict:
+    """Plain BFS over (x, y) tuples."""
+    h, w = len(rows), len(rows[0])
+    dist = {(tx, ty): 0}
+    queue = deque([(tx, ty)])
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+            n = (x + dx, y + dy)
+            if (0 <= n[0] < w and 0 <= n[1] < h and n not in dist
+                    and rows[n[1]][n[0]] != "W" and n not in blocked):
+                dist[n] = dist[(x, y)] + 1
+                queue.append(n)
+    return dist
+
+
+def passable(rows, blocked=()) -> bytes:
+    return bytes(0 if c == "W" or (x, y) in blocked else 1
+                 for y, row in enumerate(rows) for x, c in enumerate(row))
+
+
+def test_distances_match_plain_bfs():
+    for blocked in (set(), {GAP, (2, 4)}):
+        for target in [(0, 0), (2, 2), (7, 6), (4, 6), (6, 4)]:
+            field = FlowField(8, 7, passable(ROWS, blocked), *target)
+            expected = reference(ROWS, blocked, *target)
+            for y in range(7):
+                for x in range(8):
+                    assert field.distance(x, y) == expected.get((x, y), UNREACHABLE), (blocked, target, x, y)
+    # Blocked and cut-off tiles are never reached, nor anything off the map
+    field = FlowField(8, 7, passable(ROWS, {GAP}), 0, 0)
+    assert field.distance(*GAP) == UNREACHABLE
+    assert field.distance(7, 0) == UNREACHABLE
+    assert field.distance(0, 6) == UNREACHABLE
+    assert field.distance(9, 0) == UNREACHABLE
+
+
+def test_no_wrap_between_rows():
+    # The left and right columns are open, everything between is water: (3, 0) and (0, 1)
+    # are neighbours in the flat array but not on the map
+    rows = ["GWWG", "GWWG"]
+    field = FlowField(4, 2, passable(rows), 3, 0)
+    assert field.distance(3, 1) == 1
+    assert field.distance(0, 1) == UNREACHABLE
+    assert field.distance(0, 0) == UNREACHABLE
+
+
+def test_downhill_in_dir_order_and_window_offset():
+    field = FlowField(3, 3, bytes([1] * 9), 12, 22, ox=10, oy=20)
+    assert field.distance(12, 22) == 0
+    assert field.distance(10, 20) == 4
+    assert field.distance(2, 2) == UNREACHABLE
+    # Horizontal step first, like the greedy chase
+    assert field.downhill(10, 20) == [(11, 20), (10, 21)]
+    assert field.downhill(12, 22) == []
+
+
+def test_cache_rebuilds_on_move_and_terrain_change():
+    state = GameState()
+    state.tiles = ROWS
+    state.resources = {}
+    fields = FlowFields()
+    player = SimpleNamespace(id=1, x=0, y=0)
+    first = fields.get(state, player)
+    assert fields.get(state, player) is first
+    assert fields.builds == 1
+    player.x = 1
+    assert fields.get(state, player).target == (1, 0)
+    assert fields.builds == 2
+    assert fields.get(state, player).distance(7, 0) == reference(ROWS, set(), 1, 0)[(7, 0)]
+    # A tree in the gap, picked up with the next terrain change
+    state.resources[GAP] = {"type": "tree", "hp": 3}
+    state.terrain_version += 1
+    assert fields.get(state, player).distance(7, 0) == UNREACHABLE
+    assert fields.builds == 3
+    fields.prune([])
+    fields.get(state, player)
+    assert fields.builds == 4
@@ -0,0 +1,102 @@
+"""Write-behind player persistence (game/persistence.py): only changed records are queued,
+the writer thread writes what is pending on shutdown (unless told not to), failed batches
+are retried without overwriting newer records, and loads see records not written yet."""
+import threading
+
+from server.app.game.persistence import PlayerStore, apply_record
+from server.app.game.state import Player
+
+
+class RecordingStore(PlayerStore):
+    """Keeps written batches in memory instead of the database."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.batches = []
+        self.threads = set()
+        self.fail = False
+        # Called at the start of each write, as if the tick captured meanwhile
+        self.during_write = None
+
+    def _write(self, batch):
+        self.threads.add(threading.current_thread().name)
+        if self.during_write is not None:
+            self.during_write()
+        if self.fail:
+            raise RuntimeError("database is locked")
+        self.batches.append([dict(rec) for rec in batch])
+
+    def written(self) -> dict:
+        return {rec["user_id"]: rec for batch in self.batches for rec in batch}
+
+
+def players(n: int) -> list:
+    return [Player(id=i, user_id=100 + i, x=i, y=2) for i in range(1, n + 1)]
+
+
+def test_stop_flushes_pending_records_on_the_writer_thread():
+    store = RecordingStore(flush_interval=60.0, batch_size=2)
+    store.start()
+    team = players(5)
+    team[0].inventory["wood"] = 4
+    store.capture_all(team)
+    # Flushed early in batches of batch_size, the rest waits for the interval ...
+    store.stop()
+    # ... or for shutdown
+    assert store.pending == 0
+    assert set(store.written()) == {101, 102, 103, 104, 105}
+    assert all(len(batch) <= 2 for batch in store.batches)
+    assert store.threads == {"player-store"}
+    restored = Player(id=1, user_id=101, x=0, y=0)
+    apply_record(restored, store.written()[101])
+    assert restored.inventory == {"wood": 4}
+
+
+def test_stop_without_flush_on_shutdown_keeps_records_pending():
+    store = RecordingStore(flush_interval=60.0, flush_on_shutdown=False)
+    store.start()
+    store.capture_all(players(3))
+    store.stop()
+    assert store.batches == []
+    assert store.pending == 3
+
+
+def test_stop_flushes_without_a_writer_thread():
+    store = RecordingStore()
+    store.capture_all(players(2))
+    store.stop()
+    assert set(store.written()) == {101, 102}
+
+
+def test_only_changed_records_are_queued_one_slice_per_tick():
+    store = RecordingStore(capture_every=4)
+    team = players(8)
+    store.capture(team, tick=1)
+    assert sorted(store._pending) == [101, 105]
+    store.flush()
+    store.capture(team, tick=5)
+    assert store.pending == 0
+    team[0].x += 1
+    store.capture(team, tick=5)
+    assert sorted(store._pending) == [101]
+
+
+def test_failed_batch_is_retried_without_overwriting_newer_records():
+    store = RecordingStore()
+    p = players(1)[0]
+    store.capture_player(p)
+    store.fail = True
+
+    def move():
+        p.x = 30
+        store.capture_player(p)
+
+    # Captured again while the failing write ran: the newer record wins over the put-back one
+    store.during_write = move
+    assert store.flush() == 0
+    assert store.failures == 1
+    assert store.load(p.user_id)["x"] == 30
+    store.fail = False
+    store.during_write = None
+    assert store.flush() == 1
+    assert store.written()[p.user_id]["x"] == 30
@@ -0,0 +1,95 @@
+"""Session recording and headless replay (scripts/replay_session.py): a recorded session
+replays to the same digest on every tick, across an admin wipe and a join, and a changed
+input is caught."""
+import asyncio
+import os
+import random
+from typing import Optional
+
+from server.app.game.checkpoint import Checkpointer, journal_frame, read_journal, state_digest
+from server.app.game.clock import SimClock
+from server.app.game.engine import GameEngine
+from server.app.schemas import ActionMessage
+from server.app.scripts.bench_protocol import FakeSocket
+from server.app.scripts.replay_session import replay
+
+DIRS = ["up", "down", "left", "right"]
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class ManualClock:
+    def __init__(self):
+        self.t = 1000.0
+
+    def __call__(self) -> float:
+        return self.t
+
+
+async def record(directory: str, ticks: int, wipe_at: Optional[int] = None) -> str:
+    """Record a session; returns the final world digest."""
+    source = ManualClock()
+    engine = GameEngine(seed=3, clock=SimClock(source), rng=random.Random(1),
+                        recorder=Checkpointer(directory, interval_ticks=0, keep=0, digest_every=1,
+                                              fsync_seconds=0.05))
+    state = engine.state
+    state.ensure_map()
+    state.ensure_initial_monsters()
+    for m in list(state.monsters.values())[:4]:
+        m.aggro = True
+    for uid in range(1, 6):
+        engine.connect_player(uid, FakeSocket())
+    for p in state.players.values():
+        p.spells["fireball"] = {"cooldown": 0.0, "castTime": 0.25}
+        p.mp_max = p.mp = 1000
+    engine.recorder.start(engine)
+    rnd = random.Random(11)
+    for t in range(ticks):
+        source.t += 0.25 + rnd.random() * 0.05
+        if t == ticks // 3:
+            engine.connect_player(99, FakeSocket())
+        if t == wipe_at:
+            await engine.admin_wipe()
+        for pid in list(state.players):
+            r = rnd.random()
+            if r < 0.5:
+                dx, dy = rnd.choice(STEPS)
+                engine.queue_action(pid, ActionMessage(type="move", payload={"dx": dx, "dy": dy}))
+            elif r < 0.7:
+                engine.queue_action(pid, ActionMessage(type="gather"))
+            elif r < 0.85:
+                engine.queue_action(pid, ActionMessage(type="cast", payload={"spell": "fireball",
+                                                                             "dir": rnd.choice(DIRS)}))
+        await engine._tick()
+    engine.recorder.stop()
+    return state_digest(engine)
+
+
+def test_replay_matches_every_digest(tmp_path):
+    final = asyncio.run(record(str(tmp_path), 80))
+    result = asyncio.run(replay(str(tmp_path), False, "json", None))
+    assert result["ticks"] == 80
+    assert result["digests"] == {"journaled": 80, "mismatches": 0, "firstMismatch": None}
+    assert result["finalDigest"] == final
+
+
+def test_replay_with_connections_across_wipe(tmp_path):
+    final = asyncio.run(record(str(tmp_path), 80, wipe_at=40))
+    result = asyncio.run(replay(str(tmp_path), True, "json", None))
+    assert result["digests"]["mismatches"] == 0
+    assert result["finalDigest"] == final
+    assert result["bytesSent"] > 0
+
+
+def test_replay_detects_changed_input(tmp_path):
+    asyncio.run(record(str(tmp_path), 40))
+    journal = sorted(os.path.join(tmp_path, n) for n in os.listdir(tmp_path) if n.startswith("journal"))[-1]
+    entries = list(read_journal(journal))
+    # Drop one tick's actions, as if the simulation had ignored them
+    tampered = next(i for i, e in enumerate(entries) if e[3] and i > 5)
+    entries[tampered][3] = []
+    with open(journal, "wb") as f:
+        for entry in entries:
+            f.write(journal_frame(entry))
+    result = asyncio.run(replay(str(tmp_path), False, "json", None))
+    assert result["digests"]["mismatches"] > 0
+    assert result["digests"]["firstMismatch"] == entries[tampered][0]
@@ -0,0 +1,154 @@
+"""Scheduler (game/scheduler.py) and the timed systems built on it: TTL expiry, cast
+completion and monster respawns."""
+import random
+
+from server.app.game.clock import SimClock
+from server.app.game.engine import GameEngine
+from server.app.game.scheduler import Scheduler
+from server.app.game.state import GameState
+
+
+def test_pop_due_in_deadline_order_ties_in_scheduling_order():
+    s = Scheduler()
+    for due, item in [(5, "e"), (1, "a"), (3, "c1"), (3, "c2"), (2, "b"), (9, "late")]:
+        s.schedule(due, item)
+    assert s.next_due() == 1
+    assert s.pop_due(0) == []
+    assert s.pop_due(3) == ["a", "b", "c1", "c2"]
+    assert s.pop_due(5) == ["e"]
+    assert len(s) == 1
+    assert s.next_due() == 9
+
+
+def test_keyed_schedule_replaces_pending_entry():
+    s = Scheduler()
+    s.schedule(10, "first", key="k")
+    s.schedule(4, "second", key="k")
+    assert len(s) == 1
+    assert s.pending("k")
+    assert s.due_of("k") == 4
+    assert s.pop_due(100) == ["second"]
+    assert not s.pending("k")
+    assert s.due_of("k") is None
+
+
+def test_cancel_by_key_and_by_entry():
+    s = Scheduler()
+    s.schedule(1, "keyed", key="k")
+    entry = s.schedule(2, "plain")
+    s.schedule(3, "kept")
+    assert s.cancel("k")
+    assert not s.cancel("k")
+    assert s.cancel_entry(entry)
+    assert not s.cancel_entry(entry)
+    assert len(s) == 1
+    assert s.next_due() == 3
+    assert s.pop_due(10) == ["kept"]
+
+
+def test_cancelled_entries_are_compacted():
+    s = Scheduler()
+    for i in range(200):
+        s.schedule(i, i, key=i)
+    for i in range(150):
+        s.cancel(i)
+    assert len(s) == 50
+    # Rebuilt once tombstones outnumbered live entries, not left to pile up
+    assert len(s._heap) < 200
+    assert [item for _, item, _ in s.entries()] == list(range(150, 200))
+    assert s.pop_due(1000) == list(range(150, 200))
+
+
+def test_entries_reschedule_in_the_same_order():
+    s = Scheduler()
+    for due, item in [(2, "b"), (1, "a"), (2, "b2")]:
+        s.schedule(due, item)
+    copy = Scheduler()
+    for due, item, key in s.entries():
+        copy.schedule(due, item, key=key)
+    assert copy.pop_due(5) == s.pop_due(5) == ["a", "b", "b2"]
+
+
+def make_engine():
+    engine = GameEngine(seed=3, clock=SimClock(lambda: 1000.0), rng=random.Random(1))
+    engine.state.ensure_map()
+    return engine
+
+
+def test_monster_respawn_is_deduplicated_by_key():
+    engine = make_engine()
+    state = engine.state
+    state.clear_monsters()
+    x, y = state.find_free_near(*state.spawn_point)
+    engine._schedule_monster_respawn("slime", x, y, 20.0, key=7)
+    engine._schedule_monster_respawn("slime", x, y, 12.0, key=7)
+    engine._process_monster_respawns(11.0)
+    assert not state.monsters
+    engine._process_monster_respawns(12.0)
+    assert len(state.monsters) == 1
+    engine._process_monster_respawns(30.0)
+    assert len(state.monsters) == 1
+
+
+def test_death_cancels_cast():
+    engine = make_engine()
+    state = engine.state
+    p = state.players[state.ensure_player(1)]
+    state.begin_cast(p, {"spell": "fireball", "target": (1, 0), "end": 1001.0, "rng": 3, "rad": 0, "mana": 5})
+    assert state.cast_timers.pending(p.id)
+    p.hp = 0
+    engine._respawn_dead_players()
+    assert p.casting is None
+    assert not state.cast_timers.pending(p.id)
+    assert state.cast_timers.pop_due(2000.0) == []
+
+
+def run_ticks(state: GameState, ticks: int, add=None) -> list:
+    """Advance the TTL clock like GameEngine.step() (add during the first tick, expire at its
+    end) and return what a snapshot would show after each tick."""
+    seen = []
+    for i in range(ticks):
+        state.tick += 1
+        if i == 0 and add is not None:
+            add()
+        state.run_tick_timers()
+        snap = state.snapshot()
+        seen.append((
+            sorted(state.effects),
+            {(d["x"], d["y"]): [n["ttl"] for n in d["numbers"]] for d in snap["damageNumbers"]},
+            sorted(text for p in state.players.values() for text in p.notifications.values()),
+        ))
+    return seen
+
+
+def test_ttls_count_like_the_per_tick_countdown():
+    # Expected values are those of the former per-tick decrement (effects, damage numbers
+    # and notifications each counted down and dropped once their ttl ran out)
+    state = GameState()
+    state.ensure_map()
+    pid = state.ensure_player(1)
+
+    def add():
+        for ttl in (1, 2, 3):
+            state.add_effect(ttl, 1, None, ttl)
+            state.add_damage_number(ttl, 2, 7, ttl)
+            state.add_notification(pid, f"n{ttl}", ttl)
+
+    assert run_ticks(state, 4, add) == [
+        ([(2, 1), (3, 1)], {(1, 2): [0], (2, 2): [1], (3, 2): [2]}, ["n2", "n3"]),
+        ([(3, 1)], {(2, 2): [0], (3, 2): [1]}, ["n3"]),
+        ([], {(3, 2): [0]}, []),
+        ([], {}, []),
+    ]
+
+
+def test_effect_ttl_is_refreshed_not_duplicated():
+    state = GameState()
+    state.ensure_map()
+    state.tick = 1
+    state.add_effect(5, 5, None, 2)
+    state.add_effect(5, 5, None, 4)
+    assert len(state.tick_timers) == 1
+    state.remove_effect(5, 5)
+    assert len(state.tick_timers) == 0
+    assert (5, 5) not in state.effects
@@ -0,0 +1,111 @@
+"""The game loop on its own thread (GameEngine(threaded=True), game/simthread.py): commands from
+the event loop are applied between ticks in the order they were sent, and the frames built on
+the simulation thread reach every socket through the egress thread as an unbroken delta chain,
+sent on the event loop."""
+import asyncio
+import json
+import random
+import threading
+
+from server.app.game.engine import GameEngine
+from server.app.schemas import ActionMessage
+
+STEPS = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+
+
+class RecordingSocket:
+    """Keeps the JSON messages sent to it and the threads they were sent from."""
+
+    def __init__(self):
+        self.messages = []
+        self.threads = set()
+
+    async def send_text(self, data: str) -> None:
+        self.threads.add(threading.get_ident())
+        self.messages.append(json.loads(data))
+
+    async def send_bytes(self, data: bytes) -> None:
+        raise AssertionError("JSON connections only")
+
+
+def apply_state(players: dict, msg: dict) -> dict:
+    """The players table a client rebuilds from keyframes and deltas (client/js/net.js)."""
+    state = msg["state"]
+    if msg.get("keyframe"):
+        return dict(state["players"])
+    change = state.get("players")
+    if change:
+        players = dict(players)
+        players.update(change["upd"])
+        for key in change["del"]:
+            players.pop(key, None)
+    return players
+
+
+async def wait_for(predicate, timeout: float = 5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not predicate():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_threaded_engine_applies_commands_in_order_and_delivers_frames():
+    async def scenario():
+        engine = GameEngine(seed=3, tick_seconds=0.02, debug=False, rng=random.Random(1), threaded=True)
+        engine.state.ensure_map()
+        task = asyncio.create_task(engine.run())
+        await wait_for(lambda: engine._sim is not None and engine._sim.running)
+        sim = engine._sim
+        sockets = {}
+        for uid in (1, 2):
+            ws = RecordingSocket()
+            sockets[await engine.join(uid, ws)] = ws
+        mover, listener = sorted(sockets)
+
+        def free_steps():
+            p = engine.state.players[mover]
+            return (p.x, p.y), [(dx, dy) for dx, dy in STEPS if engine.state.is_free(p.x + dx, p.y + dy)]
+
+        (x, y), steps = await engine.inspect(free_steps)
+        assert len(steps) >= 2
+        first, last = steps[:2]
+        # Hold the simulation thread so both moves are queued before the next tick: the later
+        # one replaces the earlier, so only an in-order ingress ends up on `last`
+        gate = threading.Event()
+        sim.submit(gate.wait)
+        engine.queue_action(mover, ActionMessage(type="move", payload={"dx": first[0], "dy": first[1]}))
+        engine.queue_action(mover, ActionMessage(type="move", payload={"dx": last[0], "dy": last[1]}))
+        gate.set()
+        await wait_for(lambda: engine.tick_index > 5)
+        engine.queue_action(listener, ActionMessage(type="chat", payload={"text": "hello"}))
+        await wait_for(lambda: engine.tick_index > 10)
+        assert sim.egress.batches > 0
+
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        # Frames still waiting when the thread stopped are sent by the sender tasks
+        await wait_for(lambda: all(conn.queue_depth == 0 for conn in engine._connections.values()))
+        assert engine._sim is None
+        assert all(conn.egress is None for conn in engine._connections.values())
+        names = {t.name for t in threading.enumerate()}
+        assert "simulation" not in names and "egress" not in names
+        final = {str(pid): (p.x, p.y) for pid, p in engine.state.players.items()}
+        return sockets, (x + last[0], y + last[1]), final[str(mover)], final
+
+    sockets, expected, moved_to, final = asyncio.run(scenario())
+    assert moved_to == expected
+    loop_thread = threading.get_ident()
+    for pid, ws in sockets.items():
+        assert ws.threads == {loop_thread}
+        states = [m for m in ws.messages if m["type"] == "state"]
+        assert states and states[0].get("keyframe")
+        players, last_tick, chat = None, None, []
+        for msg in states:
+            if msg.get("delta"):
+                assert msg["base"] == last_tick
+            players = apply_state(players, msg)
+            last_tick = msg["tick"]
+            chat += msg["state"].get("chat", [])
+        assert {k: (r["x"], r["y"]) for k, r in players.items()} == final
+        assert any("hello" in json.dumps(c) for c in chat)